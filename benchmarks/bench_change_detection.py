@@ -0,0 +1,260 @@
+"""
+Benchmark of the watcher's change-detection pipeline on a synthetic sheet.
+
+Every cycle mutates a share of the rows, then runs the same steps as one poll
+of a sheet: the revision check and fetch through a fake fetcher, _check_sheet
+(identifier index, fan-out, digest comparison, diff), the flush of the
+notification batch into a no-op send function and the persistence of change
+history and row snapshots. Nothing touches the network; the database is a
+temporary file initialized with init_db and removed afterwards.
+
+Usage:
+    python -m benchmarks.bench_change_detection --rows 10000 --columns 200 \\
+        --subscribers 5000 --change-rate 0.05 --save-baseline base.json
+    python -m benchmarks.bench_change_detection --baseline base.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+from lab4 import bars_db, bars_watcher
+from lab4.drive_revisions import SpreadsheetRevisionCache
+from lab4.identifier_index import IdentifierIndex
+from lab4.notification_batch import NotificationBatch
+from lab4.sheet_ranges import identifier_indexes
+from lab4.snapshot_store import SnapshotStore
+
+from benchmarks.synthetic_sheet import (make_config, make_sheet,
+                                        make_subscriptions, mutate_sheet)
+
+# метрики, по которым сравниваем с базовой линией (меньше - лучше)
+_COMPARED = ("cycle_median_ms", "cycle_p95_ms", "peak_memory_mb")
+
+
+class FakeSheet:
+    """
+    Fake Google side: a fetcher returning the current synthetic rows and a
+    Drive transport whose revision changes with every mutation.
+    """
+
+    def __init__(self, rows: List[List[str]]) -> None:
+        self.rows = rows
+        self.version = 1
+        self.fetches = 0
+
+    def replace(self, rows: List[List[str]]) -> None:
+        self.rows = rows
+        self.version += 1
+
+    async def fetch_rows(self, config) -> Optional[List[List[str]]]:
+        self.fetches += 1
+        return self.rows
+
+    async def transport(self, url: str,
+                        params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        return 200, {"version": str(self.version)}
+
+
+async def _noop_send(session, chat_id: int, text: str) -> bool:
+    return True
+
+
+def _fake_column_headers(config, rows=None) -> Dict[int, str]:
+    return dict(enumerate(rows[0])) if rows else {}
+
+
+async def _run_cycle(cfg, sheet: FakeSheet,
+                     revisions: SpreadsheetRevisionCache,
+                     subscriptions: Dict[str, List[int]],
+                     state: SnapshotStore) -> Tuple[float, bool, int]:
+    """
+    Run one poll of the sheet.
+
+    Returns:
+        Tuple of the cycle duration in seconds, whether a change was found and
+        the number of notification messages produced.
+    """
+    batch = NotificationBatch()
+    start = time.perf_counter()
+
+    skipped, revision, rows = await bars_watcher._fetch_if_changed(
+        cfg, revisions, sheet.fetch_rows, False)
+    changed = False
+    if not skipped:
+        changed = await bars_watcher._check_sheet(cfg, rows, batch,
+                                                  subscriptions, state)
+        revisions.remember(cfg["table_id"], revision)
+    sent = await batch.flush(None, _noop_send)
+    # как flush_cycle: история и снимки строк пишутся в конце цикла
+    await asyncio.to_thread(bars_db.flush_changes)
+    await state.flush()
+
+    elapsed = time.perf_counter() - start
+    return elapsed, changed, sent
+
+
+def _bench_index_build(rows: List[List[str]], start_row: int,
+                       columns: List[int]) -> float:
+    start = time.perf_counter()
+    IdentifierIndex().update(rows, start_row, columns)
+    return time.perf_counter() - start
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run the benchmark with the given parameters on a temporary database.
+
+    Returns:
+        Dictionary of parameters and measurements.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        # get_connection читает имя файла при первом открытии
+        bars_db.DATABASE_FILE = os.path.join(tmp, "bench.sqlite")
+        bars_db.init_db()
+        try:
+            return await _run_benchmark(args)
+        finally:
+            bars_db.close_db()
+
+
+async def _run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.fake_headers:
+        bars_watcher.get_column_headers = _fake_column_headers
+
+    cfg = make_config(args.columns_to_scan)
+    rows = make_sheet(args.rows, args.columns, seed=args.seed)
+    raw_subscriptions = make_subscriptions(rows, args.subscribers,
+                                           seed=args.seed)
+    subscriptions = bars_watcher._normalize_subscriptions(raw_subscriptions)
+
+    sheet = FakeSheet(rows)
+    revisions = SpreadsheetRevisionCache(sheet.transport)
+    state = SnapshotStore()
+
+    # первый проход заполняет снимки строк, уведомлений нет
+    warmup, _, _ = await _run_cycle(cfg, sheet, revisions, subscriptions,
+                                    state)
+
+    durations: List[float] = []
+    changed_rows = 0
+    messages = 0
+    for cycle in range(args.cycles):
+        new_rows, changed = mutate_sheet(sheet.rows, args.change_rate,
+                                         args.cells_per_row,
+                                         seed=args.seed + cycle + 1)
+        sheet.replace(new_rows)
+        elapsed, _, sent = await _run_cycle(cfg, sheet, revisions,
+                                            subscriptions, state)
+        durations.append(elapsed)
+        changed_rows += changed
+        messages += sent
+
+    # цикл без изменений: ревизия та же, лист не скачивается
+    unchanged, _, _ = await _run_cycle(cfg, sheet, revisions, subscriptions,
+                                       state)
+
+    # отдельный цикл под tracemalloc: он сам замедляет выполнение
+    tracemalloc.start()
+    new_rows, _ = mutate_sheet(sheet.rows, args.change_rate,
+                               args.cells_per_row, seed=args.seed)
+    sheet.replace(new_rows)
+    await _run_cycle(cfg, sheet, revisions, subscriptions, state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # полная перестройка индекса, как после правки столбца с ФИО
+    index_seconds = _bench_index_build(sheet.rows, cfg["header_rows"],
+                                       identifier_indexes(cfg))
+
+    median = statistics.median(durations)
+    p95 = sorted(durations)[max(int(len(durations) * 0.95) - 1, 0)]
+    cells = args.rows * args.columns
+
+    return {
+        "params": {
+            "rows": args.rows, "columns": args.columns,
+            "subscribers": args.subscribers,
+            "change_rate": args.change_rate,
+            "cells_per_row": args.cells_per_row,
+            "cycles": args.cycles, "seed": args.seed,
+        },
+        "tracked_rows": len(state),
+        "changed_rows_per_cycle": changed_rows / args.cycles,
+        "messages_per_cycle": messages / args.cycles,
+        "warmup_ms": warmup * 1000,
+        "unchanged_cycle_ms": unchanged * 1000,
+        "cycle_median_ms": median * 1000,
+        "cycle_p95_ms": p95 * 1000,
+        "cycle_max_ms": max(durations) * 1000,
+        "rows_per_s": args.rows / median,
+        "cells_per_s": cells / median,
+        "index_build_rows_per_s": args.rows / index_seconds,
+        "peak_memory_mb": peak / 2 ** 20,
+        "max_rss_mb": resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _print_report(result: Dict[str, Any],
+                  baseline: Optional[Dict[str, Any]]) -> None:
+    for key, value in result.items():
+        if key == "params":
+            print("params: " + ", ".join(f"{k}={v}"
+                                         for k, v in value.items()))
+            continue
+        line = f"{key:28} {value:14.2f}"
+        if baseline is not None and key in baseline:
+            base = baseline[key]
+            if base:
+                line += f"   baseline {base:12.2f}  x{value / base:.2f}"
+        print(line)
+
+    if baseline is not None and baseline.get("params") != result["params"]:
+        print("warning: baseline was recorded with other parameters")
+    if baseline is not None:
+        worse = [k for k in _COMPARED
+                 if baseline.get(k) and result[k] > baseline[k] * 1.1]
+        if worse:
+            print("slower than baseline (>10%): " + ", ".join(worse))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--columns", type=int, default=200)
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--change-rate", type=float, default=0.05,
+                        help="share of rows changed per cycle")
+    parser.add_argument("--cells-per-row", type=int, default=1)
+    parser.add_argument("--columns-to-scan", type=int, default=2)
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fake-headers", action="store_true",
+                        help="replace get_column_headers with a stub")
+    parser.add_argument("--baseline", help="JSON file to compare with")
+    parser.add_argument("--save-baseline",
+                        help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print_report(result, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import random
+from typing import Dict, List, Tuple
+
+from lab4.constants import BarsSheetConfig
+
+_SURNAMES = ["Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов",
+             "Васильев", "Новиков", "Морозов", "Волков"]
+_NAMES = ["Иван", "Пётр", "Анна", "Мария", "Олег", "Елена", "Денис", "Ольга"]
+_ALPHABET = "абвгдежзиклмнопрстуфхцчшэюя"
+
+
+def make_config(columns_to_scan: int = 2,
+                table_id: str = "bench") -> BarsSheetConfig:
+    """
+    Build a sheet config matching the generated layout.
+
+    Args:
+        columns_to_scan: Number of leading identifier columns.
+        table_id: Name of the synthetic table.
+
+    Returns:
+        BarsSheetConfig: Config with one header row.
+    """
+    return {
+        "table_id": table_id,
+        "spreadsheet_id": f"synthetic-{table_id}",
+        "sheet_name": "Общая",
+        "header_rows": 1,
+        "columns_to_scan": columns_to_scan,
+    }
+
+
+def make_sheet(rows: int, columns: int,
+               seed: int = 0) -> List[List[str]]:
+    """
+    Generate a grade sheet: a header row, then an ISU number, a full name and
+    score cells in every row.
+
+    Args:
+        rows: Number of student rows.
+        columns: Total number of columns (at least 3).
+        seed: Random seed, so runs are reproducible.
+
+    Returns:
+        List of rows of equal width, header first.
+    """
+    rnd = random.Random(seed)
+    header = ["ИСУ", "ФИО"] + [f"ЛР {i}" for i in range(1, columns - 1)]
+    sheet = [header]
+
+    for i in range(rows):
+        fio = (f"{rnd.choice(_SURNAMES)} {rnd.choice(_NAMES)} "
+               f"{_unique_word(i)}")
+        scores = [str(rnd.randint(0, 10)) if rnd.random() < 0.7 else ""
+                  for _ in range(columns - 2)]
+        sheet.append([str(300000 + i), fio] + scores)
+    return sheet
+
+
+def _unique_word(number: int) -> str:
+    """
+    Encode a number as a capitalized word of Cyrillic letters, so generated
+    full names are unique and still look like names (no digits).
+    """
+    letters = ""
+    while True:
+        number, rest = divmod(number, len(_ALPHABET))
+        letters = _ALPHABET[rest] + letters
+        if not number:
+            break
+    return "Ю" + letters
+
+
+def make_subscriptions(sheet: List[List[str]], subscribers: int,
+                       seed: int = 0) -> Dict[str, List[int]]:
+    """
+    Subscribe chats to random students of the sheet, half by ISU, half by
+    full name (stored lowercased, as /set_fio does).
+
+    Args:
+        sheet: Sheet produced by make_sheet.
+        subscribers: Number of subscribed chats.
+        seed: Random seed.
+
+    Returns:
+        Dictionary mapping identifiers to chat IDs, like get_all_subscriptions.
+    """
+    rnd = random.Random(seed + 1)
+    students = sheet[1:]
+    subscriptions: Dict[str, List[int]] = {}
+
+    for chat_id in range(1, subscribers + 1):
+        row = rnd.choice(students)
+        identifier = row[0] if chat_id % 2 else row[1].lower()
+        subscriptions.setdefault(identifier, []).append(chat_id)
+    return subscriptions
+
+
+def mutate_sheet(sheet: List[List[str]], change_rate: float,
+                 cells_per_row: int = 1,
+                 seed: int = 0) -> Tuple[List[List[str]], int]:
+    """
+    Return a copy of the sheet with score cells changed in a share of rows.
+
+    Args:
+        sheet: Current sheet.
+        change_rate: Share of student rows to change (0..1).
+        cells_per_row: Number of score cells changed in each such row.
+        seed: Random seed.
+
+    Returns:
+        Tuple of the new sheet and the number of changed rows.
+    """
+    rnd = random.Random(seed)
+    new_sheet = [list(row) for row in sheet]
+    width = len(sheet[0])
+    changed = 0
+
+    for row in new_sheet[1:]:
+        if rnd.random() >= change_rate:
+            continue
+        for _ in range(cells_per_row):
+            col = rnd.randrange(2, width)
+            row[col] = str(int(row[col] or 0) + 1)
+        changed += 1
+    return new_sheet, changed
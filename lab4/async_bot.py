@@ -1,21 +1,65 @@
 import asyncio
-from typing import Any, Dict, List, Optional
+import signal
+from functools import partial
+from typing import Any, Dict, List, NamedTuple, Optional
 import aiohttp
+from aiohttp import web
 from lab4.constants import (
     POLLING_TIMEOUT, REQUEST_TIMEOUT, SLEEP_TIME,
-    SUCCESS_CODE, ADDITIONAL_WAIT_TIME, HEADLINE_URLS,
-    OPENWEATHER_API_KEY, OPENWEATHER_URL, BARS_POLL_INTERVAL
+    SUCCESS_CODE, TOO_MANY_REQUESTS_CODE, ADDITIONAL_WAIT_TIME,
+    HEADLINE_URLS, OPENWEATHER_API_KEY, OPENWEATHER_URL, BARS_POLL_INTERVAL,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_SECRET, WEATHER_CACHE_TTL,
+    HEADLINES_CACHE_TTL, NOT_MODIFIED_CODE, WATCHER_WORKERS, ADMIN_CHAT_IDS,
+    SHUTDOWN_TIMEOUT
 )
-from lab4.sync_bot import get_daily_quote, build_api_url
+from lab4.sync_bot import build_api_url
 from lab4.bars_watcher import poll_bars_and_notify, PreviousState
-from lab4.bars_db import add_subscription
+from lab4.watcher_shards import run_sharded_watcher
+from lab4.bars_db import add_subscription, remove_subscription, close_db
+from lab4.message_dispatcher import MessageDispatcher, RetryAfter
+from lab4.update_dispatcher import UpdateDispatcher
+from lab4.response_cache import AsyncTTLCache, UncachedResult, normalize_key
+from lab4.html_title import read_title
+from lab4.quote_provider import QuoteProvider
+from lab4.student_reports import grades_report, history_report, parse_days
+from lab4.sheet_registry import (get_sheet_configs, parse_sheet_config,
+                                 register_sheet, unregister_sheet)
+from lab4.metrics import (REGISTRY, MESSAGES_SENT, MESSAGES_FAILED,
+                          SEND_SECONDS, run_metrics_server)
+from lab4.webhook_server import (run_webhook_server, set_webhook,
+                                 delete_webhook)
+from lab4.snapshot_store import SnapshotStore
 
 user_states: Dict[int, str] = {}
-previous_state: PreviousState = {}
+# состояние строк подгружается из БД лениво и переживает рестарт
+previous_state: PreviousState = SnapshotStore()
+
+# команды администратора для списка таблиц
+_SHEET_COMMANDS = ("/sheets", "/add_sheet", "/remove_sheet")
+
+# кэши ответов внешних сервисов: погода по городу, заголовок по url
+_weather_cache: AsyncTTLCache[str] = AsyncTTLCache(WEATHER_CACHE_TTL)
+_headlines_cache: AsyncTTLCache[str] = AsyncTTLCache(HEADLINES_CACHE_TTL)
+# цитата дня загружается в фоне и отдаётся из памяти
+quote_provider = QuoteProvider()
+
+
+class _TitleValidator(NamedTuple):
+    """
+    Валидаторы последнего ответа страницы для условного GET.
+    """
+    etag: Optional[str]
+    last_modified: Optional[str]
+    result: str
+
+
+# ETag/Last-Modified и заголовок по каждому url из HEADLINE_URLS
+_title_validators: Dict[str, _TitleValidator] = {}
 
 
 async def send_message(session: aiohttp.ClientSession,
-                       chat_id: int, text: str) -> bool:
+                       chat_id: int, text: str,
+                       raise_on_retry: bool = False) -> bool:
     """
     Асинхронно отправляет сообщение в Telegram чат.
     
@@ -27,33 +71,51 @@ async def send_message(session: aiohttp.ClientSession,
         session (aiohttp.ClientSession): Асинхронная HTTP-сессия для выполнения запроса
         chat_id (int): Идентификатор чата, в который отправляется сообщение
         text (str): Текст сообщения для отправки
+        raise_on_retry (bool): Бросать RetryAfter при ответе 429, чтобы
+            диспетчер сообщений повторил отправку позже
     
     Returns:
         bool: True если сообщение успешно отправлено, False в случае ошибки
+    
+    Raises:
+        RetryAfter: Если raise_on_retry и Telegram ограничил частоту отправки
     """
     url: str = build_api_url("sendMessage")
     payload: Dict[str, Any] = {"chat_id": chat_id, "text": text}
 
     try:
         timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
-        async with (session.post(url, json=payload, timeout=timeout)
-                    as response):
-            if response.status != SUCCESS_CODE:
-                print(f"HTTP error in send_message: {response.status}")
-                return False
-
-            result: Dict[str, Any] = await response.json()
+        with SEND_SECONDS.time():
+            async with (session.post(url, json=payload, timeout=timeout)
+                        as response):
+                if (response.status == TOO_MANY_REQUESTS_CODE
+                        and raise_on_retry):
+                    MESSAGES_FAILED.inc(1, "rate_limited")
+                    error: Dict[str, Any] = await response.json()
+                    retry_after = error.get("parameters", {}).get(
+                        "retry_after", SLEEP_TIME)
+                    raise RetryAfter(retry_after)
+
+                if response.status != SUCCESS_CODE:
+                    print(f"HTTP error in send_message: {response.status}")
+                    MESSAGES_FAILED.inc(1, "http")
+                    return False
+
+                result: Dict[str, Any] = await response.json()
 
         if result.get("ok"):
             print(f"Message sent to {chat_id}")
+            MESSAGES_SENT.inc()
             return True
 
         print(f"Message failed to send to {chat_id}: "
               f"{result.get('description')}")
+        MESSAGES_FAILED.inc(1, "api")
         return False
 
     except aiohttp.ClientError as e:
         print(f"Request failed in send_message: {e}")
+        MESSAGES_FAILED.inc(1, "network")
         return False
 
 
@@ -108,6 +170,153 @@ async def get_updates(session: aiohttp.ClientSession,
         return {"ok": False, "result": []}
 
 
+async def handle_update(session: aiohttp.ClientSession,
+                        update: Dict[str, Any]) -> None:
+    """
+    Обрабатывает одно обновление Telegram: команды и ввод города.
+
+    Вызывается диспетчером обновлений; обновления одного чата приходят сюда
+    строго по порядку, поэтому состояние user_states не перемешивается.
+
+    Args:
+        session (aiohttp.ClientSession): HTTP-сессия для ответов и запросов
+        update (Dict[str, Any]): Объект обновления из getUpdates
+    """
+    message = update.get("message")
+    if message is None:
+        return
+
+    chat_id = message.get("chat", {}).get("id")
+    text = message.get("text")
+    user_id = message.get("from", {}).get("id")
+
+    if chat_id is None or text is None or user_id is None:
+        return
+
+    print(f"Received from {chat_id}: {text}")
+
+    state = user_states.get(user_id)
+
+    if state == "waiting_for_city":
+        city_name = text.strip()
+        weather_text = await get_weather_for_city(session, city_name)
+        await send_message(session, chat_id, weather_text)
+        del user_states[user_id]
+
+    elif text == "/weather":
+        user_states[user_id] = "waiting_for_city"
+        await send_message(session, chat_id,
+                           "Введите название города..")
+
+    elif text == "/quote":
+        quote = await quote_provider.get_quote()
+        await send_message(session, chat_id, quote)
+    elif text == "/headlines":
+        headlines = await get_headlines(session)
+        await send_message(session, chat_id, headlines)
+
+    elif text == "/grades":
+        # ответ из снимков строк watcher'а, без запросов к Google Sheets;
+        # если таблицы опрашивают отдельные процессы, снимки читаются из БД
+        state = previous_state if not WATCHER_WORKERS else SnapshotStore()
+        for reply in await grades_report(chat_id, state):
+            await send_message(session, chat_id, reply)
+
+    elif text == "/history" or text.startswith("/history "):
+        days = parse_days(text[len("/history"):])
+        if days is None:
+            await send_message(session, chat_id,
+                               "Использование: /history [число дней]")
+        else:
+            for reply in await history_report(chat_id, days):
+                await send_message(session, chat_id, reply)
+
+    elif text.startswith("/set_isu "):
+        isu = text[len("/set_isu "):].strip()
+        if await asyncio.to_thread(add_subscription, isu, chat_id):
+            await send_message(session, chat_id,
+                               f"ИСУ {isu} сохранён")
+        else:
+            await send_message(session, chat_id,
+                               "Ошибка при сохранении")
+
+    elif text.startswith("/set_fio "):
+        fio = text[len("/set_fio "):].strip()
+        if await asyncio.to_thread(add_subscription, fio.lower(), chat_id):
+            await send_message(session, chat_id,
+                               f"ФИО '{fio}' сохранено")
+        else:
+            await send_message(session, chat_id,
+                               "Ошибка при сохранении")
+
+    elif text.startswith("/unsubscribe "):
+        # ФИО хранятся в нижнем регистре, ИСУ как есть
+        identifier = text[len("/unsubscribe "):].strip()
+        removed = await asyncio.to_thread(remove_subscription,
+                                          identifier, chat_id)
+        removed = await asyncio.to_thread(remove_subscription,
+                                          identifier.lower(),
+                                          chat_id) or removed
+        if removed:
+            await send_message(session, chat_id,
+                               f"Подписка на '{identifier}' "
+                               f"удалена")
+        else:
+            await send_message(session, chat_id,
+                               "Подписка не найдена")
+
+    elif text.split(" ", 1)[0] in _SHEET_COMMANDS:
+        if chat_id not in ADMIN_CHAT_IDS:
+            await send_message(session, chat_id,
+                               "Команда доступна только администраторам")
+        else:
+            await send_message(session, chat_id,
+                               await _sheet_command(text))
+    else:
+        await send_message(session, chat_id, text)
+
+
+async def _sheet_command(text: str) -> str:
+    """
+    Выполняет команду администратора над списком таблиц.
+
+    Изменения сохраняются в БД; watcher подхватывает их при следующей
+    перечитке конфигураций, не трогая остальные таблицы.
+
+    Args:
+        text (str): Текст команды /sheets, /add_sheet или /remove_sheet
+
+    Returns:
+        str: Ответ администратору
+    """
+    command, _, argument = text.partition(" ")
+    argument = argument.strip()
+
+    if command == "/sheets":
+        configs = await asyncio.to_thread(get_sheet_configs)
+        if not configs:
+            return "Нет отслеживаемых таблиц"
+        return "\n".join(f"* {cfg['table_id']}: {cfg['sheet_name']} "
+                         f"({cfg['spreadsheet_id']})" for cfg in configs)
+
+    if command == "/add_sheet":
+        config = parse_sheet_config(argument)
+        if config is None:
+            return ("Использование: /add_sheet название | id или ссылка "
+                    "таблицы | лист | строк заголовка | столбцов с ИСУ/ФИО "
+                    "| столбцы с баллами (D:H, K) | число строк "
+                    "| столбцы с ИСУ/ФИО (A:B)")
+        if not await asyncio.to_thread(register_sheet, config):
+            return "Ошибка при сохранении"
+        return f"Таблица '{config['table_id']}' сохранена"
+
+    if not argument:
+        return "Использование: /remove_sheet название"
+    if await asyncio.to_thread(unregister_sheet, argument):
+        return f"Таблица '{argument}' удалена"
+    return "Таблица не найдена"
+
+
 async def main() -> None:
     """
     Main event loop for an asynchronous Telegram echo bot that handles multiple command types and background monitoring.
@@ -129,90 +338,166 @@ async def main() -> None:
     The asynchronous design allows concurrent handling of message processing and background monitoring
     for efficient resource utilization and responsive user experience.
     """
-    offset: Optional[int] = None
     print("Async echo bot started")
 
     async with aiohttp.ClientSession() as session:
-        bars_task = asyncio.create_task(
-            poll_bars_and_notify(session, send_message,
-                                 previous_state, interval=BARS_POLL_INTERVAL)
-        )
+        # уведомления watcher'а уходят через очередь с лимитами telegram
+        dispatcher = MessageDispatcher(
+            partial(send_message, raise_on_retry=True))
+        dispatcher.start()
+        quote_provider.start(session)
+        # каждое обновление - отдельная задача, сообщения одного чата по порядку
+        updates_dispatcher = UpdateDispatcher(partial(handle_update, session))
+        REGISTRY.gauge("telegram_outbox_depth",
+                       "Notifications queued in the message dispatcher.",
+                       dispatcher.qsize)
+        REGISTRY.gauge("bot_updates_pending",
+                       "Accepted updates not yet handled.",
+                       updates_dispatcher.pending)
+        metrics_runner = await run_metrics_server()
+        if WATCHER_WORKERS:
+            # таблицы опрашивают процессы-обработчики, уведомления идут отсюда
+            bars_task = asyncio.create_task(
+                run_sharded_watcher(session, dispatcher.send))
+        else:
+            bars_task = asyncio.create_task(
+                poll_bars_and_notify(session, dispatcher.send,
+                                     previous_state,
+                                     interval=BARS_POLL_INTERVAL)
+            )
+        webhook_runner = None
+        _cancel_on_sigterm()
         try:
-            while True:
-                result = await get_updates(session, offset=offset)
-
-                if not result.get("ok"):
-                    print(f"Error getting updates: {result}")
-                    await asyncio.sleep(SLEEP_TIME)
-                    continue
-
-                updates: List[Dict[str, Any]] = result.get("result", [])
-
-                for update in updates:
-                    message = update.get("message")
-                    if message is None:
-                        continue
-
-                    chat_id = message.get("chat", {}).get("id")
-                    text = message.get("text")
-                    user_id = message.get("from", {}).get("id")
-
-                    if chat_id is None or text is None or user_id is None:
-                        continue
-
-                    print(f"Received from {chat_id}: {text}")
-
-                    state = user_states.get(user_id)
-
-                    if state == "waiting_for_city":
-                        city_name = text.strip()
-                        weather_text = await\
-                            get_weather_for_city(session, city_name)
-                        await send_message(session, chat_id, weather_text)
-                        del user_states[user_id]
-
-                    elif text == "/weather":
-                        user_states[user_id] = "waiting_for_city"
-                        await send_message(session, chat_id,
-                                           "Введите название города..")
-
-                    elif text == "/quote":
-                        # выносим в отдельный поток синхронную функцию
-                        quote = await asyncio.to_thread(get_daily_quote)
-                        await send_message(session, chat_id, quote)
-                    elif text == "/headlines":
-                        headlines = await get_headlines(session)
-                        await send_message(session, chat_id, headlines)
-
-                    elif text.startswith("/set_isu "):
-                        isu = text[len("/set_isu "):].strip()
-                        if add_subscription(isu, chat_id):
-                            await send_message(session, chat_id,
-                                               f"ИСУ {isu} сохранён")
-                        else:
-                            await send_message(session, chat_id,
-                                               "Ошибка при сохранении")
-
-                    elif text.startswith("/set_fio "):
-                        fio = text[len("/set_fio "):].strip()
-                        if add_subscription(fio.lower(), chat_id):
-                            await send_message(session, chat_id,
-                                               f"ФИО '{fio}' сохранено")
-                        else:
-                            await send_message(session, chat_id,
-                                               "Ошибка при сохранении")
-                    else:
-                        await send_message(session, chat_id, text)
-
-                    update_id = update.get("update_id")
-                    if update_id is not None:
-                        offset = update_id + 1
-
-        except KeyboardInterrupt:
+            if BOT_MODE == "webhook":
+                webhook_runner = await _start_webhook(session,
+                                                      updates_dispatcher)
+            if webhook_runner is not None:
+                # обновления приходят на webhook-сервер, main просто ждёт
+                await asyncio.Event().wait()
+            else:
+                await _run_polling(session, updates_dispatcher)
+
+        except asyncio.CancelledError:
+            # Ctrl+C и SIGTERM отменяют main; дальше - штатная остановка
+            pass
+
+        finally:
             bars_task.cancel()
+            await asyncio.gather(bars_task, return_exceptions=True)
+            if webhook_runner is not None:
+                await webhook_runner.cleanup()
+            # ответы на уже принятые обновления доходят до пользователей;
+            # не обработанные за SHUTDOWN_TIMEOUT придут после перезапуска
+            try:
+                await asyncio.wait_for(updates_dispatcher.join(),
+                                       SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                print("Not all updates were handled before shutdown")
+            await updates_dispatcher.stop()
+            # последние уведомления watcher'а уже отмечены в снимках строк:
+            # если их выбросить, пользователи не узнают об изменениях
+            try:
+                await asyncio.wait_for(dispatcher.join(), SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"{dispatcher.qsize()} notifications were not "
+                      f"delivered before shutdown")
+            await dispatcher.stop()
+            await quote_provider.stop()
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+            close_db()
             print("\nAsync bot stopped")
 
 
+async def _start_webhook(
+        session: aiohttp.ClientSession,
+        updates_dispatcher: UpdateDispatcher) -> Optional[web.AppRunner]:
+    """
+    Запускает webhook-сервер и регистрирует его адрес в Telegram.
+
+    Args:
+        session (aiohttp.ClientSession): HTTP-сессия для запросов к Bot API
+        updates_dispatcher (UpdateDispatcher): Диспетчер входящих обновлений
+
+    Returns:
+        Optional[web.AppRunner]: Запущенный сервер или None, если webhook
+        настроить не удалось и нужно вернуться к long polling
+    """
+    if not WEBHOOK_URL:
+        print("WEBHOOK_URL is not set, falling back to polling")
+        return None
+    # без секрета любой, кто достучится до порта, сможет подделать
+    # обновления, в том числе команды администратора
+    if not WEBHOOK_SECRET:
+        print("WEBHOOK_SECRET is not set, falling back to polling")
+        return None
+
+    try:
+        runner = await run_webhook_server(updates_dispatcher)
+    except OSError as e:
+        print(f"Can't start webhook server: {e}, falling back to polling")
+        return None
+
+    if not await set_webhook(session, WEBHOOK_URL):
+        await runner.cleanup()
+        print("Can't register webhook, falling back to polling")
+        return None
+    return runner
+
+
+def _cancel_on_sigterm() -> None:
+    """
+    Отменяет текущую задачу (main) по SIGTERM, как asyncio.run по Ctrl+C.
+
+    Так docker stop проходит через ту же остановку: ответы на принятые
+    обновления доставляются, очередь уведомлений и БД сбрасываются.
+    """
+    task = asyncio.current_task()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM,
+                                                      task.cancel)
+    except NotImplementedError:
+        # на Windows обработчики сигналов в event loop не поддерживаются
+        pass
+
+
+async def _run_polling(session: aiohttp.ClientSession,
+                       updates_dispatcher: UpdateDispatcher) -> None:
+    """
+    Получает обновления длинным опросом и передаёт их диспетчеру.
+
+    Args:
+        session (aiohttp.ClientSession): HTTP-сессия для запросов к Bot API
+        updates_dispatcher (UpdateDispatcher): Диспетчер входящих обновлений
+    """
+    # пока webhook зарегистрирован, getUpdates отвечает ошибкой 409
+    await delete_webhook(session)
+    offset: Optional[int] = None
+
+    while True:
+        result = await get_updates(session, offset=offset)
+
+        if not result.get("ok"):
+            print(f"Error getting updates: {result}")
+            await asyncio.sleep(SLEEP_TIME)
+            continue
+
+        updates: List[Dict[str, Any]] = result.get("result", [])
+
+        accepted = 0
+        for update in updates:
+            if await updates_dispatcher.submit(update):
+                accepted += 1
+        if updates and not accepted:
+            # getUpdates вернул только ещё не обработанные обновления:
+            # ждём, пока обработка продвинется, а не опрашиваем вхолостую
+            await updates_dispatcher.wait_handled()
+
+        # подтверждаются только обработанные обновления: принятые, но не
+        # обработанные придут снова после перезапуска
+        offset = updates_dispatcher.acknowledged_offset()
+
+
 async def _fetch_title(session: aiohttp.ClientSession,
                        url: str) -> str:
     """
@@ -227,28 +512,52 @@ async def _fetch_title(session: aiohttp.ClientSession,
             - The URL followed by the extracted title text if successful
             - An error message indicating HTTP status code, request failure, or missing title
     
-    The method performs HTTP request to retrieve webpage content and parses the HTML
-    to extract title information for further processing or display purposes.
+    Raises:
+        UncachedResult: With the error message for HTTP and network failures,
+            so that the headlines cache does not keep them.
+    
+    The method streams the page only up to its </title> instead of downloading
+    the whole HTML, and sends If-None-Match/If-Modified-Since from the previous
+    response so that unchanged pages are answered with 304.
     """
+    # условный запрос: если страница не менялась, сервер ответит 304
+    validator = _title_validators.get(url)
+    headers: Dict[str, str] = {}
+    if validator is not None:
+        if validator.etag:
+            headers["If-None-Match"] = validator.etag
+        if validator.last_modified:
+            headers["If-Modified-Since"] = validator.last_modified
+
     try:
         timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
-        async with session.get(url, timeout=timeout) as response:
+        async with session.get(url, headers=headers,
+                               timeout=timeout) as response:
+            if (response.status == NOT_MODIFIED_CODE
+                    and validator is not None):
+                return validator.result
+
             if response.status != SUCCESS_CODE:
-                return f"{url}: HTTP {response.status}"
+                raise UncachedResult(f"{url}: HTTP {response.status}")
 
-            html = await response.text()
+            # читаем страницу только до </title>
+            title_text = await read_title(response)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
 
     except aiohttp.ClientError as e:
-        return f"{url}: request failed ({e})"
+        raise UncachedResult(f"{url}: request failed ({e})")
 
-    start = html.find("<title>")
-    end = html.find("</title>")
+    if title_text is None:
+        result = f"{url}: title not found"
+    else:
+        result = f"{url}: {title_text}"
 
-    if start == -1 or end == -1:
-        return f"{url}: title not found"
-
-    title_text = html[start + len("<title>"): end].strip()
-    return f"{url}: {title_text}"
+    if etag or last_modified:
+        _title_validators[url] = _TitleValidator(etag, last_modified, result)
+    else:
+        _title_validators.pop(url, None)
+    return result
 
 
 async def get_headlines(session: aiohttp.ClientSession) -> str:
@@ -263,7 +572,8 @@ async def get_headlines(session: aiohttp.ClientSession) -> str:
     
     Why: This method performs concurrent HTTP requests to improve efficiency when fetching data from multiple sources simultaneously, reducing overall waiting time compared to sequential requests.
     """
-    tasks = [_fetch_title(session, url) for url in HEADLINE_URLS]
+    tasks = [_headlines_cache.get(url, partial(_fetch_title, session, url))
+             for url in HEADLINE_URLS]
     # gather запускает все корутины одновременно и ждёт завершения всех
     results: List[str] = await asyncio.gather(*tasks)
 
@@ -273,6 +583,27 @@ async def get_headlines(session: aiohttp.ClientSession) -> str:
 async def get_weather_for_city(session: aiohttp.ClientSession,
                                city: str) -> str:
     """
+    Возвращает погоду для города, используя кэш ответов OpenWeatherMap.
+
+    Название города нормализуется (регистр, пробелы), поэтому одинаковые
+    запросы разных пользователей обслуживаются одним обращением к API.
+    Город в ответе пишется так, как его вернул API, а не как его ввёл первый
+    спросивший пользователь.
+
+    Args:
+        session (aiohttp.ClientSession): HTTP-сессия для запроса к API
+        city (str): Название города, как его ввёл пользователь
+
+    Returns:
+        str: Текст с погодой или сообщение об ошибке
+    """
+    return await _weather_cache.get(
+        normalize_key(city), partial(_request_weather, session, city))
+
+
+async def _request_weather(session: aiohttp.ClientSession,
+                           city: str) -> str:
+    """
     Asynchronously fetches weather data for a specified city using the OpenWeatherMap API.
     
     Args:
@@ -280,7 +611,10 @@ async def get_weather_for_city(session: aiohttp.ClientSession,
         city (str): The name of the city to get weather data for.
     
     Returns:
-        str: A formatted string containing weather information including temperature, feels-like temperature, and weather description in Russian. Returns an error message if the request fails or city is not found.
+        str: A formatted string containing weather information including temperature, feels-like temperature, and weather description in Russian. The city is named as the API spells it, so the cached text fits every spelling of the request.
+    
+    Raises:
+        UncachedResult: With the error message if the request fails or the city is not found, so that the weather cache does not keep it.
     
     Why:
     This method provides real-time weather updates to support notification services that require current environmental data for user interactions.
@@ -296,17 +630,21 @@ async def get_weather_for_city(session: aiohttp.ClientSession,
                                params=params,
                                timeout=timeout) as response:
             if response.status != SUCCESS_CODE:
-                return (f"Can't recieve weather for city {city}. "
-                        f"Code {response.status}")
+                raise UncachedResult(f"Can't recieve weather for city {city}. "
+                                     f"Code {response.status}")
 
             data: Dict[str, Any] = await response.json()
 
     except aiohttp.ClientError as e:
-        return f"Can't recieve weather {e}"
+        raise UncachedResult(f"Can't recieve weather {e}")
 
     if int(data.get("cod", 0)) != SUCCESS_CODE:
         message = data.get("message", "error")
-        return f"City {city}: doesn't exist {message}"
+        # ответ с введённым названием не кэшируется
+        raise UncachedResult(f"City {city}: doesn't exist {message}")
+
+    # название из ответа api одинаково для всех вариантов написания
+    city_name = data.get("name") or city.strip()
 
     main = data.get("main", {})
     weather_list = data.get("weather", [])
@@ -317,11 +655,14 @@ async def get_weather_for_city(session: aiohttp.ClientSession,
         else "No description"
 
     return (
-        f"Температура в {city}:\n"
+        f"Температура в {city_name}:\n"
         f"- {description}\n"
         f"- Температура: {temp}\n"
         f"- Ощущается как: {feels_like}\n"
     )
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
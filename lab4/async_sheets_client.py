@@ -0,0 +1,225 @@
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import aiohttp
+from google.auth import crypt, jwt
+
+from lab4.constants import (GOOGLE_SHEETS_CREDENTIALS_FILE, GOOGLE_SCOPES,
+                            GOOGLE_TOKEN_REFRESH_MARGIN, REQUEST_TIMEOUT,
+                            SHEETS_API_URL, SUCCESS_CODE, BarsSheetConfig)
+from lab4.google_sheets_client import get_sheet_rows
+from lab4.sheet_ranges import VALUES_PARAMS, assemble_rows, sheet_ranges
+
+# загрузчик строк листа: cfg -> строки или None при ошибке
+SheetFetcher = Callable[[BarsSheetConfig],
+                        Awaitable[Optional[List[List[str]]]]]
+
+_JWT_GRANT_TYPE = "urn:ietf:params:oauth:grant-type:jwt-bearer"
+_DEFAULT_TOKEN_URI = "https://oauth2.googleapis.com/token"
+_TOKEN_LIFETIME = 3600
+_UNAUTHORIZED_CODE = 401
+
+
+class AsyncSheetsClient:
+    """
+    Google Sheets REST client running directly on the bot's aiohttp session.
+
+    The service-account key is read once; OAuth tokens are obtained with a
+    signed JWT over the same session, cached, and refreshed ahead of expiry.
+    Requests reuse the session's keep-alive connections and never leave the
+    event loop, so sheet fetches do not compete with /quote for executor
+    threads.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession,
+                 credentials_file: str = GOOGLE_SHEETS_CREDENTIALS_FILE,
+                 base_url: str = SHEETS_API_URL) -> None:
+        self._session = session
+        self._credentials_file = credentials_file
+        self._base_url = base_url.rstrip("/")
+        self._info: Optional[Dict[str, Any]] = None
+        self._signer: Optional[crypt.Signer] = None
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+
+    async def get_sheet_rows(
+            self, config: BarsSheetConfig) -> Optional[List[List[str]]]:
+        """
+        Retrieve the configured part of a worksheet.
+
+        Only the identifier and tracked columns and at most max_rows rows are
+        requested, if the config sets them (see sheet_ranges).
+
+        Args:
+            config: Configuration object containing spreadsheet ID and worksheet name.
+
+        Returns:
+            List of rows padded to equal width, or None if an error occurs.
+        """
+        value_ranges = await self.batch_get(config["spreadsheet_id"],
+                                            sheet_ranges(config))
+        if value_ranges is None:
+            print(f"Error reading sheet {config['table_id']}")
+            return None
+
+        return assemble_rows(config, [value_range.get("values", [])
+                                      for value_range in value_ranges])
+
+    async def batch_get(self, spreadsheet_id: str, ranges: List[str],
+                        params: Optional[Dict[str, str]] = None
+                        ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Read several ranges of one spreadsheet with values:batchGet.
+
+        Args:
+            spreadsheet_id: Google Sheets ID.
+            ranges: A1 ranges to read.
+            params: Query parameters overriding VALUES_PARAMS.
+
+        Returns:
+            The valueRanges list of the response, or None on errors.
+        """
+        url = f"{self._base_url}/{spreadsheet_id}/values:batchGet"
+        query: List[Tuple[str, str]] = [("ranges", r) for r in ranges]
+        query.extend({**VALUES_PARAMS, **(params or {})}.items())
+
+        status, body = await self.request(url, query)
+        if status != SUCCESS_CODE:
+            print(f"HTTP error in batch_get for {spreadsheet_id}: {status} "
+                  f"{body.get('error', {}).get('message', '')}")
+            return None
+        return body.get("valueRanges", [])
+
+    async def drive_transport(
+            self, url: str,
+            params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        """
+        DriveTransport for SpreadsheetRevisionCache using this client's token.
+
+        Args:
+            url: Drive API endpoint.
+            params: Query parameters.
+
+        Returns:
+            Tuple of the HTTP status code and the decoded JSON body.
+        """
+        return await self.request(url, list(params.items()))
+
+    async def request(self, url: str, query: List[Tuple[str, str]]
+                      ) -> Tuple[int, Dict[str, Any]]:
+        """
+        Perform an authorized GET request, renewing the token once on 401.
+
+        Args:
+            url: Google API endpoint.
+            query: Query parameters; keys may repeat.
+
+        Returns:
+            Tuple of the HTTP status code and the decoded JSON body (status 0
+            if the request itself failed).
+        """
+        for attempt in range(2):
+            try:
+                token = await self._get_token()
+                headers = {"Authorization": f"Bearer {token}"}
+                timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+                async with self._session.get(url, params=query,
+                                             headers=headers,
+                                             timeout=timeout) as response:
+                    body = await response.json(content_type=None)
+                    status = response.status
+
+            except (aiohttp.ClientError, asyncio.TimeoutError,
+                    OSError, KeyError, ValueError) as e:
+                print(f"Request failed in AsyncSheetsClient: {e}")
+                return 0, {}
+
+            if status == _UNAUTHORIZED_CODE and attempt == 0:
+                self._token = None
+                continue
+            return status, body or {}
+
+        return _UNAUTHORIZED_CODE, {}
+
+    async def _get_token(self) -> str:
+        """
+        Return a cached access token, requesting a new one near expiry.
+
+        Returns:
+            str: OAuth access token.
+        """
+        async with self._token_lock:
+            if (self._token is not None
+                    and time.time() < self._expires_at
+                    - GOOGLE_TOKEN_REFRESH_MARGIN):
+                return self._token
+
+            info = self._load_info()
+            token_uri = info.get("token_uri", _DEFAULT_TOKEN_URI)
+            data = {"grant_type": _JWT_GRANT_TYPE,
+                    "assertion": self._make_assertion(token_uri)}
+
+            timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+            async with self._session.post(token_uri, data=data,
+                                          timeout=timeout) as response:
+                body: Dict[str, Any] = await response.json(content_type=None)
+                if response.status != SUCCESS_CODE:
+                    raise aiohttp.ClientError(
+                        f"token request failed: {response.status} "
+                        f"{body.get('error_description', '')}")
+
+            self._token = body["access_token"]
+            self._expires_at = time.time() + int(
+                body.get("expires_in", _TOKEN_LIFETIME))
+            return self._token
+
+    def _load_info(self) -> Dict[str, Any]:
+        """
+        Read the service-account key file once.
+
+        Returns:
+            Dict[str, Any]: Parsed service-account info.
+        """
+        if self._info is None:
+            with open(self._credentials_file, encoding="utf-8") as f:
+                self._info = json.load(f)
+            self._signer = crypt.RSASigner.from_service_account_info(
+                self._info)
+        return self._info
+
+    def _make_assertion(self, token_uri: str) -> str:
+        """
+        Build the signed JWT exchanged for an access token.
+
+        Args:
+            token_uri: OAuth token endpoint (the JWT audience).
+
+        Returns:
+            str: Encoded JWT.
+        """
+        now = int(time.time())
+        payload = {
+            "iss": self._info["client_email"],
+            "scope": " ".join(GOOGLE_SCOPES),
+            "aud": token_uri,
+            "iat": now,
+            "exp": now + _TOKEN_LIFETIME,
+        }
+        return jwt.encode(self._signer, payload).decode("utf-8")
+
+
+async def gspread_fetch(
+        config: BarsSheetConfig) -> Optional[List[List[str]]]:
+    """
+    Fallback SheetFetcher running the blocking gspread client in a thread.
+
+    Args:
+        config: Configuration object of the sheet.
+
+    Returns:
+        Worksheet rows, or None if an error occurs.
+    """
+    return await asyncio.to_thread(get_sheet_rows, config)
+
@@ -1,6 +1,161 @@
+import json
 import sqlite3
-from typing import Dict, Optional
-from lab4.constants import DATABASE_FILE
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import (Dict, Iterator, List, NamedTuple, Optional, Sequence,
+                    Tuple)
+from lab4.constants import (DATABASE_FILE, DATABASE_BUSY_TIMEOUT_MS,
+                            BARS_SHEETS, BarsSheetConfig,
+                            CHANGE_HISTORY_RETENTION_DAYS,
+                            CHANGE_HISTORY_DAILY_RETENTION_DAYS,
+                            CHANGE_HISTORY_PAGE_SIZE)
+
+# одно пишущее соединение на процесс; доступ из event loop и из to_thread
+_connection: Optional[sqlite3.Connection] = None
+_connection_lock = threading.RLock()
+
+# читающие соединения, по одному на поток: в WAL чтение не ждёт ни
+# блокировку пишущего соединения, ни его транзакцию
+_read_local = threading.local()
+_read_connections: List[sqlite3.Connection] = []
+_read_lock = threading.Lock()
+# растёт при close_db, чтобы потоки не взяли закрытое соединение
+_read_generation = 0
+
+# буфер истории изменений, сбрасывается одной транзакцией за цикл watcher'а
+_pending_changes: List[Tuple[str, str, str, str, str, str]] = []
+_pending_lock = threading.Lock()
+
+# кэш подписок identifier -> [chat_id] и счётчик subscriptions_version,
+# которому он соответствует (счётчик растёт от триггеров любого процесса;
+# свои записи процесс вносит в кэш сам, перечитывается только чужие)
+_subscriptions_cache: Optional[Dict[str, List[int]]] = None
+_subscriptions_lock = threading.Lock()
+_subscriptions_version = 0
+
+
+class ChangeRecord(NamedTuple):
+    """
+    One changed cell from change_history.
+    """
+    id: int
+    table_id: str
+    identifier: str
+    column_name: str
+    old_value: Optional[str]
+    new_value: Optional[str]
+    changed_at: str
+
+
+class DailyChange(NamedTuple):
+    """
+    Changes of one cell during one day, rolled up from change_history.
+    """
+    day: str
+    table_id: str
+    identifier: str
+    column_name: str
+    changes: int
+    first_value: Optional[str]
+    last_value: Optional[str]
+
+
+_SUBSCRIPTIONS_COLUMNS = """
+    id INTEGER PRIMARY KEY,
+    identifier TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (identifier, chat_id)
+"""
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Return the process-wide SQLite connection, opening it on first use.
+    
+    The connection is switched to WAL mode with synchronous=NORMAL, so commits
+    do not fsync the main database file. It is used for writes only; callers
+    must hold the connection lock (see _locked_connection). Reads go through
+    _read_connection and do not wait for that lock.
+    
+    Returns:
+        sqlite3.Connection: Shared connection to DATABASE_FILE.
+    """
+    global _connection
+
+    with _connection_lock:
+        if _connection is None:
+            conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute(f"PRAGMA busy_timeout={DATABASE_BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA foreign_keys=ON")
+            _connection = conn
+        return _connection
+
+
+@contextmanager
+def _locked_connection() -> Iterator[sqlite3.Connection]:
+    """
+    Hold the connection lock for the duration of a block.
+    
+    Yields:
+        sqlite3.Connection: Shared connection, safe to use inside the block.
+    """
+    with _connection_lock:
+        yield get_connection()
+
+
+@contextmanager
+def _read_connection() -> Iterator[sqlite3.Connection]:
+    """
+    Provide the calling thread's read-only connection, opening it on first use.
+    
+    WAL lets these connections read while the shared connection is writing, so
+    lookups made from the event loop are not queued behind flushes running in
+    worker threads. Each statement sees the latest committed data.
+    
+    Yields:
+        sqlite3.Connection: Connection owned by the current thread.
+    """
+    conn = getattr(_read_local, "connection", None)
+    if conn is None or _read_local.generation != _read_generation:
+        if _connection is None:
+            # пишущее соединение включает WAL, если база ещё не открывалась
+            get_connection()
+        conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout={DATABASE_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA query_only=ON")
+        with _read_lock:
+            _read_connections.append(conn)
+            _read_local.connection = conn
+            _read_local.generation = _read_generation
+    yield conn
+
+
+def close_db() -> None:
+    """
+    Flush buffered changes and close the shared and per-thread connections.
+    
+    Args: None
+    
+    Returns: None
+    """
+    global _connection, _read_generation
+
+    flush_changes()
+    with _read_lock:
+        for conn in _read_connections:
+            conn.close()
+        _read_connections.clear()
+        _read_generation += 1
+    with _connection_lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
 
 
 def init_db() -> None:
@@ -16,18 +171,50 @@ def init_db() -> None:
     
     Returns: None
     """
-    conn = sqlite3.connect(DATABASE_FILE)
+    with _locked_connection() as conn:
+        _create_tables(conn)
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
+    """
+    Create the schema on the given connection.
+    
+    Args:
+        conn: Connection to create the tables in.
+    
+    Returns: None
+    """
     cursor = conn.cursor()
 
-    # Таблица подписок: ИСУ/ФИО -> chat_id
+    # Таблица подписок: ИСУ/ФИО <-> chat_id (многие ко многим)
+    _migrate_unique_subscriptions(conn)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS subscriptions ({_SUBSCRIPTIONS_COLUMNS})
+    """)
+    # поиск по identifier покрывает индекс UNIQUE (identifier, chat_id)
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS subscriptions (
-            id INTEGER PRIMARY KEY,
-            identifier TEXT UNIQUE NOT NULL,
-            chat_id INTEGER NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_chat_id
+        ON subscriptions (chat_id)
+    """)
+
+    # счётчик изменений подписок: по нему кэш узнаёт о записях любого
+    # соединения или процесса, не перечитывая таблицу
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS subscriptions_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
         )
     """)
+    cursor.execute("INSERT OR IGNORE INTO subscriptions_version "
+                   "(id, version) VALUES (1, 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS subscriptions_{event.lower()}_version
+            AFTER {event} ON subscriptions
+            BEGIN
+                UPDATE subscriptions_version SET version = version + 1;
+            END
+        """)
 
     # Таблица истории изменений (опционально, для отладки)
     cursor.execute("""
@@ -42,8 +229,127 @@ def init_db() -> None:
         )
     """)
 
+    # выборки истории по студенту и по таблице за период
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_change_history_identifier_time
+        ON change_history (identifier, changed_at)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_change_history_table_time
+        ON change_history (table_id, changed_at)
+    """)
+
+    # Дневные сводки истории старше CHANGE_HISTORY_RETENTION_DAYS
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_history_daily (
+            day TEXT NOT NULL,
+            table_id TEXT NOT NULL,
+            identifier TEXT NOT NULL,
+            column_name TEXT NOT NULL,
+            changes INTEGER NOT NULL,
+            first_value TEXT,
+            last_value TEXT,
+            PRIMARY KEY (identifier, day, table_id, column_name)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_change_history_daily_table_day
+        ON change_history_daily (table_id, day)
+    """)
+
+    # Снимки строк для watcher: переживают рестарт бота
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS row_snapshots (
+            table_id TEXT NOT NULL,
+            row_index INTEGER NOT NULL,
+            row_values TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_id, row_index)
+        ) WITHOUT ROWID
+    """)
+
+    # где в таблицах встречается идентификатор: для чтения без выгрузки листа
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS row_identifiers (
+            identifier_key TEXT NOT NULL,
+            table_id TEXT NOT NULL,
+            row_index INTEGER NOT NULL,
+            identifier TEXT NOT NULL,
+            PRIMARY KEY (identifier_key, table_id, row_index)
+        ) WITHOUT ROWID
+    """)
+
+    # Заголовки столбцов последней выгрузки каждой таблицы
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sheet_headers (
+            table_id TEXT PRIMARY KEY,
+            headers TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Конфигурации таблиц; removed=1 - таблица удалена командой и не
+    # возвращается из BARS_SHEETS при следующем запуске
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sheet_configs (
+            table_id TEXT PRIMARY KEY,
+            config TEXT NOT NULL,
+            removed INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # таблицы из constants.py добавляются, только если их ещё нет в БД
+    cursor.executemany(
+        "INSERT OR IGNORE INTO sheet_configs (table_id, config) VALUES (?, ?)",
+        [(cfg["table_id"], json.dumps(cfg, ensure_ascii=False))
+         for cfg in BARS_SHEETS])
+
+    # Процессы-обработчики таблиц и срок их последнего продления
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS watcher_workers (
+            owner TEXT PRIMARY KEY,
+            expires_at REAL NOT NULL
+        )
+    """)
+
+    # Аренды таблиц: какой процесс опрашивает таблицу и до какого момента
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sheet_leases (
+            table_id TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+
     conn.commit()
-    conn.close()
+
+
+def _migrate_unique_subscriptions(conn: sqlite3.Connection) -> None:
+    """
+    Convert the old one-chat-per-identifier subscriptions table.
+    
+    Earlier versions declared identifier as UNIQUE, so a new subscriber silently
+    took the identifier away from the previous chat. The table is rebuilt with a
+    UNIQUE (identifier, chat_id) pair, keeping the existing rows.
+    
+    Args:
+        conn: Connection to migrate.
+    
+    Returns: None
+    """
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master "
+        "WHERE type = 'table' AND name = 'subscriptions'").fetchone()
+    if row is None or "identifier TEXT UNIQUE" not in row[0]:
+        return
+
+    with conn:
+        conn.execute("ALTER TABLE subscriptions RENAME TO subscriptions_old")
+        conn.execute(f"CREATE TABLE subscriptions ({_SUBSCRIPTIONS_COLUMNS})")
+        conn.execute(
+            "INSERT INTO subscriptions (identifier, chat_id, created_at) "
+            "SELECT identifier, chat_id, created_at FROM subscriptions_old")
+        conn.execute("DROP TABLE subscriptions_old")
 
 
 def add_subscription(identifier: str, chat_id: int) -> bool:
@@ -51,59 +357,143 @@ def add_subscription(identifier: str, chat_id: int) -> bool:
     Add a subscription mapping an identifier to a chat_id.
     
     This method ensures that a specific identifier (which could represent a user or entity) 
-    is associated with a Telegram chat ID in the database. If an existing subscription 
-    for the identifier already exists, it will be replaced with the new chat_id.
+    is associated with a Telegram chat ID in the database. An identifier may be followed by 
+    any number of chats and a chat may follow any number of identifiers; adding an existing 
+    pair is a no-op.
     
     Args:
         identifier (str): The identifier (e.g., user ID or name) to subscribe.
         chat_id (int): The Telegram chat ID to associate with the identifier.
     
     Returns:
-        bool: True if the subscription was successfully added or updated, False otherwise.
+        bool: True if the subscription exists after the call, False otherwise.
     """
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR REPLACE INTO subscriptions "
-            "(identifier, chat_id) VALUES (?, ?)",
-            (identifier, chat_id),
-        )
-        conn.commit()
-        conn.close()
+        with _locked_connection() as conn, conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO subscriptions "
+                "(identifier, chat_id) VALUES (?, ?)",
+                (identifier, chat_id),
+            )
+            if cursor.rowcount > 0:
+                _patch_subscriptions_cache(conn, identifier, chat_id, True)
         return True
     except Exception as e:
         print(f"Error adding subscription: {e}")
         return False
 
 
-def get_chat_id(identifier: str) -> Optional[int]:
+def remove_subscription(identifier: str, chat_id: int) -> bool:
     """
-    Retrieve the chat_id associated with a given identifier from the database.
+    Remove one chat's subscription to an identifier.
     
-    This method enables the bot to look up the Telegram chat ID for a specific user or entity identifier, which is essential for directing notifications and updates to the correct recipient.
+    Args:
+        identifier (str): The subscribed identifier (ISU number or full name).
+        chat_id (int): The Telegram chat ID to unsubscribe.
+    
+    Returns:
+        bool: True if a subscription was removed, False otherwise.
+    """
+    try:
+        with _locked_connection() as conn, conn:
+            cursor = conn.execute(
+                "DELETE FROM subscriptions "
+                "WHERE identifier = ? AND chat_id = ?",
+                (identifier, chat_id),
+            )
+            if cursor.rowcount > 0:
+                _patch_subscriptions_cache(conn, identifier, chat_id, False)
+        return cursor.rowcount > 0
+    except Exception as e:
+        print(f"Error removing subscription: {e}")
+        return False
+
+
+def _patch_subscriptions_cache(conn: sqlite3.Connection, identifier: str,
+                               chat_id: int, added: bool) -> None:
+    """
+    Apply this process's own subscription write to the cache.
+    
+    Called inside the write transaction, right after the write, so the version
+    read here is the one the write produced. If the cache is exactly one
+    version behind, only this write is missing and it is applied; otherwise
+    another process wrote in between, and the cache is left for
+    get_subscriptions_snapshot to reload.
     
     Args:
-        identifier (str): The unique identifier (e.g., ISU number or full name) used to look up the chat_id.
+        conn (sqlite3.Connection): Write connection inside the transaction.
+        identifier (str): The identifier that was subscribed or unsubscribed.
+        chat_id (int): The Telegram chat ID.
+        added (bool): True for a new subscription, False for a removed one.
+    """
+    global _subscriptions_cache, _subscriptions_version
+
+    version = conn.execute(
+        "SELECT version FROM subscriptions_version").fetchone()[0]
+    with _subscriptions_lock:
+        if (_subscriptions_cache is None
+                or version != _subscriptions_version + 1):
+            return
+        # копия, а не правка на месте: выданные снимки не меняются
+        cache = dict(_subscriptions_cache)
+        chat_ids = [c for c in cache.get(identifier, []) if c != chat_id]
+        if added:
+            chat_ids.append(chat_id)
+        if chat_ids:
+            cache[identifier] = chat_ids
+        else:
+            cache.pop(identifier, None)
+        _subscriptions_cache = cache
+        _subscriptions_version = version
+
+
+def get_chat_ids(identifier: str) -> List[int]:
+    """
+    Retrieve all chat_ids subscribed to a given identifier.
+    
+    This method enables the bot to look up the Telegram chats following a specific user or entity identifier, which is essential for directing notifications and updates to the correct recipients.
+    
+    Args:
+        identifier (str): The identifier (e.g., ISU number or full name) used to look up the chats.
     
     Returns:
-        Optional[int]: The chat_id if found, otherwise None if no matching record exists or an error occurs.
+        List[int]: Subscribed chat_ids in subscription order; empty if there are none or an error occurs.
     """
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT chat_id FROM subscriptions WHERE identifier = ?",
-            (identifier,))
-        row = cursor.fetchone()
-        conn.close()
-        return row[0] if row else None
+        with _read_connection() as conn:
+            rows = conn.execute(
+                "SELECT chat_id FROM subscriptions WHERE identifier = ? "
+                "ORDER BY id",
+                (identifier,)).fetchall()
+        return [row[0] for row in rows]
     except Exception as e:
-        print(f"Error getting chat_id: {e}")
-        return None
+        print(f"Error getting chat_ids: {e}")
+        return []
 
 
-def get_all_subscriptions() -> Dict[str, int]:
+def get_chat_identifiers(chat_id: int) -> List[str]:
+    """
+    Retrieve the identifiers a chat is subscribed to.
+    
+    Args:
+        chat_id (int): Telegram chat identifier.
+    
+    Returns:
+        List[str]: Identifiers in subscription order; empty if there are none or an error occurs.
+    """
+    try:
+        with _read_connection() as conn:
+            rows = conn.execute(
+                "SELECT identifier FROM subscriptions WHERE chat_id = ? "
+                "ORDER BY id",
+                (chat_id,)).fetchall()
+        return [row[0] for row in rows]
+    except Exception as e:
+        print(f"Error getting identifiers: {e}")
+        return []
+
+
+def get_all_subscriptions() -> Dict[str, List[int]]:
     """
     Retrieve all active subscriptions from the database as a mapping of identifiers to chat IDs.
     
@@ -114,21 +504,60 @@ def get_all_subscriptions() -> Dict[str, int]:
         None
     
     Returns:
-        Dict[str, int]: A dictionary where keys are unique identifiers and values are Telegram chat IDs.
-                       Returns an empty dictionary if an error occurs or no subscriptions exist.
+        Dict[str, List[int]]: A dictionary where keys are identifiers and values are the chat IDs following them.
+                             Returns an empty dictionary if an error occurs or no subscriptions exist.
     """
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT identifier, chat_id FROM subscriptions")
-        rows = cursor.fetchall()
-        conn.close()
-        return {row[0]: row[1] for row in rows}
+        with _read_connection() as conn:
+            rows = conn.execute(
+                "SELECT identifier, chat_id FROM subscriptions "
+                "ORDER BY id").fetchall()
+        subscriptions: Dict[str, List[int]] = {}
+        for identifier, chat_id in rows:
+            subscriptions.setdefault(identifier, []).append(chat_id)
+        return subscriptions
     except Exception as e:
         print(f"Error getting subscriptions: {e}")
         return {}
 
 
+def get_subscriptions_snapshot() -> Tuple[int, Dict[str, List[int]]]:
+    """
+    Return the cached subscriptions together with their version.
+    
+    add_subscription and remove_subscription apply this process's writes to
+    the cache directly. The table is reloaded only when the
+    subscriptions_version counter, bumped by triggers on every write to
+    subscriptions, moved past the cache because another process wrote.
+    Checking it is a single-row read on the thread's read connection, so the
+    call never waits for the write lock, but it is still a blocking query:
+    call it from a worker thread. Callers can compare the version with the
+    one they saw last instead of re-reading the table.
+    
+    Args:
+        None
+    
+    Returns:
+        Tuple[int, Dict[str, List[int]]]: The version and the mapping of identifiers
+            to chat IDs. The mapping is shared and must not be modified.
+    """
+    global _subscriptions_cache, _subscriptions_version
+
+    try:
+        with _read_connection() as conn:
+            version = conn.execute(
+                "SELECT version FROM subscriptions_version").fetchone()[0]
+        with _subscriptions_lock:
+            if (_subscriptions_cache is None
+                    or version != _subscriptions_version):
+                _subscriptions_cache = get_all_subscriptions()
+                _subscriptions_version = version
+            return _subscriptions_version, _subscriptions_cache
+    except Exception as e:
+        print(f"Error getting subscriptions snapshot: {e}")
+        return _subscriptions_version, _subscriptions_cache or {}
+
+
 def log_change(
         table_id: str,
         identifier: str,
@@ -140,7 +569,9 @@ def log_change(
     
     This method records changes made to specific columns in database tables,
     creating an audit trail that can be used for debugging, monitoring data modifications,
-    and maintaining data integrity.
+    and maintaining data integrity. The change is buffered in memory with its
+    timestamp and written by the next flush_changes call, so a bulk grade upload
+    costs one transaction instead of one commit per cell.
     
     Args:
         table_id: The identifier of the table where the change occurred
@@ -152,16 +583,559 @@ def log_change(
     Returns:
         None
     """
+    # тот же формат, что у CURRENT_TIMESTAMP (UTC)
+    changed_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    with _pending_lock:
+        _pending_changes.append((table_id, identifier, column_name,
+                                 old_value, new_value, changed_at))
+
+
+def flush_changes() -> int:
+    """
+    Write all buffered change-history rows in a single transaction.
+    
+    Args: None
+    
+    Returns:
+        int: Number of rows written; 0 if the buffer was empty or the write
+             failed (the rows are then kept for the next flush).
+    """
+    global _pending_changes
+
+    with _pending_lock:
+        if not _pending_changes:
+            return 0
+        batch = _pending_changes
+        _pending_changes = []
+
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute(
-            """INSERT INTO change_history
-               (table_id, identifier, column_name, old_value, new_value)
-               VALUES (?, ?, ?, ?, ?)""",
-            (table_id, identifier, column_name, old_value, new_value),
-        )
-        conn.commit()
-        conn.close()
+        with _locked_connection() as conn, conn:
+            conn.executemany(
+                """INSERT INTO change_history
+                   (table_id, identifier, column_name,
+                    old_value, new_value, changed_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                batch,
+            )
+        return len(batch)
+    except Exception as e:
+        print(f"Error logging changes: {e}")
+        with _pending_lock:
+            _pending_changes = batch + _pending_changes
+        return 0
+
+
+def load_row_snapshots(table_id: str) -> Optional[Dict[int, List[str]]]:
+    """
+    Load the persisted row snapshots of one table.
+    
+    Args:
+        table_id: The identifier of the table whose snapshots are loaded.
+    
+    Returns:
+        Optional[Dict[int, List[str]]]: Mapping of row index to the stored cell
+                                        values, or None if an error occurs.
+    """
+    try:
+        with _read_connection() as conn:
+            rows = conn.execute(
+                "SELECT row_index, row_values FROM row_snapshots "
+                "WHERE table_id = ?",
+                (table_id,)).fetchall()
+        return {row[0]: json.loads(row[1]) for row in rows}
+    except Exception as e:
+        print(f"Error loading row snapshots: {e}")
+        return None
+
+
+def save_row_snapshots(
+        snapshots: List[Tuple[str, int, List[str]]],
+        deleted: Sequence[Tuple[str, int]] = ()) -> bool:
+    """
+    Upsert changed row snapshots and delete removed ones in one transaction.
+    
+    Only the rows passed in are written, so the cost of a call is proportional
+    to the number of changed rows rather than to the size of the tables.
+    
+    Args:
+        snapshots: Tuples of (table_id, row_index, cell values).
+        deleted: (table_id, row_index) pairs whose snapshots are deleted.
+    
+    Returns:
+        bool: True if the snapshots were stored, False otherwise.
+    """
+    if not snapshots and not deleted:
+        return True
+
+    try:
+        with _locked_connection() as conn, conn:
+            conn.executemany(
+                "DELETE FROM row_snapshots "
+                "WHERE table_id = ? AND row_index = ?", deleted)
+            conn.executemany(
+                """INSERT OR REPLACE INTO row_snapshots
+                   (table_id, row_index, row_values)
+                   VALUES (?, ?, ?)""",
+                [(table_id, row_index,
+                  json.dumps(values, ensure_ascii=False))
+                 for table_id, row_index, values in snapshots],
+            )
+        return True
+    except Exception as e:
+        print(f"Error saving row snapshots: {e}")
+        return False
+
+
+def load_sheet_configs() -> Optional[List[BarsSheetConfig]]:
+    """
+    Load the configurations of all active sheets.
+    
+    Returns:
+        Optional[List[BarsSheetConfig]]: Configs in the order they were first
+                                         registered, or None if an error occurs.
+    """
+    try:
+        with _read_connection() as conn:
+            rows = conn.execute(
+                "SELECT config FROM sheet_configs WHERE removed = 0 "
+                "ORDER BY rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+    except Exception as e:
+        print(f"Error loading sheet configs: {e}")
+        return None
+
+
+def save_sheet_config(config: BarsSheetConfig) -> bool:
+    """
+    Add a sheet or replace its configuration.
+    
+    Args:
+        config: Sheet configuration; table_id is the key.
+    
+    Returns:
+        bool: True if the config was stored, False otherwise.
+    """
+    try:
+        with _locked_connection() as conn, conn:
+            conn.execute(
+                """INSERT INTO sheet_configs (table_id, config)
+                   VALUES (?, ?)
+                   ON CONFLICT (table_id) DO UPDATE SET
+                       config = excluded.config,
+                       removed = 0,
+                       updated_at = CURRENT_TIMESTAMP""",
+                (config["table_id"], json.dumps(config, ensure_ascii=False)))
+        return True
+    except Exception as e:
+        print(f"Error saving sheet config: {e}")
+        return False
+
+
+def remove_sheet_config(table_id: str) -> bool:
+    """
+    Mark a sheet as removed so it is no longer polled.
+    
+    Args:
+        table_id: The identifier of the table.
+    
+    Returns:
+        bool: True if an active sheet was removed, False if there was none or an
+              error occurs.
+    """
+    try:
+        with _locked_connection() as conn, conn:
+            cursor = conn.execute(
+                "UPDATE sheet_configs SET removed = 1, "
+                "updated_at = CURRENT_TIMESTAMP "
+                "WHERE table_id = ? AND removed = 0", (table_id,))
+            conn.execute("DELETE FROM sheet_leases WHERE table_id = ?",
+                         (table_id,))
+        return cursor.rowcount > 0
+    except Exception as e:
+        print(f"Error removing sheet config: {e}")
+        return False
+
+
+def forget_sheet_state(table_id: str) -> bool:
+    """
+    Delete the persisted watcher state of one table.
+    
+    Row snapshots, identifier locations and headers are dropped, so the next
+    poll seeds the table from scratch; change history is kept.
+    
+    Args:
+        table_id: The identifier of the table.
+    
+    Returns:
+        bool: True if the state was deleted, False otherwise.
+    """
+    try:
+        with _locked_connection() as conn, conn:
+            for table in ("row_snapshots", "row_identifiers",
+                          "sheet_headers"):
+                conn.execute(f"DELETE FROM {table} WHERE table_id = ?",
+                             (table_id,))
+        return True
+    except Exception as e:
+        print(f"Error deleting sheet state: {e}")
+        return False
+
+
+def get_change_history(
+        identifier: Optional[str] = None,
+        table_id: Optional[str] = None,
+        since: Optional[str] = None,
+        before: Optional[Tuple[str, int]] = None,
+        limit: int = CHANGE_HISTORY_PAGE_SIZE) -> List[ChangeRecord]:
+    """
+    Read one page of change history, newest first.
+    
+    Pages are addressed by keyset: pass (changed_at, id) of the last record of
+    the previous page as before. Filtering by identifier or table_id uses the
+    (identifier, changed_at) and (table_id, changed_at) indexes, so a page costs
+    the same regardless of how large the table is.
+    
+    Args:
+        identifier: Student identifier as it appears in the sheet.
+        table_id: Table name.
+        since: Lower bound on changed_at ("YYYY-MM-DD[ HH:MM:SS]", UTC).
+        before: (changed_at, id) of the last record already seen.
+        limit: Maximum number of records.
+    
+    Returns:
+        List[ChangeRecord]: Records ordered by changed_at and id descending;
+                            empty if nothing matches or an error occurs.
+    """
+    conditions: List[str] = []
+    params: List[object] = []
+
+    if identifier is not None:
+        conditions.append("identifier = ?")
+        params.append(identifier)
+    if table_id is not None:
+        conditions.append("table_id = ?")
+        params.append(table_id)
+    if since is not None:
+        conditions.append("changed_at >= ?")
+        params.append(since)
+    if before is not None:
+        conditions.append("(changed_at, id) < (?, ?)")
+        params.extend(before)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    params.append(limit)
+
+    try:
+        with _read_connection() as conn:
+            rows = conn.execute(
+                f"""SELECT id, table_id, identifier, column_name,
+                           old_value, new_value, changed_at
+                    FROM change_history {where}
+                    ORDER BY changed_at DESC, id DESC
+                    LIMIT ?""",
+                params).fetchall()
+        return [ChangeRecord(*row) for row in rows]
+    except Exception as e:
+        print(f"Error reading change history: {e}")
+        return []
+
+
+def get_daily_history(
+        identifier: Optional[str] = None,
+        table_id: Optional[str] = None,
+        since_day: Optional[str] = None,
+        limit: int = CHANGE_HISTORY_PAGE_SIZE,
+        offset: int = 0) -> List[DailyChange]:
+    """
+    Read rolled-up daily history, newest day first.
+    
+    Args:
+        identifier: Student identifier as it appears in the sheet.
+        table_id: Table name.
+        since_day: First day to include ("YYYY-MM-DD").
+        limit: Maximum number of records.
+        offset: Number of records to skip.
+    
+    Returns:
+        List[DailyChange]: Daily summaries; empty if nothing matches or an
+                           error occurs.
+    """
+    conditions: List[str] = []
+    params: List[object] = []
+
+    if identifier is not None:
+        conditions.append("identifier = ?")
+        params.append(identifier)
+    if table_id is not None:
+        conditions.append("table_id = ?")
+        params.append(table_id)
+    if since_day is not None:
+        conditions.append("day >= ?")
+        params.append(since_day)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    params.extend((limit, offset))
+
+    try:
+        with _read_connection() as conn:
+            rows = conn.execute(
+                f"""SELECT day, table_id, identifier, column_name, changes,
+                           first_value, last_value
+                    FROM change_history_daily {where}
+                    ORDER BY day DESC, table_id, column_name
+                    LIMIT ? OFFSET ?""",
+                params).fetchall()
+        return [DailyChange(*row) for row in rows]
+    except Exception as e:
+        print(f"Error reading daily history: {e}")
+        return []
+
+
+def compact_change_history(
+        retention_days: int = CHANGE_HISTORY_RETENTION_DAYS,
+        daily_retention_days: int = CHANGE_HISTORY_DAILY_RETENTION_DAYS
+) -> int:
+    """
+    Roll up change history older than the retention period into daily summaries.
+    
+    Cell-level rows of whole days before the cutoff are grouped per
+    (day, table, identifier, column) into change_history_daily, keeping the
+    number of changes and the first and last value of the day, and then deleted.
+    Daily summaries older than daily_retention_days are dropped. Everything
+    happens in one transaction, so a failure leaves the history untouched.
+    
+    Args:
+        retention_days: Days of cell-level history to keep.
+        daily_retention_days: Days of daily summaries to keep.
+    
+    Returns:
+        int: Number of cell-level rows compacted; 0 on errors.
+    """
+    # граница по началу суток: день сворачивается целиком
+    cutoff = f"-{retention_days} days"
+    daily_cutoff = f"-{daily_retention_days} days"
+
+    try:
+        with _locked_connection() as conn, conn:
+            conn.execute(
+                """INSERT INTO change_history_daily
+                   (day, table_id, identifier, column_name, changes,
+                    first_value, last_value)
+                   SELECT day, table_id, identifier, column_name, COUNT(*),
+                          MAX(first_value), MAX(last_value)
+                   FROM (
+                       SELECT date(changed_at) AS day, table_id, identifier,
+                              column_name,
+                              FIRST_VALUE(old_value) OVER (
+                                  PARTITION BY date(changed_at), table_id,
+                                               identifier, column_name
+                                  ORDER BY changed_at, id) AS first_value,
+                              FIRST_VALUE(new_value) OVER (
+                                  PARTITION BY date(changed_at), table_id,
+                                               identifier, column_name
+                                  ORDER BY changed_at DESC, id DESC
+                              ) AS last_value
+                       FROM change_history
+                       WHERE changed_at < date('now', ?)
+                   )
+                   GROUP BY day, table_id, identifier, column_name
+                   ON CONFLICT (identifier, day, table_id, column_name)
+                   DO UPDATE SET changes = changes + excluded.changes,
+                                 last_value = excluded.last_value""",
+                (cutoff,))
+            compacted = conn.execute(
+                "DELETE FROM change_history WHERE changed_at < date('now', ?)",
+                (cutoff,)).rowcount
+            conn.execute(
+                "DELETE FROM change_history_daily WHERE day < date('now', ?)",
+                (daily_cutoff,))
+        return compacted
     except Exception as e:
-        print(f"Error logging change: {e}")
+        print(f"Error compacting change history: {e}")
+        return 0
+
+
+def save_row_identifiers(table_id: str,
+                         entries: List[Tuple[str, int, str]]) -> bool:
+    """
+    Replace the stored identifier locations of one table.
+    
+    Args:
+        table_id: The identifier of the table.
+        entries: Tuples of (normalized identifier, row index, identifier as
+            written in the sheet).
+    
+    Returns:
+        bool: True if the locations were stored, False otherwise.
+    """
+    try:
+        with _locked_connection() as conn, conn:
+            conn.execute("DELETE FROM row_identifiers WHERE table_id = ?",
+                         (table_id,))
+            conn.executemany(
+                """INSERT OR IGNORE INTO row_identifiers
+                   (identifier_key, table_id, row_index, identifier)
+                   VALUES (?, ?, ?, ?)""",
+                [(key, table_id, row_index, identifier)
+                 for key, row_index, identifier in entries],
+            )
+        return True
+    except Exception as e:
+        print(f"Error saving row identifiers: {e}")
+        return False
+
+
+def find_identifier_rows(identifier_key: str) -> List[Tuple[str, int, str]]:
+    """
+    Look up the stored rows containing a normalized identifier.
+    
+    Args:
+        identifier_key: Identifier normalized with normalize_identifier.
+    
+    Returns:
+        List[Tuple[str, int, str]]: (table_id, row index, identifier as written
+            in the sheet) tuples; empty if nothing is found or an error occurs.
+    """
+    try:
+        with _read_connection() as conn:
+            rows = conn.execute(
+                "SELECT table_id, row_index, identifier FROM row_identifiers "
+                "WHERE identifier_key = ? ORDER BY table_id, row_index",
+                (identifier_key,)).fetchall()
+        return [(row[0], row[1], row[2]) for row in rows]
+    except Exception as e:
+        print(f"Error finding identifier rows: {e}")
+        return []
+
+
+def save_sheet_headers(table_id: str, headers: List[str]) -> bool:
+    """
+    Store the column headers of a table.
+    
+    Args:
+        table_id: The identifier of the table.
+        headers: Header cells of the sheet.
+    
+    Returns:
+        bool: True if the headers were stored, False otherwise.
+    """
+    try:
+        with _locked_connection() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sheet_headers (table_id, headers) "
+                "VALUES (?, ?)",
+                (table_id, json.dumps(headers, ensure_ascii=False)))
+        return True
+    except Exception as e:
+        print(f"Error saving sheet headers: {e}")
+        return False
+
+
+def load_sheet_headers(table_id: str) -> List[str]:
+    """
+    Load the stored column headers of a table.
+    
+    Args:
+        table_id: The identifier of the table.
+    
+    Returns:
+        List[str]: Header cells; empty if unknown or an error occurs.
+    """
+    try:
+        with _read_connection() as conn:
+            row = conn.execute(
+                "SELECT headers FROM sheet_headers WHERE table_id = ?",
+                (table_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else []
+    except Exception as e:
+        print(f"Error loading sheet headers: {e}")
+        return []
+
+
+def acquire_sheet_leases(owner: str, table_ids: List[str],
+                         ttl: float) -> Optional[List[str]]:
+    """
+    Renew a worker's leases and claim its fair share of unowned tables.
+    
+    The worker's heartbeat and leases are extended by ttl seconds. The share is
+    the number of tables divided by the workers whose heartbeat has not
+    expired, so when a worker dies its tables become free after ttl and are
+    split among the rest. Tables a worker holds beyond its share (e.g. after a
+    new worker joined) are left out of the result but keep their lease: the
+    worker stops polling them, saves their state and only then gives them
+    back with release_sheet_leases, so the next owner never starts from stale
+    snapshots. Everything happens in one IMMEDIATE transaction, so two workers
+    never claim the same table.
+    
+    Args:
+        owner: Unique name of the worker process.
+        table_ids: All configured tables.
+        ttl: Lease duration in seconds.
+    
+    Returns:
+        Optional[List[str]]: Tables the worker owns until the next renewal, or
+                             None if an error occurs.
+    """
+    now = time.time()
+    expires_at = now + ttl
+    try:
+        with _locked_connection() as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO watcher_workers (owner, expires_at) "
+                "VALUES (?, ?)", (owner, expires_at))
+            conn.execute("DELETE FROM watcher_workers WHERE expires_at <= ?",
+                         (now,))
+            workers = conn.execute(
+                "SELECT COUNT(*) FROM watcher_workers").fetchone()[0]
+
+            holders = dict(conn.execute(
+                "SELECT table_id, owner FROM sheet_leases "
+                "WHERE expires_at > ?", (now,)).fetchall())
+            share = -(-len(table_ids) // workers)
+
+            # лишние аренды не продлеваются, но и не удаляются здесь
+            owned = [t for t in table_ids if holders.get(t) == owner][:share]
+            free = [t for t in table_ids if t not in holders]
+            owned.extend(free[:max(share - len(owned), 0)])
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO sheet_leases "
+                "(table_id, owner, expires_at) VALUES (?, ?, ?)",
+                [(t, owner, expires_at) for t in owned])
+        return owned
+    except Exception as e:
+        print(f"Error acquiring sheet leases: {e}")
+        return None
+
+
+def release_sheet_leases(owner: str,
+                         table_ids: Optional[List[str]] = None) -> bool:
+    """
+    Give up leases of a worker.
+    
+    Args:
+        owner: Unique name of the worker process.
+        table_ids: Tables to give back; if None, the worker is shutting down
+            and gives back all its tables and its heartbeat.
+    
+    Returns:
+        bool: True if the leases were released, False otherwise.
+    """
+    try:
+        with _locked_connection() as conn, conn:
+            if table_ids is not None:
+                # только свои аренды: истёкшую могли уже забрать другие
+                conn.executemany(
+                    "DELETE FROM sheet_leases "
+                    "WHERE table_id = ? AND owner = ?",
+                    [(t, owner) for t in table_ids])
+                return True
+            conn.execute("DELETE FROM sheet_leases WHERE owner = ?", (owner,))
+            conn.execute("DELETE FROM watcher_workers WHERE owner = ?",
+                         (owner,))
+        return True
+    except Exception as e:
+        print(f"Error releasing sheet leases: {e}")
+        return False
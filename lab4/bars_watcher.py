@@ -1,44 +1,96 @@
 import asyncio
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, MutableMapping, Optional, Tuple
 import aiohttp
 
-from lab4.constants import (BARS_SHEETS, BarsSheetConfig,
-                            BARS_POLL_INTERVAL, ADDITIONAL_WAIT_TIME)
-from lab4.google_sheets_client import (
-    get_sheet_rows,
-    find_identifier_in_row,
-    get_column_headers,
+from lab4.constants import (BarsSheetConfig,
+                            BARS_POLL_INTERVAL, ADDITIONAL_WAIT_TIME,
+                            BARS_FETCH_TIMEOUT, BARS_NOTIFY_INTERVAL,
+                            GOOGLE_SHEETS_BACKEND,
+                            CHANGE_HISTORY_COMPACT_INTERVAL,
+                            SHEET_CONFIG_RELOAD_INTERVAL)
+from lab4.google_sheets_client import (get_column_headers,
+                                       forget_column_headers)
+from lab4.async_sheets_client import (
+    AsyncSheetsClient,
+    SheetFetcher,
+    gspread_fetch,
 )
 from lab4.bars_db import (
     init_db,
-    get_all_subscriptions,
+    get_subscriptions_snapshot,
     log_change,
+    flush_changes,
+    compact_change_history,
+    save_row_identifiers,
+    find_identifier_rows,
+    save_sheet_headers,
+    load_sheet_headers,
+    forget_sheet_state,
 )
+from lab4.metrics import (SHEET_FETCH_SECONDS, SHEET_FETCH_ERRORS,
+                          SHEET_FETCH_SKIPPED, ROWS_SCANNED, ROWS_CHANGED,
+                          CELLS_DIFFED, NOTIFICATIONS_QUEUED)
+from lab4.drive_revisions import SpreadsheetRevisionCache, gspread_transport
+from lab4.column_layout import (ColumnMapping, is_identity, map_columns,
+                                remap_values)
+from lab4.identifier_index import IdentifierIndex, normalize_identifier
+from lab4.notification_batch import NotificationBatch
+from lab4.row_state import RowState, make_row_state, row_digest
+from lab4.sheet_registry import (diff_sheet_configs, get_sheet_configs,
+                                 refresh_sheet_configs)
+from lab4.sheet_ranges import identifier_indexes
+from lab4.sheet_scheduler import SheetSchedule
+from lab4.snapshot_store import SnapshotStore
 
 # ключ (table_id, row_index)
-# значение {col_idx: cell_value} : состояние строки по столбцам
-PreviousState = Dict[Tuple[str, int], Dict[int, str]]
+# значение RowState : дайджест строки и кортеж значений ячеек
+# обычный dict или SnapshotStore, сохраняющий состояние на диск
+PreviousState = MutableMapping[Tuple[str, int], RowState]
+
+# индексы идентификаторов: table_id -> IdentifierIndex
+_identifier_indexes: Dict[str, IdentifierIndex] = {}
+
+# карта подписчиков по нормализованным идентификаторам и её версия
+_fanout_cache: Optional[Tuple[int, Dict[str, List[int]]]] = None
+
+# заголовки последней выгрузки: table_id -> ячейки строки заголовка
+_sheet_headers: Dict[str, List[str]] = {}
 
 
 async def poll_bars_and_notify(
         session: aiohttp.ClientSession,
         send_func,
         state: PreviousState,
-        interval: int = BARS_POLL_INTERVAL) -> None:
+        interval: int = BARS_POLL_INTERVAL,
+        revisions: Optional[SpreadsheetRevisionCache] = None,
+        fetch_rows: Optional[SheetFetcher] = None) -> None:
     """
     Periodically monitors configured data sources for changes and sends notifications when updates are detected.
     
-    This method continuously polls multiple data tables to detect modifications compared to the previous state. It maintains real-time synchronization between the data sources and notification system to ensure subscribers receive timely updates.
+    Every sheet is polled by its own loop with its own adaptive interval and fetch timeout, so a slow or hanging sheet never delays the others. Detected changes are collected in a shared batch which this coroutine flushes every BARS_NOTIFY_INTERVAL seconds, coalescing each chat's notifications across tables.
+    
+    Sheet configs are re-read from the database every SHEET_CONFIG_RELOAD_INTERVAL seconds; added, removed and modified sheets are started, stopped or restarted without touching the others (see reload_sheets).
     
     Args:
         session: HTTP client session for making API requests
         send_func: Function responsible for delivering notifications
         state: Object storing previous state data for change detection
-        interval: Polling interval in seconds (default: BARS_POLL_INTERVAL)
+        interval: Base polling interval in seconds for sheets without their own
+            poll_interval (default: BARS_POLL_INTERVAL)
+        revisions: Drive revision cache used to skip unchanged spreadsheets
+            (default: a cache on the configured Sheets backend)
+        fetch_rows: Coroutine function loading a sheet's rows (default: the
+            backend selected by GOOGLE_SHEETS_BACKEND)
     
     Returns:
         None
     """
+    default_fetch, default_revisions = make_sheet_backend(session)
+    if fetch_rows is None:
+        fetch_rows = default_fetch
+    if revisions is None:
+        revisions = default_revisions
+
     try:
         init_db()
         print("БД инициализирована")
@@ -48,30 +100,483 @@ async def poll_bars_and_notify(
 
     print(f"BARS watcher запущен (интервал: {interval}s)")
 
+    # уведомления копятся и склеиваются по чатам между сбросами
+    batch = NotificationBatch()
+
+    def start_sheet(cfg: BarsSheetConfig) -> asyncio.Task:
+        return asyncio.create_task(
+            poll_sheet(cfg, batch, state, revisions, fetch_rows, interval))
+
+    configs = await asyncio.to_thread(refresh_sheet_configs)
+    sheet_tasks = {table_id: start_sheet(cfg)
+                   for table_id, cfg in configs.items()}
+    # история старше срока хранения сворачивается в дневные сводки
+    compact_task = asyncio.create_task(compact_history_loop())
+
+    loop = asyncio.get_running_loop()
+    reload_at = loop.time() + SHEET_CONFIG_RELOAD_INTERVAL
+    try:
+        while True:
+            await asyncio.sleep(BARS_NOTIFY_INTERVAL)
+            await flush_cycle(session, send_func, batch, state)
+
+            if loop.time() >= reload_at:
+                configs = await reload_sheets(configs, sheet_tasks,
+                                              start_sheet, state, revisions)
+                for table_id, cfg in configs.items():
+                    if table_id not in sheet_tasks:
+                        sheet_tasks[table_id] = start_sheet(cfg)
+                reload_at = loop.time() + SHEET_CONFIG_RELOAD_INTERVAL
+    finally:
+        tasks = [compact_task, *sheet_tasks.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # при остановке на диск уходят накопленные снимки строк
+        await flush_cycle(session, send_func, batch, state)
+
+
+async def reload_sheets(
+        configs: Dict[str, BarsSheetConfig],
+        sheet_tasks: Dict[str, asyncio.Task],
+        start_sheet: Callable[[BarsSheetConfig], asyncio.Task],
+        state: PreviousState,
+        revisions: SpreadsheetRevisionCache) -> Dict[str, BarsSheetConfig]:
+    """
+    Re-read the sheet configs and apply the changes to the running sheets.
+    
+    Removed sheets are stopped and their caches and state dropped. Modified
+    sheets are restarted with the new config; their state is dropped only if
+    the source or layout changed, so e.g. a new poll_interval keeps the
+    snapshots. Added sheets are left to the caller, which decides which sheets
+    it runs.
+    
+    Args:
+        configs: Configs currently applied, by table_id
+        sheet_tasks: Polling tasks by table_id, updated in place
+        start_sheet: Function starting the polling task of a sheet
+        state: Previous state storage for change detection comparison
+        revisions: Cache of Drive revisions seen at the last successful fetch
+    
+    Returns:
+        The new configs by table_id
+    """
+    new_configs = await asyncio.to_thread(refresh_sheet_configs)
+    changes = diff_sheet_configs(configs, new_configs)
+    if not changes:
+        return new_configs
+
+    for table_id in changes.removed:
+        if await _stop_sheet(sheet_tasks, table_id):
+            print(f"Таблица {table_id} удалена из наблюдения")
+            await _reset_sheet(configs[table_id], state, revisions)
+
+    for cfg in changes.modified:
+        table_id = cfg["table_id"]
+        if not await _stop_sheet(sheet_tasks, table_id):
+            continue
+        if table_id in changes.reset:
+            await _reset_sheet(configs[table_id], state, revisions)
+        sheet_tasks[table_id] = start_sheet(cfg)
+        print(f"Настройки таблицы {table_id} обновлены")
+
+    return new_configs
+
+
+async def _stop_sheet(sheet_tasks: Dict[str, asyncio.Task],
+                      table_id: str) -> bool:
+    """
+    Cancel the polling task of a sheet and wait for it to finish.
+    
+    Args:
+        sheet_tasks: Polling tasks by table_id, updated in place
+        table_id: Name of the table
+    
+    Returns:
+        True if the sheet was being polled
+    """
+    task = sheet_tasks.pop(table_id, None)
+    if task is None:
+        return False
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return True
+
+
+async def _reset_sheet(cfg: BarsSheetConfig, state: PreviousState,
+                       revisions: SpreadsheetRevisionCache) -> None:
+    """
+    Drop everything remembered about one sheet, in memory and on disk.
+    
+    Other sheets keep their caches and snapshots.
+    
+    Args:
+        cfg: Config the sheet was polled with
+        state: Previous state storage for change detection comparison
+        revisions: Cache of Drive revisions seen at the last successful fetch
+    
+    Returns:
+        None
+    """
+    table_id = cfg["table_id"]
+    _identifier_indexes.pop(table_id, None)
+    _sheet_headers.pop(table_id, None)
+    forget_column_headers(cfg)
+    revisions.forget(table_id)
+
+    if isinstance(state, SnapshotStore):
+        state.forget_table(table_id)
+    else:
+        for key in [key for key in state if key[0] == table_id]:
+            del state[key]
+    await asyncio.to_thread(forget_sheet_state, table_id)
+
+
+def make_sheet_backend(
+        session: aiohttp.ClientSession
+) -> Tuple[SheetFetcher, SpreadsheetRevisionCache]:
+    """
+    Build the row fetcher and revision cache of the configured Sheets backend.
+    
+    Args:
+        session: HTTP client session used by the aiohttp backend
+    
+    Returns:
+        Tuple of the coroutine function loading a sheet's rows and the Drive
+        revision cache on the matching transport
+    """
+    if GOOGLE_SHEETS_BACKEND == "gspread":
+        return gspread_fetch, SpreadsheetRevisionCache(gspread_transport)
+
+    # запросы идут через общую aiohttp-сессию, без потоков
+    sheets_client = AsyncSheetsClient(session)
+    return (sheets_client.get_sheet_rows,
+            SpreadsheetRevisionCache(sheets_client.drive_transport))
+
+
+async def flush_cycle(
+        session: aiohttp.ClientSession,
+        send_func,
+        batch: NotificationBatch,
+        state: PreviousState) -> None:
+    """
+    Send collected notifications and persist the accumulated changes.
+    
+    Args:
+        session: HTTP client session for making API requests
+        send_func: Function responsible for delivering notifications
+        batch: Collector of pending notifications
+        state: Previous state storage, flushed if it is a SnapshotStore
+    
+    Returns:
+        None
+    """
+    try:
+        NOTIFICATIONS_QUEUED.inc(await batch.flush(session, send_func))
+
+        # подписки сверяются с БД раз за цикл, а не при каждом опросе листа
+        await _current_subscriptions(refresh=True)
+
+        # история изменений пишется одной транзакцией
+        await asyncio.to_thread(flush_changes)
+
+        # на диск уходят только строки, изменённые с прошлого сброса
+        if isinstance(state, SnapshotStore):
+            await state.flush()
+
+    except Exception as e:
+        print(f"Ошибка при отправке уведомлений: {e}")
+
+
+async def find_student_rows(identifier: str) -> List[Tuple[str, int, str]]:
+    """
+    Locate a student's rows in all watched tables without fetching any sheet.
+    
+    Tables already polled in this process are searched in their in-memory
+    identifier index; for the others the locations persisted by the last poll
+    are used.
+    
+    Args:
+        identifier: ISU number or full name, in any case or spacing
+    
+    Returns:
+        List of (table_id, row index, identifier as written in the sheet)
+    """
+    key = normalize_identifier(identifier)
+    found: List[Tuple[str, int, str]] = []
+    missing = False
+
+    for cfg in get_sheet_configs():
+        index = _identifier_indexes.get(cfg["table_id"])
+        if index is None:
+            missing = True
+            continue
+        found.extend((cfg["table_id"], i, raw) for i, raw in index.lookup(key))
+
+    if missing:
+        stored = await asyncio.to_thread(find_identifier_rows, key)
+        found.extend(entry for entry in stored
+                     if entry[0] not in _identifier_indexes)
+    return found
+
+
+async def get_table_headers(table_id: str) -> List[str]:
+    """
+    Return the column headers of a table from the last poll.
+    
+    Args:
+        table_id: Name of the table
+    
+    Returns:
+        Header cells; empty if the table has never been polled
+    """
+    headers = _sheet_headers.get(table_id)
+    if headers is None:
+        headers = await asyncio.to_thread(load_sheet_headers, table_id)
+        if headers:
+            _sheet_headers[table_id] = headers
+    return headers or []
+
+
+async def compact_history_loop(
+        interval: float = CHANGE_HISTORY_COMPACT_INTERVAL) -> None:
+    """
+    Periodically roll up old change history so the database stays small.
+    
+    Args:
+        interval: Seconds between compactions
+    
+    Returns:
+        None
+    """
+    while True:
+        compacted = await asyncio.to_thread(compact_change_history)
+        if compacted:
+            print(f"История изменений: свёрнуто {compacted} записей")
+        await asyncio.sleep(interval)
+
+
+async def poll_sheet(
+        cfg: BarsSheetConfig,
+        batch: NotificationBatch,
+        state: PreviousState,
+        revisions: SpreadsheetRevisionCache,
+        fetch_rows: SheetFetcher,
+        interval: int) -> None:
+    """
+    Poll one sheet forever on its own adaptive schedule.
+    
+    The interval shrinks to BARS_ACTIVE_POLL_INTERVAL after a change and backs
+    off while the sheet stays unchanged; fetches are bounded by the sheet's
+    fetch_timeout so a hanging request only affects this sheet.
+    
+    Args:
+        cfg: Configuration object of the sheet
+        batch: Collector of pending notifications
+        state: Previous state storage for change detection comparison
+        revisions: Cache of Drive revisions seen at the last successful fetch
+        fetch_rows: Coroutine function loading the sheet's rows
+        interval: Base interval used when the config has no poll_interval
+    
+    Returns:
+        None
+    """
+    schedule = SheetSchedule(cfg.get("poll_interval", interval))
+    timeout = cfg.get("fetch_timeout", BARS_FETCH_TIMEOUT)
+    seen_version: Optional[int] = None
+
+    # разносим первые запросы, чтобы листы не стартовали одновременно
+    await asyncio.sleep(schedule.initial_delay())
+
     while True:
         try:
-            subscriptions = get_all_subscriptions()
+            version, subscriptions = await _current_subscriptions()
+            # новые подписчики должны получить снимок строк даже
+            # с неизменённого листа
+            force = version != seen_version
+
+            skipped, revision, rows = await asyncio.wait_for(
+                _fetch_if_changed(cfg, revisions, fetch_rows, force),
+                timeout)
 
-            # создание тасков до их ожидания
-            tasks = [
-                _check_sheet(cfg, session, send_func, subscriptions, state)
-                for cfg in BARS_SHEETS]
+            if skipped:
+                SHEET_FETCH_SKIPPED.inc(1, cfg["table_id"])
+                schedule.record(changed=False)
+            elif rows is None:
+                print(f"Не удалось прочитать {cfg['table_id']}")
+                SHEET_FETCH_ERRORS.inc(1, cfg["table_id"])
+                schedule.record_error()
+            else:
+                changed = await _check_sheet(cfg, rows, batch,
+                                             subscriptions, state)
+                revisions.remember(cfg["table_id"], revision)
+                seen_version = version
+                # новая ревизия drive тоже признак активности листа
+                schedule.record(changed or (revision is not None
+                                            and not force))
 
-            await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.TimeoutError:
+            print(f"Таймаут при чтении {cfg['table_id']} ({timeout}s)")
+            SHEET_FETCH_ERRORS.inc(1, cfg["table_id"])
+            schedule.record_error()
 
-            await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            raise
 
         except Exception as e:
-            print(f"Ошибка в poll_bars_and_notify: {e}")
+            print(f"Ошибка при проверке {cfg['table_id']}: {e}")
+            schedule.record_error()
             await asyncio.sleep(ADDITIONAL_WAIT_TIME)
 
+        await asyncio.sleep(schedule.next_delay())
+
+
+async def _apply_header_changes(cfg: BarsSheetConfig, headers: List[str],
+                                state: PreviousState) -> None:
+    """
+    Bring a table's row snapshots to a new column layout and store the headers.
+    
+    Columns are matched by header and occurrence (see map_columns), so when a
+    column is inserted, deleted or moved the snapshots are rearranged once and
+    the following diff only reports real value changes: moved columns compare
+    equal, deleted columns disappear silently, and only non-empty cells of
+    inserted columns are reported.
+    
+    Args:
+        cfg: Configuration object of the sheet
+        headers: Header row of the current fetch
+        state: Previous state storage for change detection comparison
+    
+    Returns:
+        None
+    """
+    table_id = cfg["table_id"]
+    old_headers = await get_table_headers(table_id)
+    if headers == old_headers:
+        return
+
+    if old_headers and cfg["header_rows"]:
+        mapping = map_columns(old_headers, headers)
+        if not is_identity(mapping, len(old_headers)):
+            remapped = _remap_snapshots(table_id, mapping, state)
+            print(f"Столбцы {table_id} изменились, перестроено снимков: "
+                  f"{remapped}")
+
+    # снимки уже в новом расположении, поэтому заголовки обновляются в памяти
+    # даже при ошибке записи - иначе следующий опрос перестроит их повторно
+    _sheet_headers[table_id] = headers
+    await asyncio.to_thread(save_sheet_headers, table_id, headers)
+
+
+def _remap_snapshots(table_id: str, mapping: ColumnMapping,
+                     state: PreviousState) -> int:
+    """
+    Rearrange all stored rows of a table into a new column layout.
+    
+    Args:
+        table_id: Name of the table
+        mapping: Old column index for every new column
+        state: Previous state storage for change detection comparison
+    
+    Returns:
+        Number of rows rearranged
+    """
+    keys = [key for key in state if key[0] == table_id]
+    for key in keys:
+        state[key] = make_row_state(remap_values(state[key].values, mapping))
+    return len(keys)
+
+
+async def _current_subscriptions(
+        refresh: bool = False) -> Tuple[int, Dict[str, List[int]]]:
+    """
+    Return the subscription fan-out map, rebuilding it only on a new version.
+    
+    The database is consulted only on first use and when refresh is set,
+    which flush_cycle does once per cycle; sheet polls reuse the last map.
+    
+    Args:
+        refresh: Check the subscriptions version in the database
+    
+    Returns:
+        Tuple of the subscriptions version and the map from normalized
+        identifiers to chat IDs
+    """
+    global _fanout_cache
+
+    if _fanout_cache is None or refresh:
+        version, subscriptions = await asyncio.to_thread(
+            get_subscriptions_snapshot)
+        if _fanout_cache is None or _fanout_cache[0] != version:
+            _fanout_cache = (version, _normalize_subscriptions(subscriptions))
+    return _fanout_cache
+
+
+def _normalize_subscriptions(
+        subscriptions: Dict[str, List[int]]) -> Dict[str, List[int]]:
+    """
+    Build the fan-out map from normalized identifier to its followers.
+    
+    Identifiers that differ only in case or spacing are merged, so each chat
+    appears once per student.
+    
+    Args:
+        subscriptions: Dictionary mapping identifiers to chat IDs as stored in the DB
+    
+    Returns:
+        Dictionary mapping normalized identifiers to lists of chat IDs
+    """
+    fanout: Dict[str, List[int]] = {}
+    for identifier, chat_ids in subscriptions.items():
+        followers = fanout.setdefault(normalize_identifier(identifier), [])
+        for chat_id in chat_ids:
+            if chat_id not in followers:
+                followers.append(chat_id)
+    return fanout
+
+
+async def _fetch_if_changed(
+        cfg: BarsSheetConfig,
+        revisions: SpreadsheetRevisionCache,
+        fetch_rows: SheetFetcher,
+        force: bool
+) -> Tuple[bool, Optional[str], Optional[List[List[str]]]]:
+    """
+    Fetch a sheet unless the Drive revision of its spreadsheet is unchanged.
+    
+    The revision is requested before the data, so a change made during the fetch
+    is never lost: at worst the sheet is fetched once more next time. The caller
+    remembers the revision once the rows have been processed.
+    
+    Args:
+        cfg: Configuration object of the sheet
+        revisions: Cache of revisions seen at the last successful fetch
+        fetch_rows: Coroutine function loading the sheet's rows
+        force: Fetch even if the revision has not changed
+    
+    Returns:
+        Tuple of (skipped, revision, rows): skipped is True if the sheet is
+        unchanged and was not downloaded; rows are None if it was skipped or
+        the fetch failed
+    """
+    revision = await revisions.get_revision(cfg["spreadsheet_id"])
+    if not force and revisions.is_unchanged(cfg["table_id"], revision):
+        return True, revision, None
+
+    with SHEET_FETCH_SECONDS.time(cfg["table_id"]):
+        rows = await fetch_rows(cfg)
+    if rows is None:
+        revisions.forget(cfg["table_id"])
+
+    return False, revision, rows
+
 
 async def _check_sheet(
         cfg: BarsSheetConfig,
-        session: aiohttp.ClientSession,
-        send_func,
-        subscriptions: Dict[str, int],
-        state: PreviousState) -> None:
+        rows: Optional[List[List[str]]],
+        batch: NotificationBatch,
+        subscriptions: Dict[str, List[int]],
+        state: PreviousState) -> bool:
     """
     Check a single spreadsheet for changes and notify subscribed users.
     
@@ -81,104 +586,123 @@ async def _check_sheet(
     
     Args:
         cfg: Configuration object containing sheet settings like table ID and columns to scan
-        session: HTTP client session for making API requests
-        send_func: Callback function for sending notifications
-        subscriptions: Dictionary mapping identifiers to chat IDs for notification routing
+        rows: Freshly fetched worksheet rows, or None if the fetch failed
+        batch: Collector of pending notifications
+        subscriptions: Fan-out map from normalized identifiers to the chat IDs following them
         state: Previous state storage for change detection comparison
     
     Returns:
-        None
+        True if any tracked row changed since the previous poll
     """
-    rows = await asyncio.to_thread(get_sheet_rows, cfg)
     if rows is None:
         print(f"Не удалось прочитать {cfg['table_id']}")
-        return
+        return False
+
+    if isinstance(state, SnapshotStore):
+        await state.load_table(cfg["table_id"])
 
     start_row = cfg["header_rows"]
-    columns_to_scan = cfg["columns_to_scan"]
-    column_headers = await asyncio.to_thread(get_column_headers, cfg)
+    id_candidates = identifier_indexes(cfg)
+    # заголовки из той же выгрузки, без повторного скачивания листа
+    column_headers = get_column_headers(cfg, rows)
 
-    for i, row in enumerate(rows[start_row:], start=start_row):
-        # поиск ису/фио в первых N столбцах
-        identifier = find_identifier_in_row(row, columns_to_scan)
-        if not identifier:
-            continue
+    # индекс ису/фио в столбцах идентификаторов пересобирается,
+    # только если эти столбцы изменились
+    index = _identifier_indexes.setdefault(cfg["table_id"], IdentifierIndex())
+    if index.update(rows, start_row, id_candidates):
+        # положение идентификаторов и заголовки нужны /grades и /history
+        # и после рестарта, до первого опроса
+        await asyncio.to_thread(save_row_identifiers, cfg["table_id"],
+                                [(key, i, raw) for key in index
+                                 for i, raw in index.lookup(key)])
+    if rows:
+        # вставка, удаление или перенос столбцов - перестройка снимков,
+        # а не изменение каждой строки
+        await _apply_header_changes(cfg, rows[0], state)
 
-        chat_id = subscriptions.get(identifier)
-        if chat_id is None:
-            chat_id = subscriptions.get(identifier.lower())
-        if chat_id is None:
+    # строки с подписчиками: индекс строки -> (идентификатор, chat_id);
+    # diff строки считается один раз и рассылается всем её подписчикам
+    tracked: Dict[int, Tuple[str, List[int]]] = {}
+    keys = subscriptions if len(subscriptions) <= len(index) else index
+    for identifier_key in keys:
+        followers = subscriptions.get(identifier_key)
+        if not followers:
             continue
+        for i, identifier in index.lookup(identifier_key):
+            _, chat_ids = tracked.setdefault(i, (identifier, []))
+            for chat_id in followers:
+                if chat_id not in chat_ids:
+                    chat_ids.append(chat_id)
+
+    changed = False
+    ROWS_SCANNED.inc(len(tracked), cfg["table_id"])
 
+    for i in sorted(tracked):
+        identifier, chat_ids = tracked[i]
+        row = rows[i]
         key = (cfg["table_id"], i)
         old_state = state.get(key)
+        digest = row_digest(row)
 
         if old_state is None:
-            state[key] = _row_to_dict(row)
+            state[key] = make_row_state(row, digest)
             continue
 
-        # проверка изменений
-        await _detect_and_notify(cfg,
-                                 session,
-                                 send_func,
-                                 chat_id,
-                                 identifier,
-                                 row,
-                                 old_state,
-                                 column_headers)
-        state[key] = _row_to_dict(row)
+        # неизменённая строка отсекается одним сравнением дайджестов,
+        # и снимок не перезаписывается
+        if old_state.digest == digest:
+            continue
 
+        # проверка изменений по столбцам; дайджест мог измениться и без
+        # изменений значений (например, добавились пустые ячейки)
+        row_changed = _detect_and_notify(cfg,
+                                         batch,
+                                         chat_ids,
+                                         identifier,
+                                         row,
+                                         old_state,
+                                         column_headers)
+        state[key] = make_row_state(row, digest)
+        if row_changed:
+            ROWS_CHANGED.inc(1, cfg["table_id"])
+            changed = True
 
-def _row_to_dict(row: List[str]) -> Dict[int, str]:
-    """
-    Convert a list into a dictionary mapping column indices to values.
-    
-    Args:
-        row: A list of string values representing a row of data.
-    
-    Returns:
-        A dictionary where keys are column indices (integers) and values are the corresponding elements from the input list.
-    
-    Why:
-        This conversion enables efficient column-based access to row data by index, which is useful for spreadsheet operations where specific columns need to be referenced or processed individually.
-    """
-    return {idx: val for idx, val in enumerate(row)}
+    return changed
 
 
-async def _detect_and_notify(
+def _detect_and_notify(
         cfg: BarsSheetConfig,
-        session: aiohttp.ClientSession,
-        send_func,
-        chat_id: int,
+        batch: NotificationBatch,
+        chat_ids: List[int],
         identifier: str,
         new_row: List[str],
-        old_state: Dict[int, str],
-        column_headers: Dict[int, str]) -> None:
+        old_state: RowState,
+        column_headers: Dict[int, str]) -> bool:
     """
-    Detects changes in a spreadsheet row and sends notifications about updates.
+    Detects changes in a spreadsheet row and queues notifications about updates.
     
     Compares the current row state with the previous state to identify modified values,
-    logs detected changes, and sends a formatted notification message if any changes are found.
+    logs detected changes, and adds them to the notification batch if any changes are found.
     
     Args:
         cfg: Configuration object containing table settings
-        session: HTTP client session for making requests
-        send_func: Function responsible for sending notifications
-        chat_id: Telegram chat identifier for the recipient
+        batch: Collector of pending notifications
+        chat_ids: Telegram chat identifiers of the recipients
         identifier: Unique identifier for the row being monitored
         new_row: Current row data as a list of string values
-        old_state: Previous row state as a dictionary mapping column indices to values
+        old_state: Previous row state with the old cell values
         column_headers: Dictionary mapping column indices to their header names
     
     Returns:
-        None
+        True if the row differs from the previous state, False otherwise
     """
-    new_state = _row_to_dict(new_row)
+    old_values = old_state.values
+    old_len = len(old_values)
 
     changes: List[str] = []
 
-    for col_idx, new_val in new_state.items():
-        old_val = old_state.get(col_idx, "")
+    for col_idx, new_val in enumerate(new_row):
+        old_val = old_values[col_idx] if col_idx < old_len else ""
 
         if new_val != old_val:
 
@@ -191,12 +715,9 @@ async def _detect_and_notify(
                        column_name, old_val, new_val)
 
     if not changes:
-        return
-
-    text = (
-        f"📊 {cfg['table_id']}\n\n"
-        f"Обновлены баллы ({identifier}):\n"
-        + "\n".join(f"* {c}" for c in changes)
-    )
+        return False
 
-    await send_func(session, chat_id, text)
+    CELLS_DIFFED.inc(len(changes), cfg["table_id"])
+    for chat_id in chat_ids:
+        batch.add(chat_id, cfg["table_id"], identifier, changes)
+    return True
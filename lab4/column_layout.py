@@ -0,0 +1,93 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# устойчивый ключ столбца: (заголовок, номер среди столбцов с тем же
+# заголовком), чтобы повторяющиеся "ЛР" не путались между собой
+ColumnKey = Tuple[str, int]
+
+# для каждого нового столбца - индекс того же столбца в старом
+# расположении, или None для вставленного столбца
+ColumnMapping = List[Optional[int]]
+
+
+def column_keys(headers: Sequence[str]) -> List[ColumnKey]:
+    """
+    Build a stable identity for every column from the header row.
+
+    Args:
+        headers: Header cells of the sheet.
+
+    Returns:
+        List[ColumnKey]: (stripped header, occurrence) per column, in order.
+    """
+    seen: Dict[str, int] = {}
+    keys: List[ColumnKey] = []
+    for header in headers:
+        name = header.strip()
+        occurrence = seen.get(name, 0)
+        seen[name] = occurrence + 1
+        keys.append((name, occurrence))
+    return keys
+
+
+def map_columns(old_headers: Sequence[str],
+                new_headers: Sequence[str]) -> ColumnMapping:
+    """
+    Match the columns of two header rows of the same sheet.
+
+    Columns are matched by (header, occurrence), so inserted, deleted and
+    moved columns are recognized. A new column left unmatched is paired with
+    an unmatched old column at the same position, which treats a header
+    renamed in place as the same column rather than a delete and an insert.
+
+    Args:
+        old_headers: Header row the snapshots were taken with.
+        new_headers: Header row of the current fetch.
+
+    Returns:
+        ColumnMapping: Old index for every new column, None if it is new.
+    """
+    old_index = {key: i for i, key in enumerate(column_keys(old_headers))}
+    mapping: ColumnMapping = [old_index.get(key)
+                              for key in column_keys(new_headers)]
+
+    matched = {i for i in mapping if i is not None}
+    for new_col, old_col in enumerate(mapping):
+        if (old_col is None and new_col < len(old_headers)
+                and new_col not in matched):
+            mapping[new_col] = new_col
+            matched.add(new_col)
+    return mapping
+
+
+def is_identity(mapping: ColumnMapping, old_width: int) -> bool:
+    """
+    Tell whether a mapping leaves every column where it was.
+
+    Args:
+        mapping: Result of map_columns.
+        old_width: Number of columns in the old header row.
+
+    Returns:
+        bool: True if no column was inserted, deleted or moved.
+    """
+    return (len(mapping) == old_width
+            and all(old_col == new_col
+                    for new_col, old_col in enumerate(mapping)))
+
+
+def remap_values(values: Sequence[str],
+                 mapping: ColumnMapping) -> List[str]:
+    """
+    Rearrange a row's cell values into the new column layout.
+
+    Args:
+        values: Cells in the old layout.
+        mapping: Result of map_columns.
+
+    Returns:
+        List[str]: Cells in the new layout; inserted columns are empty, values
+        of deleted columns are dropped.
+    """
+    width = len(values)
+    return [values[old_col] if old_col is not None and old_col < width
+            else "" for old_col in mapping]
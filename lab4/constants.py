@@ -1,4 +1,5 @@
-from typing import Final, List, TypedDict
+import os
+from typing import Final, List, NotRequired, TypedDict
 
 # ссылка на сайт с цитатами
 QUOTES_URL: Final[str] = "https://quotes.toscrape.com/"
@@ -21,6 +22,66 @@ ADDITIONAL_WAIT_TIME = 5
 
 SUCCESS_CODE = 200
 
+TOO_MANY_REQUESTS_CODE = 429
+
+# лимиты telegram на исходящие сообщения (сообщений в секунду)
+TELEGRAM_GLOBAL_RATE: Final[float] = 30
+TELEGRAM_PER_CHAT_RATE: Final[float] = 1
+
+# максимальная длина текста одного сообщения telegram
+TELEGRAM_MESSAGE_LIMIT: Final[int] = 4096
+
+# воркеры и очередь диспетчера исходящих сообщений
+DISPATCHER_WORKERS: Final[int] = 4
+DISPATCHER_QUEUE_SIZE: Final[int] = 10000
+# сколько раз повторять отправку после 429 retry_after
+DISPATCHER_MAX_RETRIES: Final[int] = 3
+
+# сколько входящих обновлений обрабатывается одновременно
+UPDATE_CONCURRENCY: Final[int] = 32
+# сколько принятых, но не обработанных обновлений держать в памяти
+UPDATE_QUEUE_SIZE: Final[int] = 1000
+# сколько при остановке ждать обработки принятых обновлений (в секундах)
+SHUTDOWN_TIMEOUT: Final[float] = 5
+
+# режим получения обновлений: "polling" (getUpdates) или "webhook"
+BOT_MODE: Final[str] = os.getenv("BOT_MODE", "polling")
+# публичный https-адрес, который регистрируется в setWebhook
+WEBHOOK_URL: Final[str] = os.getenv("WEBHOOK_URL", "")
+# секрет из заголовка X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET: Final[str] = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST: Final[str] = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT: Final[int] = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH: Final[str] = "/telegram/webhook"
+# сколько параллельных соединений telegram открывает к webhook
+WEBHOOK_MAX_CONNECTIONS: Final[int] = 40
+# сколько ждать места в очереди обновлений, прежде чем ответить 503
+WEBHOOK_SUBMIT_TIMEOUT: Final[float] = 5
+
+# как часто цитата дня перезагружается в фоне (в секундах)
+QUOTE_REFRESH_INTERVAL: Final[float] = 3600
+# пауза перед повтором после неудачной загрузки цитаты
+QUOTE_RETRY_INTERVAL: Final[float] = 60
+
+# сколько байт страницы читать в поисках <title> и размер порции чтения
+TITLE_MAX_BYTES: Final[int] = 64 * 1024
+TITLE_CHUNK_SIZE: Final[int] = 4096
+
+NOT_MODIFIED_CODE = 304
+
+# адрес эндпоинта /metrics (порт 0 отключает его)
+METRICS_HOST: Final[str] = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT: Final[int] = int(os.getenv("METRICS_PORT", "9100"))
+
+# сколько секунд ответы внешних сервисов считаются свежими
+WEATHER_CACHE_TTL: Final[float] = 600
+HEADLINES_CACHE_TTL: Final[float] = 300
+# сколько ещё секунд после TTL можно отдавать устаревший ответ,
+# пока он обновляется в фоне
+RESPONSE_CACHE_STALE_TTL: Final[float] = 1800
+# максимальное число записей в одном кэше
+RESPONSE_CACHE_SIZE: Final[int] = 256
+
 HEADLINE_URLS: Final[List[str]] = [
     "https://example.com/",
     "https://news.ycombinator.com/",
@@ -29,9 +90,30 @@ HEADLINE_URLS: Final[List[str]] = [
 
 OPENWEATHER_URL: Final[str] = "https://api.openweathermap.org/data/2.5/weather"
 
+# метаданные файлов google drive (modifiedTime/version таблиц)
+DRIVE_FILES_URL: Final[str] = "https://www.googleapis.com/drive/v3/files"
+
 
 GOOGLE_SHEETS_CREDENTIALS_FILE: Final[str] = "antibars-credentials.json"
 
+GOOGLE_SCOPES: Final[List[str]] = [
+    "https://www.googleapis.com/auth/spreadsheets.readonly",
+    # modifiedTime/version для проверки, менялась ли таблица
+    "https://www.googleapis.com/auth/drive.metadata.readonly",
+]
+
+SHEETS_API_URL: Final[str] = "https://sheets.googleapis.com/v4/spreadsheets"
+# значения ячеек в том виде, в каком их видит преподаватель; с ними
+# сравниваются сохранённые снимки строк
+SHEETS_VALUE_RENDER_OPTION: Final[str] = "FORMATTED_VALUE"
+
+# чем читать таблицы: "aiohttp" (нативный async-клиент) или "gspread"
+GOOGLE_SHEETS_BACKEND: Final[str] = os.getenv("GOOGLE_SHEETS_BACKEND",
+                                              "aiohttp")
+
+# за сколько секунд до истечения OAuth-токена его обновлять заранее
+GOOGLE_TOKEN_REFRESH_MARGIN: Final[int] = 300
+
 
 class BarsSheetConfig(TypedDict):
     """
@@ -43,6 +125,13 @@ class BarsSheetConfig(TypedDict):
         - sheet_name: Name of the specific sheet within the spreadsheet.
         - header_rows: Number of header rows to skip before data begins.
         - columns_to_scan: Range of columns to extract data from.
+        - poll_interval: Optional base polling interval of this sheet in seconds.
+        - fetch_timeout: Optional timeout of one fetch of this sheet in seconds.
+        - tracked_columns: Optional column ranges ("D", "F:K") to fetch after the
+          identifier columns; without it the whole width is fetched.
+        - identifier_columns: Optional column ranges ("A:B") holding ISU numbers
+          and full names; without it the first columns_to_scan columns are used.
+        - max_rows: Optional number of rows to fetch, header rows included.
     
         This class provides the necessary configuration parameters to locate and extract
         bar data from a Google Sheets document, including spreadsheet identification,
@@ -54,8 +143,15 @@ class BarsSheetConfig(TypedDict):
     sheet_name: str  # имя листа
     header_rows: int  # сколько верхних строк — заголовок
     columns_to_scan: int  # в скольких первых столбцах искать ИСУ/ФИО
+    poll_interval: NotRequired[int]  # базовый интервал опроса листа
+    fetch_timeout: NotRequired[int]  # таймаут одной выгрузки листа
+    tracked_columns: NotRequired[List[str]]  # столбцы с баллами: "D", "F:K"
+    max_rows: NotRequired[int]  # сколько строк листа читать
+    identifier_columns: NotRequired[List[str]]  # столбцы с ИСУ/ФИО: "A:B"
 
 
+# начальный список таблиц: при запуске добавляется в БД, дальше таблицы
+# меняются командами /add_sheet и /remove_sheet без перезапуска
 BARS_SHEETS: Final[List[BarsSheetConfig]] = [
     {
         "spreadsheet_id": "1PTcXL_lbTWRSjAZNERmJexXVhD7JVPFOrRa0-dW1jtA",
@@ -101,6 +197,58 @@ BARS_SHEETS: Final[List[BarsSheetConfig]] = [
     }
 ]
 
-DATABASE_FILE: Final[str] = "bars_db.sqlite"
+# путь к БД; в docker указывает на том с данными, чтобы снимки строк
+# и подписки переживали передеплой
+DATABASE_FILE: Final[str] = os.getenv("DATABASE_FILE", "bars_db.sqlite")
+
+# сколько ждать блокировку БД другим процессом (в миллисекундах)
+DATABASE_BUSY_TIMEOUT_MS: Final[int] = 5000
+
+# сколько дней хранить историю изменений по ячейкам; старее - сворачивается
+# в дневные сводки
+CHANGE_HISTORY_RETENTION_DAYS: Final[int] = int(
+    os.getenv("CHANGE_HISTORY_RETENTION_DAYS", "30"))
+# сколько дней хранить дневные сводки
+CHANGE_HISTORY_DAILY_RETENTION_DAYS: Final[int] = int(
+    os.getenv("CHANGE_HISTORY_DAILY_RETENTION_DAYS", "365"))
+# как часто запускать сворачивание истории (в секундах)
+CHANGE_HISTORY_COMPACT_INTERVAL: Final[float] = 6 * 60 * 60
+# размер страницы при чтении истории
+CHANGE_HISTORY_PAGE_SIZE: Final[int] = 50
+# за сколько дней /history показывает изменения по умолчанию
+HISTORY_DEFAULT_DAYS: Final[int] = 7
+# больше дней /history не принимает: старше дневных сводок истории нет
+HISTORY_MAX_DAYS: Final[int] = CHANGE_HISTORY_DAILY_RETENTION_DAYS
 
 BARS_POLL_INTERVAL: Final[int] = 30
+
+# адаптивный опрос: после изменений лист опрашивается чаще, а пока он
+# не меняется, интервал растёт в BARS_POLL_BACKOFF раз до максимума
+BARS_ACTIVE_POLL_INTERVAL: Final[int] = 10
+BARS_MAX_POLL_INTERVAL: Final[int] = 300
+BARS_POLL_BACKOFF: Final[float] = 1.5
+# случайный разброс интервала (доля), чтобы листы не опрашивались разом
+BARS_POLL_JITTER: Final[float] = 0.1
+
+BARS_FETCH_TIMEOUT: Final[int] = 20
+
+# как часто отправлять накопленные уведомления и сбрасывать их на диск
+BARS_NOTIFY_INTERVAL: Final[int] = 5
+
+
+# число процессов-обработчиков таблиц; 0 - watcher работает в процессе бота
+WATCHER_WORKERS: Final[int] = int(os.getenv("WATCHER_WORKERS", "0"))
+# срок аренды таблицы процессом и период её продления (в секундах)
+WATCHER_LEASE_TTL: Final[int] = 60
+WATCHER_LEASE_RENEW_INTERVAL: Final[int] = 20
+# как часто координатор проверяет, живы ли процессы
+WATCHER_SUPERVISE_INTERVAL: Final[int] = 5
+
+# как часто watcher перечитывает конфигурации таблиц из БД (в секундах)
+SHEET_CONFIG_RELOAD_INTERVAL: Final[int] = 30
+# сколько строк заголовка можно задать через /add_sheet
+SHEET_MAX_HEADER_ROWS: Final[int] = 20
+# chat_id администраторов, которым доступны /sheets, /add_sheet, /remove_sheet
+ADMIN_CHAT_IDS: Final[List[int]] = [
+    int(chat_id) for chat_id in os.getenv("ADMIN_CHAT_IDS", "").split(",")
+    if chat_id.strip()]
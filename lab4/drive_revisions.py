@@ -0,0 +1,145 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import aiohttp
+
+from lab4.constants import DRIVE_FILES_URL, REQUEST_TIMEOUT, SUCCESS_CODE
+from lab4.google_sheets_client import authorized_get
+
+# транспорт: (url, params) -> (HTTP-статус, json-тело ответа)
+DriveTransport = Callable[[str, Dict[str, str]],
+                          Awaitable[Tuple[int, Dict[str, Any]]]]
+
+_REVISION_FIELDS = "modifiedTime,version"
+
+
+async def gspread_transport(url: str,
+                            params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+    """
+    Default transport: the shared gspread client's authorized session.
+
+    Args:
+        url: Drive API endpoint.
+        params: Query parameters.
+
+    Returns:
+        Tuple of the HTTP status code and the decoded JSON body.
+    """
+    return await asyncio.to_thread(authorized_get, url, params)
+
+
+def make_aiohttp_transport(
+        session: aiohttp.ClientSession,
+        headers: Optional[Dict[str, str]] = None) -> DriveTransport:
+    """
+    Build a transport on top of an aiohttp session.
+
+    Useful for pointing the revision check at a local fake Drive server together
+    with a custom base_url.
+
+    Args:
+        session: HTTP client session used for the requests.
+        headers: Extra headers (e.g. Authorization) sent with every request.
+
+    Returns:
+        DriveTransport: Coroutine function performing the GET request.
+    """
+    async def transport(url: str,
+                        params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        async with session.get(url, params=params, headers=headers,
+                               timeout=timeout) as response:
+            try:
+                body = await response.json(content_type=None)
+            except ValueError:
+                body = {}
+            return response.status, body or {}
+
+    return transport
+
+
+class SpreadsheetRevisionCache:
+    """
+    Cheap "has this spreadsheet changed" check based on Drive file metadata.
+
+    For every fetched unit (a spreadsheet_id, or a table_id when worksheets of
+    one spreadsheet are polled separately) the cache remembers the Drive
+    version/modifiedTime seen at its last successful fetch. Before the next
+    fetch a single small metadata request tells whether the full download can
+    be skipped.
+
+    Class Attributes:
+    - transport: Coroutine function performing GET requests (pluggable for tests).
+    - base_url: Drive files endpoint, DRIVE_FILES_URL by default.
+    """
+
+    def __init__(self, transport: DriveTransport = gspread_transport,
+                 base_url: str = DRIVE_FILES_URL) -> None:
+        self.transport = transport
+        self.base_url = base_url.rstrip("/")
+        self._revisions: Dict[str, str] = {}
+
+    async def get_revision(self, spreadsheet_id: str) -> Optional[str]:
+        """
+        Request the current revision of a spreadsheet.
+
+        Args:
+            spreadsheet_id: Google Sheets ID (same as the Drive file ID).
+
+        Returns:
+            Revision token, or None if it could not be determined; callers should
+            then fetch the spreadsheet as if it had changed.
+        """
+        url = f"{self.base_url}/{spreadsheet_id}"
+        params = {"fields": _REVISION_FIELDS, "supportsAllDrives": "true"}
+
+        try:
+            status, body = await self.transport(url, params)
+        except Exception as e:
+            print(f"Error checking revision of {spreadsheet_id}: {e}")
+            return None
+
+        if status != SUCCESS_CODE:
+            print(f"HTTP error checking revision of {spreadsheet_id}: "
+                  f"{status}")
+            return None
+
+        version = body.get("version")
+        modified_time = body.get("modifiedTime")
+        if version is None and modified_time is None:
+            return None
+        return f"{version}:{modified_time}"
+
+    def is_unchanged(self, key: str, revision: Optional[str]) -> bool:
+        """
+        Check whether a fetched unit still has the remembered revision.
+
+        Args:
+            key: spreadsheet_id or table_id the revision was remembered for.
+            revision: Revision returned by get_revision.
+
+        Returns:
+            True only if the revision is known and equals the remembered one.
+        """
+        return revision is not None and self._revisions.get(key) == revision
+
+    def remember(self, key: str, revision: Optional[str]) -> None:
+        """
+        Store the revision after a successful fetch.
+
+        Args:
+            key: spreadsheet_id or table_id that was fetched.
+            revision: Revision obtained before the fetch.
+        """
+        if revision is None:
+            self._revisions.pop(key, None)
+        else:
+            self._revisions[key] = revision
+
+    def forget(self, key: str) -> None:
+        """
+        Drop the remembered revision so the next poll fetches the data.
+
+        Args:
+            key: spreadsheet_id or table_id.
+        """
+        self._revisions.pop(key, None)
@@ -1,46 +1,168 @@
-from typing import List, Optional, Dict
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Dict, Tuple
 import gspread
+from gspread.urls import SPREADSHEET_VALUES_BATCH_URL
+from google.auth.transport.requests import Request
 from google.oauth2.service_account import Credentials
 
-from lab4.constants import GOOGLE_SHEETS_CREDENTIALS_FILE, BarsSheetConfig
-
-_SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
+from lab4.constants import (GOOGLE_SHEETS_CREDENTIALS_FILE, GOOGLE_SCOPES,
+                            GOOGLE_TOKEN_REFRESH_MARGIN, REQUEST_TIMEOUT,
+                            BARS_FETCH_TIMEOUT, BarsSheetConfig)
+from lab4.sheet_ranges import VALUES_PARAMS, assemble_rows, sheet_ranges
 
 # кэш заголовков: (spreadsheet_id, sheet_name) -> список имён столбцов
 _headers_cache: Dict[tuple, List[str]] = {}
 
+# один авторизованный клиент на весь процесс
+_credentials: Optional[Credentials] = None
+_client: Optional[gspread.Client] = None
+_client_lock = threading.Lock()
 
-def get_sheet_rows(config: BarsSheetConfig) -> Optional[List[List[str]]]:
+
+def get_client() -> gspread.Client:
     """
-    Retrieve all rows from a Google Sheets worksheet.
+    Return the process-wide authorized gspread client.
+    
+    The service-account file is read and the client is authorized only once; on
+    later calls the cached client is reused and its OAuth token is refreshed ahead
+    of expiry, so polling cycles never pay for a new authorization round-trip.
+    
+    Returns:
+        gspread.Client: Authorized client shared by all sheet fetches.
+    """
+    global _credentials, _client
+
+    with _client_lock:
+        if _client is None:
+            _credentials = Credentials.from_service_account_file(
+                GOOGLE_SHEETS_CREDENTIALS_FILE,
+                scopes=GOOGLE_SCOPES,
+            )
+            _client = gspread.authorize(_credentials)
+            # зависший запрос не должен вечно занимать поток
+            _client.set_timeout(BARS_FETCH_TIMEOUT)
+
+        if _token_expires_soon(_credentials):
+            _credentials.refresh(Request())
+
+        return _client
+
+
+def _token_expires_soon(creds: Credentials) -> bool:
+    """
+    Check whether the OAuth token is missing or about to expire.
     
     Args:
-        config: Configuration object containing spreadsheet ID and worksheet name.
+        creds: Service-account credentials of the shared client.
     
     Returns:
-        List of lists containing all worksheet values if successful, None if an error occurs.
+        True if the token should be refreshed before the next request.
+    """
+    if not creds.token or creds.expiry is None:
+        return True
+
+    # google-auth хранит expiry как naive UTC
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    margin = timedelta(seconds=GOOGLE_TOKEN_REFRESH_MARGIN)
+    return creds.expiry - now < margin
+
+
+def authorized_get(url: str,
+                   params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+    """
+    Perform a GET request with the shared client's authorized session.
+    
+    Args:
+        url: Google API endpoint.
+        params: Query parameters.
     
-    This method handles authentication and API interactions with Google Sheets to fetch
-    complete worksheet data. It returns None on errors to allow calling code to handle
-    failures gracefully rather than raising exceptions.
+    Returns:
+        Tuple of the HTTP status code and the decoded JSON body (empty dict if the
+        body is not JSON).
     """
+    response = get_client().session.get(url, params=params,
+                                        timeout=REQUEST_TIMEOUT)
     try:
-        creds = Credentials.from_service_account_file(
-            GOOGLE_SHEETS_CREDENTIALS_FILE,
-            scopes=_SCOPES,
-        )
-        client = gspread.authorize(creds)
-        spreadsheet = client.open_by_key(config["spreadsheet_id"])
-        sheet = spreadsheet.worksheet(config["sheet_name"])
+        body = response.json()
+    except ValueError:
+        body = {}
+    return response.status_code, body
 
-        return sheet.get_all_values()
+
+def fetch_spreadsheet(
+        spreadsheet_id: str,
+        configs: List[BarsSheetConfig]
+) -> Dict[str, Optional[List[List[str]]]]:
+    """
+    Fetch every configured worksheet of one spreadsheet in a single request.
+    
+    All worksheets are read with one values:batchGet call, without opening the
+    spreadsheet or its worksheets first. Only the configured ranges of each
+    worksheet are requested (see sheet_ranges). Headers are taken from the same
+    payload and stored in the headers cache, so no second download is needed
+    for them.
+    
+    Args:
+        spreadsheet_id: Google Sheets ID shared by all configs.
+        configs: Configurations of the worksheets to read from this spreadsheet.
+    
+    Returns:
+        Dictionary mapping table_id to the worksheet rows, or to None for every
+        table if the request failed.
+    """
+    config_ranges = [sheet_ranges(cfg) for cfg in configs]
+    ranges = [r for cfg_ranges in config_ranges for r in cfg_ranges]
+
+    try:
+        response = get_client().request(
+            "get",
+            SPREADSHEET_VALUES_BATCH_URL % spreadsheet_id,
+            params={"ranges": ranges, **VALUES_PARAMS},
+        )
+        value_ranges = response.json().get("valueRanges", [])
 
     except Exception as e:
-        print(f"Error reading sheet {config['table_id']}: {e}")
-        return None
+        tables = ", ".join(cfg["table_id"] for cfg in configs)
+        print(f"Error reading sheets {tables}: {e}")
+        return {cfg["table_id"]: None for cfg in configs}
+
+    result: Dict[str, Optional[List[List[str]]]] = {}
+    start = 0
+    for cfg, cfg_ranges in zip(configs, config_ranges):
+        parts = value_ranges[start:start + len(cfg_ranges)]
+        start += len(cfg_ranges)
+        rows = assemble_rows(cfg, [part.get("values", []) for part in parts])
+        result[cfg["table_id"]] = rows
+
+        if rows:
+            _headers_cache[(cfg["spreadsheet_id"], cfg["sheet_name"])] = rows[0]
+
+    return result
+
+
+def get_sheet_rows(config: BarsSheetConfig) -> Optional[List[List[str]]]:
+    """
+    Retrieve all rows from a Google Sheets worksheet.
+    
+    Args:
+        config: Configuration object containing spreadsheet ID and worksheet name.
+    
+    Returns:
+        List of lists containing all worksheet values if successful, None if an error occurs.
+    
+    This method uses the shared authorized client and a single-range batch request,
+    so no authorization or spreadsheet metadata round-trips are made. It returns None
+    on errors to allow calling code to handle failures gracefully rather than raising
+    exceptions.
+    """
+    return fetch_spreadsheet(config["spreadsheet_id"],
+                             [config])[config["table_id"]]
 
 
-def get_column_headers(config: BarsSheetConfig) -> Dict[int, str]:
+def get_column_headers(
+        config: BarsSheetConfig,
+        rows: Optional[List[List[str]]] = None) -> Dict[int, str]:
     """
     Extract column headers from the first row of a spreadsheet.
     
@@ -48,13 +170,18 @@ def get_column_headers(config: BarsSheetConfig) -> Dict[int, str]:
     
     Args:
         config: Configuration object containing spreadsheet_id and sheet_name identifiers.
+        rows: Already fetched worksheet rows. If given, headers are taken from them
+            instead of the cache or a new download.
     
     Returns:
         Dictionary mapping column indices (int) to header names (str).
     """
     cache_key = (config["spreadsheet_id"], config["sheet_name"])
 
-    if cache_key in _headers_cache:
+    if rows:
+        headers = rows[0]
+        _headers_cache[cache_key] = headers
+    elif cache_key in _headers_cache:
         headers = _headers_cache[cache_key]
     else:
         rows = get_sheet_rows(config)
@@ -67,26 +194,12 @@ def get_column_headers(config: BarsSheetConfig) -> Dict[int, str]:
     return {idx: name for idx, name in enumerate(headers)}
 
 
-def find_identifier_in_row(row: List[str],
-                           columns_to_scan: int = 50) -> Optional[str]:
+def forget_column_headers(config: BarsSheetConfig) -> None:
     """
-    Searches for the first non-empty value in the first N columns of a row.
-    
-    This function is used to extract meaningful data from spreadsheet rows by skipping
-    empty cells and returning the first available value. It helps identify rows that
-    contain actual data entries rather than blank or placeholder values.
-    
+    Drop the cached headers of a sheet, e.g. after its config changed.
+
     Args:
-        row: A list of strings representing a row from a spreadsheet or tabular data.
-        columns_to_scan: The maximum number of columns to check from the beginning of the row.
-                        Defaults to 50 columns.
-    
-    Returns:
-        The first non-empty string value found in the specified columns, or None if 
-        all scanned columns are empty.
+        config: Configuration object containing spreadsheet_id and sheet_name identifiers.
     """
-    for col_idx in range(min(columns_to_scan, len(row))):
-        val = row[col_idx].strip()
-        if val:
-            return val
-    return None
+    _headers_cache.pop((config["spreadsheet_id"], config["sheet_name"]), None)
+
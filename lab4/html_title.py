@@ -0,0 +1,85 @@
+import codecs
+import html
+import re
+from typing import Optional
+import aiohttp
+
+from lab4.constants import TITLE_CHUNK_SIZE, TITLE_MAX_BYTES
+
+_TITLE_RE = re.compile(rb"<title(?:\s[^>]*)?>(.*?)</title\s*>",
+                       re.IGNORECASE | re.DOTALL)
+_TITLE_END_RE = re.compile(rb"</title", re.IGNORECASE)
+# <meta charset="..."> и <meta http-equiv=... content="...; charset=...">
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?([\w.:-]+)",
+                              re.IGNORECASE)
+_DEFAULT_CHARSET = "utf-8"
+
+
+async def read_title(response: aiohttp.ClientResponse,
+                     max_bytes: int = TITLE_MAX_BYTES,
+                     chunk_size: int = TITLE_CHUNK_SIZE) -> Optional[str]:
+    """
+    Read a page only as far as its <title> element.
+
+    The body is consumed chunk by chunk and reading stops as soon as
+    </title> is seen or max_bytes have been read; the rest of the page is never
+    downloaded.
+
+    Args:
+        response: Response whose body has not been read yet.
+        max_bytes: Upper bound on the number of bytes read.
+        chunk_size: Size of one read.
+
+    Returns:
+        Decoded title text with entities resolved and whitespace collapsed, or
+        None if no complete title was found within the limit.
+    """
+    head = bytearray()
+    match = None
+
+    async for chunk in response.content.iter_chunked(chunk_size):
+        # ищем с небольшим перекрытием, чтобы не пропустить тег на границе
+        search_from = max(len(head) - len(b"</title"), 0)
+        head += chunk
+        if _TITLE_END_RE.search(head, search_from):
+            match = _TITLE_RE.search(head)
+            if match is not None:
+                break
+        if len(head) >= max_bytes:
+            break
+
+    if not response.content.at_eof():
+        # остаток страницы не нужен - соединение закрывается
+        response.close()
+    if match is None:
+        return None
+
+    charset = detect_charset(response, bytes(head))
+    text = match.group(1).decode(charset, errors="replace")
+    return " ".join(html.unescape(text).split())
+
+
+def detect_charset(response: aiohttp.ClientResponse, head: bytes) -> str:
+    """
+    Determine the encoding of a page from its headers or <meta> tags.
+
+    Args:
+        response: Response carrying the Content-Type header.
+        head: Beginning of the body.
+
+    Returns:
+        str: Name of a known codec, utf-8 if nothing usable is declared.
+    """
+    candidates = [response.charset]
+    meta = _META_CHARSET_RE.search(head)
+    if meta is not None:
+        candidates.append(meta.group(1).decode("ascii", errors="ignore"))
+
+    for charset in candidates:
+        if not charset:
+            continue
+        try:
+            return codecs.lookup(charset).name
+        except LookupError:
+            continue
+    return _DEFAULT_CHARSET
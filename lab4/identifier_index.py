@@ -0,0 +1,212 @@
+import re
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# номер ИСУ: 5-7 цифр (оценки и баллы короче)
+_ISU_RE = re.compile(r"^\d{5,7}$")
+# слово ФИО: только буквы, допускаются дефис и апостроф
+_NAME_WORD_RE = re.compile(r"^[^\W\d_]+(?:[-'][^\W\d_]+)*$")
+
+
+def normalize_identifier(value: str) -> str:
+    """
+    Normalize an ISU number or full name for lookups.
+
+    Case is folded and any run of whitespace is collapsed to a single space, so
+    "Иванов  Иван" from a sheet matches "иванов иван" from /set_fio.
+
+    Args:
+        value: Raw identifier from a sheet cell or a subscription.
+
+    Returns:
+        str: Normalized identifier ("" for blank values).
+    """
+    return " ".join(value.split()).casefold()
+
+
+def is_identifier(value: str) -> bool:
+    """
+    Tell whether a cell looks like an ISU number or a full name.
+
+    Grades ("5", "зачёт", "н/а") are rejected, so they never end up in the
+    index and never match a subscription.
+
+    Args:
+        value: Raw cell value.
+
+    Returns:
+        bool: True for 5-7 digit numbers and for two or more words made of
+        letters (hyphens and apostrophes allowed, e.g. "Петров-Водкин").
+    """
+    value = value.strip()
+    if _ISU_RE.match(value):
+        return True
+    words = value.split()
+    return len(words) >= 2 and all(_NAME_WORD_RE.match(w) for w in words)
+
+
+def identifier_columns(rows: List[List[str]],
+                       columns: Sequence[int]) -> List[int]:
+    """
+    Find the columns among the candidate columns that hold identifiers.
+
+    A column qualifies if most of its non-empty cells look like identifiers
+    and those values are mostly distinct: a grade column with name-like marks
+    ("не зачтено") repeats them from row to row, identifiers do not.
+
+    Args:
+        rows: Data rows (without headers).
+        columns: Indexes of the candidate columns, in order.
+
+    Returns:
+        List[int]: Indexes of the identifier columns, in order.
+    """
+    found: List[int] = []
+    width = max((len(row) for row in rows), default=0)
+    for col in columns:
+        if col >= width:
+            break
+        filled = 0
+        identifiers: List[str] = []
+        for row in rows:
+            cell = row[col] if col < len(row) else ""
+            if cell.strip():
+                filled += 1
+                if is_identifier(cell):
+                    identifiers.append(normalize_identifier(cell))
+        if (len(identifiers) * 2 > filled
+                and len(set(identifiers)) * 2 > len(identifiers)):
+            found.append(col)
+    return found
+
+
+def _column_values(rows: List[List[str]],
+                   columns: List[int]) -> List[Tuple[str, ...]]:
+    """
+    Extract the given columns of every row.
+
+    Args:
+        rows: Data rows.
+        columns: Column indexes.
+
+    Returns:
+        List of per-row tuples of the cells in those columns.
+    """
+    return [tuple(row[col] if col < len(row) else "" for col in columns)
+            for row in rows]
+
+
+def _column_runs(columns: Sequence[int]) -> List[Tuple[int, int]]:
+    """
+    Group sorted column indexes into contiguous slices.
+
+    Args:
+        columns: Column indexes in ascending order.
+
+    Returns:
+        List of (start, stop) slice bounds covering exactly those columns.
+    """
+    runs: List[Tuple[int, int]] = []
+    for col in columns:
+        if runs and runs[-1][1] == col:
+            runs[-1] = (runs[-1][0], col + 1)
+        else:
+            runs.append((col, col + 1))
+    return runs
+
+
+class IdentifierIndex:
+    """
+    Per-sheet index from normalized identifier to the rows that contain it.
+
+    Only cells that look like ISU numbers or full names are indexed, and only
+    in the columns that hold them, so a student is found both by ISU and by
+    full name whatever column comes first, while grade cells never match a
+    subscription. Identifier columns are detected again whenever the scanned
+    columns change, so a column filled in later is picked up, but the index is
+    rebuilt only when the identifiers themselves change; grade edits leave it
+    (and the persisted row_identifiers) untouched.
+    """
+
+    def __init__(self) -> None:
+        self._id_columns: Optional[List[int]] = None
+        self._values: List[Tuple[str, ...]] = []
+        self._scanned: List[List[List[str]]] = []
+        self._start_row = 0
+        self._columns: Tuple[int, ...] = ()
+        # нормализованный идентификатор -> [(индекс строки, исходное значение)]
+        self._rows: Dict[str, List[Tuple[int, str]]] = {}
+
+    def update(self, rows: List[List[str]], start_row: int,
+               columns: Sequence[int]) -> bool:
+        """
+        Bring the index in line with freshly fetched rows.
+
+        Args:
+            rows: All worksheet rows, including header rows.
+            start_row: Index of the first data row.
+            columns: Indexes of the columns that may hold identifiers, in
+                ascending order.
+
+        Returns:
+            bool: True if the index was rebuilt, False if it was reused.
+        """
+        data = rows[start_row:]
+        columns = tuple(columns)
+        # срезы сравниваются быстрее, чем ячейки по одной
+        runs = _column_runs(columns)
+        scanned = [[row[start:stop] for start, stop in runs] for row in data]
+        if (self._id_columns is not None
+                and start_row == self._start_row
+                and columns == self._columns
+                and scanned == self._scanned):
+            return False
+
+        # просматриваемые столбцы изменились: столбцы идентификаторов
+        # определяются заново, ведь заполненным мог оказаться новый столбец
+        id_columns = identifier_columns(data, columns)
+        values = _column_values(data, id_columns)
+        self._scanned = scanned
+        if (id_columns == self._id_columns
+                and start_row == self._start_row
+                and columns == self._columns
+                and values == self._values):
+            # изменились только оценки: индекс прежний
+            return False
+
+        index: Dict[str, List[Tuple[int, str]]] = {}
+        for i, cells in enumerate(values, start=start_row):
+            for cell in cells:
+                if not is_identifier(cell):
+                    continue
+                entries = index.setdefault(normalize_identifier(cell), [])
+                # одна строка может содержать и ИСУ, и ФИО
+                if not entries or entries[-1][0] != i:
+                    entries.append((i, cell.strip()))
+
+        self._id_columns = id_columns
+        self._values = values
+        self._start_row = start_row
+        self._columns = columns
+        self._rows = index
+        return True
+
+    def lookup(self, key: str) -> List[Tuple[int, str]]:
+        """
+        Find the rows containing a normalized identifier.
+
+        Args:
+            key: Identifier normalized with normalize_identifier.
+
+        Returns:
+            List of (row index, identifier as written in the sheet) pairs.
+        """
+        return self._rows.get(key, [])
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
@@ -0,0 +1,299 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import aiohttp
+
+from lab4.constants import (DISPATCHER_MAX_RETRIES, DISPATCHER_QUEUE_SIZE,
+                            DISPATCHER_WORKERS, TELEGRAM_GLOBAL_RATE,
+                            TELEGRAM_PER_CHAT_RATE)
+
+# функция отправки: (session, chat_id, text) -> доставлено ли сообщение
+SendFunc = Callable[[aiohttp.ClientSession, int, str], Awaitable[bool]]
+
+# после стольких чатов в памяти простаивающие чаты вычищаются
+_MAX_IDLE_CHANNELS = 1024
+
+
+class RetryAfter(Exception):
+    """
+    Raised by a send function when Telegram answers 429 Too Many Requests.
+
+    Class Attributes:
+    - retry_after: Number of seconds Telegram asks to wait before retrying.
+    """
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the rate of an operation on the event loop clock.
+
+    Class Attributes:
+    - rate: Tokens added per second.
+    - capacity: Maximum number of tokens, i.e. the allowed burst.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = asyncio.get_running_loop().time()
+        self._paused_until = 0.0
+
+    def reserve(self) -> float:
+        """
+        Take a token if one is available, without waiting.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the number of seconds until
+                   one becomes available.
+        """
+        now = asyncio.get_running_loop().time()
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    async def acquire(self) -> None:
+        """
+        Wait until a token is available and take it.
+        """
+        while True:
+            delay = self.reserve()
+            if delay == 0:
+                return
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hand out no tokens for the given time (used after a 429 answer).
+
+        Args:
+            seconds: Pause duration.
+        """
+        now = asyncio.get_running_loop().time()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0
+        self._updated = self._paused_until
+
+    def is_full(self) -> bool:
+        """
+        Check whether the bucket has refilled completely.
+
+        Returns:
+            bool: True if dropping the bucket would not allow an extra burst.
+        """
+        now = asyncio.get_running_loop().time()
+        if now < self._paused_until:
+            return False
+        elapsed = now - self._updated
+        return self._tokens + elapsed * self.rate >= self.capacity
+
+
+class _ChatChannel:
+    """
+    Pending messages and rate limiter of one chat.
+
+    Class Attributes:
+    - messages: Queued (session, text, attempts) entries in delivery order.
+    - bucket: Per-chat token bucket.
+    - scheduled: Whether the chat is in the ready queue or being served, so that
+      at most one worker handles it and its messages stay in order.
+    """
+
+    def __init__(self, rate: float) -> None:
+        self.messages: Deque[Tuple[aiohttp.ClientSession, str, int]] = deque()
+        self.bucket = TokenBucket(rate, capacity=1)
+        self.scheduled = False
+
+
+class MessageDispatcher:
+    """
+    Rate-limited outbound message queue for Telegram.
+
+    Callers hand messages off with send(), which has the same signature as
+    send_message and returns as soon as the message is queued. Messages are kept
+    in per-chat queues; chats that may send are put on a ready queue served by a
+    pool of worker tasks. Workers only ever wait for the global token bucket:
+    a chat whose own bucket is empty is re-scheduled for later instead of
+    blocking a worker. 429 answers are retried after the reported retry_after.
+    """
+
+    def __init__(self, send_func: SendFunc,
+                 workers: int = DISPATCHER_WORKERS,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 per_chat_rate: float = TELEGRAM_PER_CHAT_RATE,
+                 queue_size: int = DISPATCHER_QUEUE_SIZE,
+                 max_retries: int = DISPATCHER_MAX_RETRIES) -> None:
+        self._send_func = send_func
+        self._workers_count = workers
+        self._global_rate = global_rate
+        self._per_chat_rate = per_chat_rate
+        self._queue_size = queue_size
+        self._max_retries = max_retries
+        self._channels: Dict[int, _ChatChannel] = {}
+        self._workers: List[asyncio.Task] = []
+        self._ready: Optional["asyncio.Queue[int]"] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._global_bucket: Optional[TokenBucket] = None
+        self._pending = 0
+
+    def start(self) -> None:
+        """
+        Start the sender workers on the running event loop.
+        """
+        if self._workers:
+            return
+
+        self._ready = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self._queue_size)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._global_bucket = TokenBucket(self._global_rate)
+        self._workers = [asyncio.create_task(self._worker())
+                         for _ in range(self._workers_count)]
+
+    async def stop(self) -> None:
+        """
+        Cancel the workers; messages still queued are dropped.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def join(self) -> None:
+        """
+        Wait until every queued message has been delivered or dropped.
+        """
+        if self._idle is not None:
+            await self._idle.wait()
+
+    def qsize(self) -> int:
+        """
+        Return the number of queued and in-flight messages.
+        """
+        return self._pending
+
+    async def send(self, session: aiohttp.ClientSession,
+                   chat_id: int, text: str) -> bool:
+        """
+        Queue a message for delivery.
+
+        Waits only if queue_size messages are already pending, which applies
+        backpressure to the producer instead of growing memory without bound.
+
+        Args:
+            session: HTTP client session used for delivery.
+            chat_id: Telegram chat identifier of the recipient.
+            text: Message text.
+
+        Returns:
+            bool: Always True once the message is queued.
+        """
+        if not self._workers:
+            self.start()
+
+        await self._slots.acquire()
+        self._pending += 1
+        self._idle.clear()
+
+        channel = self._channels.get(chat_id)
+        if channel is None:
+            if len(self._channels) >= _MAX_IDLE_CHANNELS:
+                self._prune_idle_channels()
+            channel = self._channels[chat_id] = \
+                _ChatChannel(self._per_chat_rate)
+
+        channel.messages.append((session, text, 0))
+        if not channel.scheduled:
+            channel.scheduled = True
+            self._ready.put_nowait(chat_id)
+        return True
+
+    async def _worker(self) -> None:
+        """
+        Serve ready chats until cancelled.
+        """
+        while True:
+            chat_id = await self._ready.get()
+            channel = self._channels[chat_id]
+
+            delay = channel.bucket.reserve()
+            if delay > 0:
+                self._schedule(chat_id, delay)
+                continue
+
+            await self._global_bucket.acquire()
+            session, text, attempts = channel.messages.popleft()
+
+            try:
+                await self._send_func(session, chat_id, text)
+                self._done()
+            except RetryAfter as e:
+                print(f"Rate limited for {chat_id}, retry after "
+                      f"{e.retry_after}s (attempt {attempts + 1})")
+                # 429 может означать и общий лимит бота
+                channel.bucket.pause(e.retry_after)
+                self._global_bucket.pause(e.retry_after)
+                if attempts < self._max_retries:
+                    channel.messages.appendleft((session, text, attempts + 1))
+                else:
+                    print(f"Giving up on message to {chat_id} after "
+                          f"{self._max_retries} retries")
+                    self._done()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Dispatcher failed to deliver to {chat_id}: {e}")
+                self._done()
+
+            # в конец очереди: остальные чаты не ждут, пока этот
+            # отправит всё накопленное
+            if channel.messages:
+                self._schedule(chat_id, 0)
+            else:
+                channel.scheduled = False
+
+    def _schedule(self, chat_id: int, delay: float) -> None:
+        """
+        Put a chat back on the ready queue, now or after a delay.
+
+        Args:
+            chat_id: Telegram chat identifier.
+            delay: Seconds to wait before the chat becomes ready.
+        """
+        if delay > 0:
+            asyncio.get_running_loop().call_later(
+                delay, self._ready.put_nowait, chat_id)
+        else:
+            self._ready.put_nowait(chat_id)
+
+    def _done(self) -> None:
+        """
+        Account for a message that has left the dispatcher.
+        """
+        self._pending -= 1
+        self._slots.release()
+        if self._pending == 0:
+            self._idle.set()
+
+    def _prune_idle_channels(self) -> None:
+        """
+        Forget chats with nothing queued whose bucket has refilled.
+        """
+        idle = [chat_id for chat_id, channel in self._channels.items()
+                if not channel.scheduled and channel.bucket.is_full()]
+        for chat_id in idle:
+            del self._channels[chat_id]
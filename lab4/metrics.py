@@ -0,0 +1,430 @@
+import abc
+import bisect
+import time
+from contextlib import contextmanager
+from typing import (Any, Callable, Dict, Iterator, List, Optional, Sequence,
+                    Tuple)
+from aiohttp import web
+
+from lab4.constants import METRICS_HOST, METRICS_PORT
+
+# границы корзин гистограмм по умолчанию (в секундах)
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                                      0.5, 1, 2.5, 5, 10, 30)
+
+LabelValues = Tuple[str, ...]
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Metric(abc.ABC):
+    """
+    Common part of all metric types: name, help text and label names.
+
+    Class Attributes:
+    - name: Metric name in the exposition format.
+    - documentation: HELP text.
+    - labelnames: Names of the labels, in order.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _format_labels(self, values: LabelValues,
+                       extra: str = "") -> str:
+        """
+        Render a label set as {a="1",b="2"}.
+
+        Args:
+            values: Label values matching labelnames.
+            extra: Already formatted additional label (e.g. le="0.5").
+
+        Returns:
+            str: Label block, empty if there are no labels.
+        """
+        pairs = [f'{name}="{_escape(value)}"'
+                 for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        """
+        Return the sample lines of the metric.
+        """
+
+    def render(self) -> str:
+        """
+        Render the metric in the Prometheus text format.
+
+        Returns:
+            str: HELP and TYPE lines followed by the samples.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing value, optionally split by labels.
+
+    Incrementing is a dict lookup and a float addition; the watcher and the
+    bot run on one event loop, so no locking is needed.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        """
+        Increase the counter.
+
+        Args:
+            amount: Non-negative increment.
+            labels: Label values matching labelnames.
+        """
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        """
+        Return the current value for a label set.
+        """
+        return self._values.get(labels, 0.0)
+
+    def drain(self) -> Dict[LabelValues, float]:
+        """
+        Return the increments since the previous drain and reset the counter.
+        """
+        values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[LabelValues, float]) -> None:
+        """
+        Add increments drained from the same counter in another process.
+
+        Args:
+            values: Result of drain.
+        """
+        for labels, amount in values.items():
+            self.inc(amount, *labels)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._format_labels(labels)} {value}"
+                for labels, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """
+    Value read from a callback at scrape time (e.g. a queue depth).
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str,
+                 callback: Callable[[], float]) -> None:
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        try:
+            value = float(self.callback())
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e}")
+            return []
+        return [f"{self.name} {value}"]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values over fixed buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # по каждому набору меток: счётчики корзин (+Inf последней), сумма
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        Record one observation.
+
+        Args:
+            value: Observed value.
+            labels: Label values matching labelnames.
+        """
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """
+        Observe the duration of the enclosed block in seconds.
+
+        Args:
+            labels: Label values matching labelnames.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        """
+        Return the number of observations for a label set.
+        """
+        return sum(self._counts.get(labels, ()))
+
+    def drain(self) -> Dict[LabelValues, Tuple[List[int], float]]:
+        """
+        Return the observations since the previous drain and reset.
+
+        Returns:
+            Bucket counts and sum per label set.
+        """
+        data = {labels: (counts, self._sums[labels])
+                for labels, counts in self._counts.items()}
+        self._counts, self._sums = {}, {}
+        return data
+
+    def merge(self,
+              data: Dict[LabelValues, Tuple[List[int], float]]) -> None:
+        """
+        Add observations drained from the same histogram in another process.
+
+        Args:
+            data: Result of drain.
+        """
+        for labels, (counts, total) in data.items():
+            own = self._counts.get(labels)
+            if own is None:
+                own = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            for i, count in enumerate(counts):
+                own[i] += count
+            self._sums[labels] += total
+
+    def samples(self) -> List[str]:
+        lines: List[str] = []
+        for labels, counts in self._counts.items():
+            cumulative = 0
+            bounds = [str(b) for b in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = self._format_labels(labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = self._format_labels(labels)
+            lines.append(f"{self.name}_sum{plain} {self._sums[labels]}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together on /metrics.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """
+        Add a metric, replacing one with the same name.
+
+        Args:
+            metric: Metric to expose.
+
+        Returns:
+            The registered metric.
+        """
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str,
+                labelnames: Sequence[str] = ()) -> Counter:
+        """
+        Create and register a counter.
+        """
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str,
+                  labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """
+        Create and register a histogram.
+        """
+        return self.register(Histogram(name, documentation, labelnames,
+                                       buckets))
+
+    def gauge(self, name: str, documentation: str,
+              callback: Callable[[], float]) -> Gauge:
+        """
+        Create and register a gauge read from callback.
+        """
+        return self.register(Gauge(name, documentation, callback))
+
+    def drain(self) -> Dict[str, Any]:
+        """
+        Take the counter and histogram data recorded since the last drain.
+
+        Worker processes send the result to the process serving /metrics,
+        which adds it with merge; gauges are local and are not included.
+
+        Returns:
+            Dict[str, Any]: Drained data of non-empty metrics by name.
+        """
+        deltas: Dict[str, Any] = {}
+        for name, metric in self._metrics.items():
+            if isinstance(metric, (Counter, Histogram)):
+                data = metric.drain()
+                if data:
+                    deltas[name] = data
+        return deltas
+
+    def merge(self, deltas: Dict[str, Any]) -> None:
+        """
+        Add data drained from the registry of another process.
+
+        Args:
+            deltas: Result of drain; unknown metric names are ignored.
+        """
+        for name, data in deltas.items():
+            metric = self._metrics.get(name)
+            if isinstance(metric, (Counter, Histogram)):
+                metric.merge(data)
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: Exposition text ending with a newline.
+        """
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+def _escape(value: str) -> str:
+    """
+    Escape a label value for the exposition format.
+
+    Args:
+        value: Raw label value.
+
+    Returns:
+        str: Value with backslashes, quotes and newlines escaped.
+    """
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+REGISTRY = MetricsRegistry()
+
+# watcher
+SHEET_FETCH_SECONDS = REGISTRY.histogram(
+    "bars_sheet_fetch_seconds", "Time to fetch one sheet.", ["table_id"])
+SHEET_FETCH_ERRORS = REGISTRY.counter(
+    "bars_sheet_fetch_errors_total", "Failed or timed-out sheet fetches.",
+    ["table_id"])
+SHEET_FETCH_SKIPPED = REGISTRY.counter(
+    "bars_sheet_fetch_skipped_total",
+    "Polls skipped because the Drive revision was unchanged.", ["table_id"])
+ROWS_SCANNED = REGISTRY.counter(
+    "bars_rows_scanned_total", "Tracked rows compared with their snapshot.",
+    ["table_id"])
+ROWS_CHANGED = REGISTRY.counter(
+    "bars_rows_changed_total", "Tracked rows whose values changed.",
+    ["table_id"])
+CELLS_DIFFED = REGISTRY.counter(
+    "bars_cells_changed_total", "Changed cells found in tracked rows.",
+    ["table_id"])
+
+NOTIFICATIONS_QUEUED = REGISTRY.counter(
+    "bars_notifications_total",
+    "Change notification messages handed to the dispatcher.")
+
+# отправка сообщений
+MESSAGES_SENT = REGISTRY.counter(
+    "telegram_messages_sent_total", "Messages delivered by sendMessage.")
+MESSAGES_FAILED = REGISTRY.counter(
+    "telegram_messages_failed_total",
+    "Messages sendMessage failed to deliver.", ["reason"])
+SEND_SECONDS = REGISTRY.histogram(
+    "telegram_send_seconds", "Duration of sendMessage calls.")
+
+# входящие обновления
+UPDATE_SECONDS = REGISTRY.histogram(
+    "bot_update_handling_seconds", "Time to handle one incoming update.")
+UPDATE_ERRORS = REGISTRY.counter(
+    "bot_update_errors_total", "Updates whose handler raised.")
+
+
+def create_metrics_app(
+        registry: MetricsRegistry = REGISTRY) -> web.Application:
+    """
+    Build an aiohttp application serving GET /metrics.
+
+    Args:
+        registry: Registry to expose.
+
+    Returns:
+        web.Application: Application ready to be served.
+    """
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode("utf-8"),
+                            headers={"Content-Type": _CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+async def run_metrics_server(
+        host: str = METRICS_HOST,
+        port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+    """
+    Start the /metrics endpoint in the background.
+
+    Args:
+        host: Interface to listen on (local only by default).
+        port: TCP port; 0 disables the endpoint.
+
+    Returns:
+        Optional[web.AppRunner]: Runner to clean up on shutdown, or None if the
+        endpoint is disabled or could not be started.
+    """
+    if not port:
+        return None
+
+    runner = web.AppRunner(create_metrics_app())
+    try:
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        print(f"Can't start metrics server: {e}")
+        await runner.cleanup()
+        return None
+
+    print(f"Metrics available at http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,192 @@
+from typing import Dict, List, Tuple
+import aiohttp
+
+from lab4.constants import TELEGRAM_MESSAGE_LIMIT
+
+# секция уведомления: (заголовок, строки изменений)
+Section = Tuple[str, List[str]]
+
+_SECTION_SEPARATOR = "\n\n"
+
+
+class NotificationBatch:
+    """
+    Per-cycle aggregation of change notifications by chat.
+
+    The watcher adds one section per changed row; at the end of the cycle all
+    sections of a chat, from every table, are packed into as few messages as
+    Telegram's length limit allows.
+    """
+
+    def __init__(self) -> None:
+        self._sections: Dict[int, List[Section]] = {}
+
+    def add(self, chat_id: int, table_id: str, identifier: str,
+            changes: List[str]) -> None:
+        """
+        Add the changes of one row for one chat.
+
+        Args:
+            chat_id: Telegram chat identifier of the recipient.
+            table_id: Name of the table the row belongs to.
+            identifier: ISU or full name of the student.
+            changes: Formatted descriptions of the changed cells.
+        """
+        header = f"📊 {table_id}\n\nОбновлены баллы ({identifier}):"
+        lines = [f"* {c}" for c in changes]
+        self._sections.setdefault(chat_id, []).append((header, lines))
+
+    def __len__(self) -> int:
+        return len(self._sections)
+
+    def render(self,
+               limit: int = TELEGRAM_MESSAGE_LIMIT) -> Dict[int, List[str]]:
+        """
+        Build the message texts for every chat.
+
+        Args:
+            limit: Maximum length of one message.
+
+        Returns:
+            Dictionary mapping chat_id to its messages, in order.
+        """
+        return {chat_id: pack_sections(sections, limit)
+                for chat_id, sections in self._sections.items()}
+
+    async def flush(self, session: aiohttp.ClientSession, send_func,
+                    limit: int = TELEGRAM_MESSAGE_LIMIT) -> int:
+        """
+        Send all collected notifications and empty the batch.
+
+        Args:
+            session: HTTP client session passed to send_func.
+            send_func: Coroutine function (session, chat_id, text).
+            limit: Maximum length of one message.
+
+        Returns:
+            int: Number of messages handed to send_func.
+        """
+        messages = self.render(limit)
+        self._sections = {}
+
+        sent = 0
+        for chat_id, texts in messages.items():
+            for text in texts:
+                await send_func(session, chat_id, text)
+                sent += 1
+        return sent
+
+
+def message_length(text: str) -> int:
+    """
+    Measure a text the way Telegram applies its message length limit.
+
+    Args:
+        text: Message text.
+
+    Returns:
+        int: Length in UTF-16 code units; emoji and other characters outside
+        the Basic Multilingual Plane count as two.
+    """
+    return len(text.encode("utf-16-le")) // 2
+
+
+def pack_sections(sections: List[Section], limit: int) -> List[str]:
+    """
+    Pack notification sections into messages no longer than limit.
+
+    Lengths are measured with message_length. Whole sections are kept
+    together when possible. A section that does not fit
+    into one message is split between change lines, repeating its header in
+    every part; a single line longer than a message is cut.
+
+    Args:
+        sections: (header, lines) pairs in delivery order.
+        limit: Maximum length of one message.
+
+    Returns:
+        List of message texts.
+    """
+    messages: List[str] = []
+    current = ""
+
+    for header, lines in sections:
+        for part in _split_section(header, lines, limit):
+            if not current:
+                current = part
+            elif (message_length(current) + len(_SECTION_SEPARATOR)
+                  + message_length(part) <= limit):
+                current += _SECTION_SEPARATOR + part
+            else:
+                messages.append(current)
+                current = part
+
+    if current:
+        messages.append(current)
+    return messages
+
+
+def _split_section(header: str, lines: List[str], limit: int) -> List[str]:
+    """
+    Split one section into parts that each fit into a message.
+
+    Args:
+        header: Section header repeated at the top of every part.
+        lines: Change lines of the section.
+        limit: Maximum length of one part.
+
+    Returns:
+        List of section parts.
+    """
+    text = "\n".join([header] + lines)
+    if message_length(text) <= limit:
+        return [text]
+
+    # на строки изменений остаётся место под заголовком
+    room = max(limit - message_length(header) - 1, 1)
+
+    parts: List[str] = []
+    chunk: List[str] = []
+    chunk_len = 0
+
+    for line in lines:
+        for piece in _cut_line(line, room):
+            extra = message_length(piece) + (1 if chunk else 0)
+            if chunk and chunk_len + extra > room:
+                parts.append("\n".join([header] + chunk))
+                chunk, chunk_len = [], 0
+                extra = message_length(piece)
+            chunk.append(piece)
+            chunk_len += extra
+
+    if chunk:
+        parts.append("\n".join([header] + chunk))
+    return parts
+
+
+def _cut_line(line: str, room: int) -> List[str]:
+    """
+    Cut a line into pieces of at most room UTF-16 code units.
+
+    Args:
+        line: Change line.
+        room: Maximum length of one piece.
+
+    Returns:
+        List of pieces; a single piece if the line fits.
+    """
+    if message_length(line) <= room:
+        return [line]
+
+    pieces: List[str] = []
+    piece = ""
+    piece_len = 0
+    for char in line:
+        width = message_length(char)
+        if piece and piece_len + width > room:
+            pieces.append(piece)
+            piece, piece_len = "", 0
+        piece += char
+        piece_len += width
+    pieces.append(piece)
+    return pieces
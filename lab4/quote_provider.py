@@ -0,0 +1,188 @@
+import asyncio
+import html
+import re
+from typing import Optional, Tuple
+import aiohttp
+
+from lab4.constants import (QUOTE_REFRESH_INTERVAL, QUOTE_RETRY_INTERVAL,
+                            QUOTES_URL, REQUEST_TIMEOUT, SUCCESS_CODE)
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+_UNAVAILABLE = "I cant get a quote right now"
+
+
+def _element_re(tag: str, css_class: str, content: bool = True) -> re.Pattern:
+    """
+    Build a regular expression for an element with the given class.
+
+    Args:
+        tag: Tag name.
+        css_class: Class the element must have (among others).
+        content: Whether to capture the element's inner HTML.
+
+    Returns:
+        re.Pattern: Compiled expression.
+    """
+    opening = (rf"<{tag}\b[^>]*\sclass=[\"'](?:[^\"']*\s)?{css_class}"
+               rf"(?:\s[^\"']*)?[\"'][^>]*>")
+    if content:
+        opening += rf"(.*?)</{tag}>"
+    return re.compile(opening, re.DOTALL | re.IGNORECASE)
+
+
+_QUOTE_BLOCK_RE = _element_re("div", "quote", content=False)
+_QUOTE_TEXT_RE = _element_re("span", "text")
+_QUOTE_AUTHOR_RE = _element_re("small", "author")
+
+
+def parse_first_quote(page: str) -> Optional[Tuple[str, str]]:
+    """
+    Extract the text and author of the first div.quote of a page.
+
+    Only the first quote block is looked at, with targeted regular expressions
+    instead of building a DOM for the whole page.
+
+    Args:
+        page: HTML of the quotes page.
+
+    Returns:
+        Tuple of quote text and author name, or None if the page has no
+        parsable quote.
+    """
+    block = _QUOTE_BLOCK_RE.search(page)
+    if block is None:
+        return None
+
+    text = _QUOTE_TEXT_RE.search(page, block.end())
+    if text is None:
+        return None
+    author = _QUOTE_AUTHOR_RE.search(page, text.end())
+    if author is None:
+        return None
+
+    return _clean(text.group(1)), _clean(author.group(1))
+
+
+def _clean(fragment: str) -> str:
+    """
+    Turn an HTML fragment into plain text.
+
+    Args:
+        fragment: Inner HTML of an element.
+
+    Returns:
+        str: Text without tags and entities, stripped.
+    """
+    return html.unescape(_TAG_RE.sub("", fragment)).strip()
+
+
+class QuoteProvider:
+    """
+    Quote of the day kept in memory and refreshed in the background.
+
+    start() launches a task that downloads the quotes page over the bot's
+    aiohttp session every refresh_interval seconds (every retry_interval after
+    a failure). get_quote() answers from memory; only before the first
+    successful download it waits for a fetch, shared by all callers.
+
+    Class Attributes:
+    - url: Address of the quotes page.
+    - refresh_interval: Seconds between background refreshes.
+    - retry_interval: Seconds before retrying a failed refresh.
+    """
+
+    def __init__(self, url: str = QUOTES_URL,
+                 refresh_interval: float = QUOTE_REFRESH_INTERVAL,
+                 retry_interval: float = QUOTE_RETRY_INTERVAL) -> None:
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._quote: Optional[str] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Task] = None
+
+    def start(self, session: aiohttp.ClientSession) -> None:
+        """
+        Start prefetching quotes on the running event loop.
+
+        Args:
+            session: HTTP client session used for downloads.
+        """
+        self._session = session
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        """
+        Cancel the background refresh.
+        """
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    async def get_quote(self) -> str:
+        """
+        Return the current quote of the day.
+
+        Returns:
+            str: Formatted quote with author, or an error message if no quote
+                 could be downloaded yet.
+        """
+        if self._quote is not None:
+            return self._quote
+
+        quote = await asyncio.shield(self._fetch_shared())
+        return quote if quote is not None else _UNAVAILABLE
+
+    async def _refresh_loop(self) -> None:
+        """
+        Download the quote periodically until cancelled.
+        """
+        while True:
+            quote = await asyncio.shield(self._fetch_shared())
+            await asyncio.sleep(self.refresh_interval if quote is not None
+                                else self.retry_interval)
+
+    def _fetch_shared(self) -> asyncio.Task:
+        """
+        Return the in-flight download, starting one if there is none.
+
+        Returns:
+            asyncio.Task: Task resolving to the quote or None.
+        """
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._fetch())
+        return self._inflight
+
+    async def _fetch(self) -> Optional[str]:
+        """
+        Download and parse the quotes page, keeping the result in memory.
+
+        Returns:
+            Formatted quote, or None if the download or parsing failed; the
+            previous quote is kept in that case.
+        """
+        try:
+            timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+            async with self._session.get(self.url,
+                                         timeout=timeout) as response:
+                if response.status != SUCCESS_CODE:
+                    print(f"HTTP error in quote fetch: {response.status}")
+                    return None
+                page = await response.text()
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Quote request failed: {e}")
+            return None
+
+        parsed = parse_first_quote(page)
+        if parsed is None:
+            print("Quote parse error")
+            return None
+
+        quote_text, author_name = parsed
+        self._quote = f'{quote_text} — {author_name}'
+        return self._quote
@@ -0,0 +1,166 @@
+import asyncio
+from collections import OrderedDict
+from typing import (Any, Awaitable, Callable, Dict, Generic, Hashable,
+                    NamedTuple, TypeVar)
+
+from lab4.constants import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_STALE_TTL
+
+T = TypeVar("T")
+
+
+class UncachedResult(Exception):
+    """
+    Raised by a fetch function to return a value without caching it.
+
+    Used for error replies: the caller still gets the text, but the next request
+    tries the external service again instead of serving the error for a whole
+    TTL.
+
+    Class Attributes:
+    - value: Value handed to every caller waiting for this fetch.
+    """
+
+    def __init__(self, value: Any) -> None:
+        super().__init__(value)
+        self.value = value
+
+
+class _Entry(NamedTuple):
+    value: Any
+    fetched_at: float
+
+
+def normalize_key(text: str) -> str:
+    """
+    Normalize free-form user input used as a cache key.
+
+    Args:
+        text: Raw text, e.g. a city name.
+
+    Returns:
+        str: Case-folded text with collapsed whitespace.
+    """
+    return " ".join(text.split()).casefold()
+
+
+class AsyncTTLCache(Generic[T]):
+    """
+    Size-bounded async cache with TTL, request coalescing and
+    stale-while-revalidate.
+
+    A fresh entry is returned immediately. An entry older than ttl but younger
+    than ttl + stale_ttl is also returned immediately, while one background
+    task refreshes it. Concurrent misses for the same key share a single fetch.
+    Least recently used entries are evicted beyond max_size.
+
+    Class Attributes:
+    - ttl: Seconds an entry is served without a refresh.
+    - stale_ttl: Extra seconds an expired entry may be served while refreshing.
+    - max_size: Maximum number of entries kept.
+    """
+
+    def __init__(self, ttl: float,
+                 stale_ttl: float = RESPONSE_CACHE_STALE_TTL,
+                 max_size: int = RESPONSE_CACHE_SIZE) -> None:
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: Hashable,
+                  fetch: Callable[[], Awaitable[T]]) -> T:
+        """
+        Return the cached value for key, fetching it if needed.
+
+        Args:
+            key: Normalized cache key.
+            fetch: Coroutine function producing the value; it may raise
+                UncachedResult to return a value that must not be cached.
+
+        Returns:
+            The cached or freshly fetched value.
+        """
+        now = asyncio.get_running_loop().time()
+        entry = self._entries.get(key)
+
+        if entry is not None:
+            age = now - entry.fetched_at
+            if age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                if age >= self.ttl:
+                    # отдаём устаревшее значение, обновляем в фоне
+                    self._start_fetch(key, fetch)
+                return entry.value
+
+        task = self._start_fetch(key, fetch)
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Drop a cached entry.
+
+        Args:
+            key: Normalized cache key.
+        """
+        self._entries.pop(key, None)
+
+    def _start_fetch(self, key: Hashable,
+                     fetch: Callable[[], Awaitable[T]]) -> asyncio.Task:
+        """
+        Return the in-flight fetch of key, starting one if there is none.
+
+        Args:
+            key: Normalized cache key.
+            fetch: Coroutine function producing the value.
+
+        Returns:
+            asyncio.Task: Task resolving to the value.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, fetch))
+            task.add_done_callback(_report_failure)
+            self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key: Hashable,
+                     fetch: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fetch and store its result.
+
+        Args:
+            key: Normalized cache key.
+            fetch: Coroutine function producing the value.
+
+        Returns:
+            The fetched value.
+        """
+        try:
+            value = await fetch()
+        except UncachedResult as e:
+            return e.value
+        finally:
+            del self._inflight[key]
+
+        self._entries[key] = _Entry(value, asyncio.get_running_loop().time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return value
+
+
+def _report_failure(task: asyncio.Task) -> None:
+    """
+    Log a failed fetch; also marks the exception of background refreshes,
+    which nobody awaits, as retrieved.
+
+    Args:
+        task: Finished fetch task.
+    """
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Cache fetch failed: {task.exception()}")
@@ -0,0 +1,54 @@
+import sys
+from hashlib import blake2b
+from typing import List, NamedTuple, Optional, Tuple
+
+# разделитель ячеек при подсчёте дайджеста (в тексте ячеек не встречается)
+_CELL_SEPARATOR = "\x1f"
+
+
+class RowState(NamedTuple):
+    """
+    Compact snapshot of one tracked spreadsheet row.
+
+    Class Attributes:
+    - digest: Fingerprint of the whole row, compared first to skip unchanged rows.
+    - values: Cell values as a tuple of interned strings, so repeated marks and
+      empty cells are stored once per process instead of once per row.
+    """
+
+    digest: bytes
+    values: Tuple[str, ...]
+
+
+def row_digest(row: List[str]) -> bytes:
+    """
+    Compute a stable fingerprint of a row's cell values.
+
+    The digest does not depend on the process hash seed, so it stays comparable
+    across restarts.
+
+    Args:
+        row: Cell values of a spreadsheet row.
+
+    Returns:
+        bytes: 16-byte BLAKE2b digest of the row.
+    """
+    data = _CELL_SEPARATOR.join(row).encode("utf-8")
+    return blake2b(data, digest_size=16).digest()
+
+
+def make_row_state(row: List[str],
+                   digest: Optional[bytes] = None) -> RowState:
+    """
+    Build a RowState from a row, reusing an already computed digest.
+
+    Args:
+        row: Cell values of a spreadsheet row.
+        digest: Digest of the same row, if the caller has computed it.
+
+    Returns:
+        RowState: Snapshot with interned cell values.
+    """
+    if digest is None:
+        digest = row_digest(row)
+    return RowState(digest, tuple(map(sys.intern, row)))
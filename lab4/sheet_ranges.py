@@ -0,0 +1,283 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from lab4.constants import SHEETS_VALUE_RENDER_OPTION, BarsSheetConfig
+
+# диапазон столбцов: "D" или "D:H"
+_COLUMNS_RE = re.compile(r"^([A-Z]+)(?::([A-Z]+))?$")
+
+# параметры values:batchGet: строки целиком, отображаемые значения, а из
+# ответа - только сами значения, без эха диапазонов
+VALUES_PARAMS: Dict[str, str] = {
+    "majorDimension": "ROWS",
+    "valueRenderOption": SHEETS_VALUE_RENDER_OPTION,
+    "fields": "valueRanges(values)",
+}
+
+
+def quote_sheet_name(sheet_name: str) -> str:
+    """
+    Quote a worksheet name for use as an A1 range.
+
+    Args:
+        sheet_name: Worksheet name.
+
+    Returns:
+        str: Name in single quotes with inner quotes doubled.
+    """
+    return "'" + sheet_name.replace("'", "''") + "'"
+
+
+def column_number(letters: str) -> int:
+    """
+    Convert column letters to a 1-based column number ("A" -> 1, "AA" -> 27).
+
+    Args:
+        letters: Column letters in upper case.
+
+    Returns:
+        int: Column number.
+    """
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord("A") + 1
+    return number
+
+
+def column_letters(number: int) -> str:
+    """
+    Convert a 1-based column number to its letters (27 -> "AA").
+
+    Args:
+        number: Column number.
+
+    Returns:
+        str: Column letters.
+    """
+    letters = ""
+    while number:
+        number, rest = divmod(number - 1, 26)
+        letters = chr(ord("A") + rest) + letters
+    return letters
+
+
+def parse_spans(columns: List[str]) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse column ranges ("D", "F:K") into merged 1-based spans.
+
+    Args:
+        columns: Column ranges as written in the config.
+
+    Returns:
+        Optional[List[Tuple[int, int]]]: Sorted inclusive (first, last) spans
+        with overlapping and adjacent ranges merged, or None if a range is
+        invalid.
+    """
+    spans: List[Tuple[int, int]] = []
+    for column_range in columns:
+        match = _COLUMNS_RE.match(column_range.strip().upper())
+        if match is None:
+            return None
+        first = column_number(match.group(1))
+        last = column_number(match.group(2) or match.group(1))
+        spans.append((min(first, last), max(first, last)))
+    return merge_spans(spans)
+
+
+def merge_spans(spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Merge overlapping and adjacent column spans.
+
+    Args:
+        spans: Inclusive (first, last) spans in any order.
+
+    Returns:
+        List[Tuple[int, int]]: Disjoint spans sorted by first column.
+    """
+    merged: List[Tuple[int, int]] = []
+    for first, last in sorted(spans):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def identifier_spans(
+        config: BarsSheetConfig) -> Optional[List[Tuple[int, int]]]:
+    """
+    Return the column spans that hold ISU numbers and full names.
+
+    Args:
+        config: Sheet configuration.
+
+    Returns:
+        Optional[List[Tuple[int, int]]]: Spans of identifier_columns, or the
+        first columns_to_scan columns if it is not set; None if
+        identifier_columns is invalid.
+    """
+    columns = config.get("identifier_columns")
+    if not columns:
+        return [(1, config["columns_to_scan"])]
+
+    spans = parse_spans(columns)
+    if spans is None:
+        print(f"Invalid identifier_columns {columns} of {config['table_id']}")
+    return spans
+
+
+def column_spans(config: BarsSheetConfig) -> Optional[List[Tuple[int, int]]]:
+    """
+    Return the column spans to fetch: identifier columns, then tracked ones.
+
+    Tracked columns that are also identifier columns are fetched only once,
+    as part of the identifier spans.
+
+    Args:
+        config: Sheet configuration.
+
+    Returns:
+        Optional[List[Tuple[int, int]]]: 1-based inclusive (first, last)
+        columns, or None if the whole width of the sheet is fetched (no
+        tracked_columns, or a column range is invalid).
+    """
+    tracked = config.get("tracked_columns")
+    if not tracked:
+        return None
+
+    tracked_spans = parse_spans(tracked)
+    if tracked_spans is None:
+        print(f"Invalid tracked_columns {tracked} of {config['table_id']}, "
+              f"fetching all columns")
+        return None
+    id_spans = identifier_spans(config)
+    if id_spans is None:
+        return None
+    return id_spans + _subtract_spans(tracked_spans, id_spans)
+
+
+def identifier_indexes(config: BarsSheetConfig) -> List[int]:
+    """
+    Return the positions of the identifier columns in the fetched rows.
+
+    Args:
+        config: Sheet configuration.
+
+    Returns:
+        List[int]: 0-based indexes, in order. If only the configured columns
+        are fetched, the identifier spans come first in every row; otherwise
+        the indexes are the sheet columns of identifier_columns.
+    """
+    id_spans = identifier_spans(config)
+    if id_spans is None:
+        return list(range(config["columns_to_scan"]))
+    if column_spans(config) is None:
+        return [col - 1 for first, last in id_spans
+                for col in range(first, last + 1)]
+    return list(range(sum(last - first + 1 for first, last in id_spans)))
+
+
+def _subtract_spans(spans: List[Tuple[int, int]],
+                    removed: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Cut the removed columns out of spans.
+
+    Args:
+        spans: Disjoint spans to cut.
+        removed: Spans of columns to leave out.
+
+    Returns:
+        List[Tuple[int, int]]: What is left of spans, in order.
+    """
+    result: List[Tuple[int, int]] = []
+    for first, last in spans:
+        pieces = [(first, last)]
+        for cut_first, cut_last in removed:
+            left: List[Tuple[int, int]] = []
+            for piece_first, piece_last in pieces:
+                if cut_last < piece_first or cut_first > piece_last:
+                    left.append((piece_first, piece_last))
+                    continue
+                if piece_first < cut_first:
+                    left.append((piece_first, cut_first - 1))
+                if piece_last > cut_last:
+                    left.append((cut_last + 1, piece_last))
+            pieces = left
+        result.extend(pieces)
+    return result
+
+
+def sheet_ranges(config: BarsSheetConfig) -> List[str]:
+    """
+    Build the A1 ranges that cover the configured part of a sheet.
+
+    Without tracked_columns the whole worksheet is read (limited to max_rows
+    rows, if set); otherwise one range per column span, all starting at row 1
+    so row indexes stay the same as in the full sheet.
+
+    Args:
+        config: Sheet configuration.
+
+    Returns:
+        List[str]: Ranges for values:batchGet.
+    """
+    sheet = quote_sheet_name(config["sheet_name"])
+    max_rows = config.get("max_rows")
+    spans = column_spans(config)
+
+    if spans is None:
+        return [f"{sheet}!1:{max_rows}" if max_rows else sheet]
+
+    end_row = str(max_rows) if max_rows else ""
+    return [f"{sheet}!{column_letters(first)}1:{column_letters(last)}{end_row}"
+            for first, last in spans]
+
+
+def assemble_rows(config: BarsSheetConfig,
+                  values: List[List[List[str]]]) -> List[List[str]]:
+    """
+    Join the fetched ranges into rows of equal width.
+
+    Each row holds the identifier columns followed by the tracked columns (see
+    identifier_indexes), so the watcher sees a narrower sheet with the same row
+    numbers and the header row taken from the same ranges.
+
+    Args:
+        config: Sheet configuration the ranges were built from.
+        values: The "values" of every range, in the order of sheet_ranges.
+
+    Returns:
+        List of rows padded to equal width.
+    """
+    spans = column_spans(config)
+    if spans is None:
+        return fill_gaps(values[0] if values else [])
+
+    widths = [last - first + 1 for first, last in spans]
+    height = max((len(part) for part in values), default=0)
+    rows: List[List[str]] = []
+    for i in range(height):
+        row: List[str] = []
+        for part, width in zip(values, widths):
+            cells = part[i][:width] if i < len(part) else []
+            row.extend(cells)
+            row.extend([""] * (width - len(cells)))
+        rows.append(row)
+    return rows
+
+
+def fill_gaps(values: List[List[str]]) -> List[List[str]]:
+    """
+    Pad rows with empty strings to equal width, like gspread's get_all_values.
+
+    Args:
+        values: Rows as returned by the API (trailing empty cells omitted).
+
+    Returns:
+        List of rows of equal length.
+    """
+    if not values:
+        return []
+
+    width = max(len(row) for row in values)
+    return [row + [""] * (width - len(row)) for row in values]
@@ -0,0 +1,208 @@
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+from lab4.constants import (BARS_SHEETS, SHEET_MAX_HEADER_ROWS,
+                            BarsSheetConfig)
+from lab4.bars_db import (load_sheet_configs, save_sheet_config,
+                          remove_sheet_config, forget_sheet_state)
+from lab4.sheet_ranges import column_spans, identifier_spans
+
+# поля, от которых зависят номера строк и найденные идентификаторы:
+# при их изменении состояние таблицы собирается заново
+_LAYOUT_KEYS = ("spreadsheet_id", "sheet_name", "header_rows",
+                "columns_to_scan", "tracked_columns", "identifier_columns")
+
+# id таблицы в ссылке вида https://docs.google.com/spreadsheets/d/<id>/edit
+_SPREADSHEET_URL_RE = re.compile(r"/spreadsheets/d/([A-Za-z0-9_-]+)")
+
+# последние прочитанные конфигурации: table_id -> config
+_configs: Optional[Dict[str, BarsSheetConfig]] = None
+
+
+class SheetConfigChanges(NamedTuple):
+    """
+    Difference between two sets of sheet configurations.
+
+    Class Attributes:
+    - added: Configs of new sheets.
+    - removed: table_ids of sheets that are gone.
+    - modified: New configs of sheets whose settings changed.
+    - reset: table_ids among modified whose layout changed, so their row state
+      is no longer valid.
+    """
+
+    added: List[BarsSheetConfig]
+    removed: List[str]
+    modified: List[BarsSheetConfig]
+    reset: List[str]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+
+def get_sheet_configs() -> List[BarsSheetConfig]:
+    """
+    Return the current sheet configurations.
+
+    The database is read on first use; afterwards the configs last loaded by
+    refresh_sheet_configs are returned.
+
+    Returns:
+        List[BarsSheetConfig]: Active sheets.
+    """
+    if _configs is None:
+        return list(refresh_sheet_configs().values())
+    return list(_configs.values())
+
+
+def refresh_sheet_configs() -> Dict[str, BarsSheetConfig]:
+    """
+    Re-read the sheet configurations from the database.
+
+    Returns:
+        Dict[str, BarsSheetConfig]: Active sheets by table_id. If the database
+        cannot be read, the previous configs (or BARS_SHEETS) are kept.
+    """
+    global _configs
+
+    loaded = load_sheet_configs()
+    if loaded is not None:
+        _configs = {cfg["table_id"]: cfg for cfg in loaded}
+    elif _configs is None:
+        _configs = {cfg["table_id"]: cfg for cfg in BARS_SHEETS}
+    return dict(_configs)
+
+
+def diff_sheet_configs(old: Dict[str, BarsSheetConfig],
+                       new: Dict[str, BarsSheetConfig]) -> SheetConfigChanges:
+    """
+    Compare two sets of sheet configurations.
+
+    Args:
+        old: Configs currently applied, by table_id.
+        new: Configs just loaded, by table_id.
+
+    Returns:
+        SheetConfigChanges: What has to be started, stopped or restarted.
+    """
+    modified = [cfg for table_id, cfg in new.items()
+                if table_id in old and old[table_id] != cfg]
+    return SheetConfigChanges(
+        added=[cfg for table_id, cfg in new.items() if table_id not in old],
+        removed=[table_id for table_id in old if table_id not in new],
+        modified=modified,
+        reset=[cfg["table_id"] for cfg in modified
+               if layout_changed(old[cfg["table_id"]], cfg)])
+
+
+def layout_changed(old: BarsSheetConfig, new: BarsSheetConfig) -> bool:
+    """
+    Tell whether a config change invalidates the table's row state.
+
+    Args:
+        old: Previous config of the sheet.
+        new: New config of the sheet.
+
+    Returns:
+        bool: True if the source or the layout of the sheet changed.
+    """
+    return any(old.get(key) != new.get(key) for key in _LAYOUT_KEYS)
+
+
+def parse_sheet_config(text: str) -> Optional[BarsSheetConfig]:
+    """
+    Parse the arguments of /add_sheet.
+
+    Format: "table_id | spreadsheet id or URL | sheet name | header rows |
+    columns to scan | tracked columns | max rows | identifier columns". Header
+    rows and columns to scan default to 1 and 2; tracked columns ("D:H, K")
+    and max rows are optional and, when omitted, the whole sheet is fetched.
+    Identifier columns ("A:B") replace columns to scan when given. Empty
+    optional fields count as omitted. Header rows are limited to
+    SHEET_MAX_HEADER_ROWS and must leave room for data within max rows.
+
+    Args:
+        text: Text after the command.
+
+    Returns:
+        Optional[BarsSheetConfig]: Parsed config, or None if the text is invalid.
+    """
+    parts = [part.strip() for part in text.split("|")]
+    if len(parts) < 3 or len(parts) > 8 or not all(parts[:3]):
+        return None
+
+    # пустое необязательное поле - то же, что пропущенное
+    fields = parts + [""] * (8 - len(parts))
+    numbers = [fields[3] or "1", fields[4] or "2", fields[6] or "0"]
+    # длина ограничена, чтобы int() не разбирал огромные строки цифр
+    if not all(number.isdecimal() and len(number) <= 9
+               for number in numbers):
+        return None
+    header_rows, columns_to_scan, max_rows = map(int, numbers)
+    if header_rows > SHEET_MAX_HEADER_ROWS or columns_to_scan == 0:
+        return None
+    if max_rows and max_rows <= header_rows:
+        return None
+
+    match = _SPREADSHEET_URL_RE.search(parts[1])
+    config: BarsSheetConfig = {
+        "table_id": parts[0],
+        "spreadsheet_id": match.group(1) if match else parts[1],
+        "sheet_name": parts[2],
+        "header_rows": header_rows,
+        "columns_to_scan": columns_to_scan,
+    }
+
+    identifiers = fields[7].upper().replace(",", " ").split()
+    if identifiers:
+        config["identifier_columns"] = identifiers
+        if identifier_spans(config) is None:
+            return None
+    tracked = fields[5].upper().replace(",", " ").split()
+    if tracked:
+        config["tracked_columns"] = tracked
+        if column_spans(config) is None:
+            return None
+    if max_rows:
+        config["max_rows"] = max_rows
+    return config
+
+
+def register_sheet(config: BarsSheetConfig) -> bool:
+    """
+    Add a sheet or update its configuration.
+
+    If the source or layout of an existing sheet changes, its persisted row
+    state is dropped, so the watcher seeds it again instead of diffing against
+    rows of the old layout. Other sheets are not affected.
+
+    Args:
+        config: Sheet configuration.
+
+    Returns:
+        bool: True if the config was stored.
+    """
+    old = refresh_sheet_configs().get(config["table_id"])
+    if not save_sheet_config(config):
+        return False
+    if old is not None and layout_changed(old, config):
+        forget_sheet_state(config["table_id"])
+    refresh_sheet_configs()
+    return True
+
+
+def unregister_sheet(table_id: str) -> bool:
+    """
+    Stop watching a sheet and drop its persisted row state.
+
+    Args:
+        table_id: The identifier of the table.
+
+    Returns:
+        bool: True if the sheet existed and was removed.
+    """
+    if not remove_sheet_config(table_id):
+        return False
+    forget_sheet_state(table_id)
+    refresh_sheet_configs()
+    return True
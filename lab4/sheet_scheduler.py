@@ -0,0 +1,68 @@
+import random
+
+from lab4.constants import (BARS_ACTIVE_POLL_INTERVAL, BARS_MAX_POLL_INTERVAL,
+                            BARS_POLL_BACKOFF, BARS_POLL_JITTER)
+
+
+class SheetSchedule:
+    """
+    Adaptive polling interval of one sheet.
+
+    After a change the sheet is polled at the active interval; every poll that
+    finds nothing new multiplies the interval by the backoff factor, up to the
+    maximum. Errors fall back to the base interval. Each delay gets a random
+    jitter so that sheets with equal intervals do not fire at once.
+
+    Class Attributes:
+    - interval: Base interval in seconds.
+    - current: Interval that the next delay is derived from.
+    """
+
+    def __init__(self, interval: float,
+                 active_interval: float = BARS_ACTIVE_POLL_INTERVAL,
+                 max_interval: float = BARS_MAX_POLL_INTERVAL,
+                 backoff: float = BARS_POLL_BACKOFF,
+                 jitter: float = BARS_POLL_JITTER) -> None:
+        self.interval = interval
+        self.active_interval = min(active_interval, interval)
+        self.max_interval = max(max_interval, interval)
+        self.backoff = backoff
+        self.jitter = jitter
+        self.current = interval
+
+    def record(self, changed: bool) -> None:
+        """
+        Adjust the interval after a successful poll.
+
+        Args:
+            changed: Whether the poll detected a change.
+        """
+        if changed:
+            self.current = self.active_interval
+        else:
+            self.current = min(self.current * self.backoff, self.max_interval)
+
+    def record_error(self) -> None:
+        """
+        Return to the base interval after a failed or timed-out poll.
+        """
+        self.current = self.interval
+
+    def next_delay(self) -> float:
+        """
+        Return the jittered delay before the next poll.
+
+        Returns:
+            float: Delay in seconds.
+        """
+        spread = self.current * self.jitter
+        return self.current + random.uniform(-spread, spread)
+
+    def initial_delay(self) -> float:
+        """
+        Return a random start offset within one jitter window.
+
+        Returns:
+            float: Delay in seconds before the first poll.
+        """
+        return random.uniform(0, self.interval * self.jitter)
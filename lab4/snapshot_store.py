@@ -0,0 +1,159 @@
+import asyncio
+from typing import (Dict, Iterator, List, MutableMapping, Optional, Set,
+                    Tuple)
+
+from lab4.bars_db import load_row_snapshots, save_row_snapshots
+from lab4.row_state import RowState, make_row_state
+
+# ключ (table_id, row_index)
+SnapshotKey = Tuple[str, int]
+
+
+class SnapshotLoadError(Exception):
+    """
+    Raised when a table's snapshots cannot be read from the database.
+
+    The table stays unloaded, so the next access tries again instead of
+    treating the table as empty and re-seeding it.
+    """
+
+
+class SnapshotStore(MutableMapping[SnapshotKey, RowState]):
+    """
+    Disk-backed replacement for the watcher's in-memory PreviousState.
+
+    Row states are kept in memory as before, but every table is loaded from the
+    database lazily on first access, and only rows assigned or deleted since the
+    last flush are written back. This lets the watcher resume change detection after a
+    restart instead of re-seeding its state and missing changes made while the
+    bot was down.
+
+    Iteration and len() cover only the tables that have been loaded so far.
+    """
+
+    def __init__(self) -> None:
+        self._rows: Dict[SnapshotKey, RowState] = {}
+        self._loaded_tables: Set[str] = set()
+        self._dirty: Set[SnapshotKey] = set()
+        self._deleted: Set[SnapshotKey] = set()
+
+    def __getitem__(self, key: SnapshotKey) -> RowState:
+        self._ensure_loaded(key[0])
+        return self._rows[key]
+
+    def __setitem__(self, key: SnapshotKey, value: RowState) -> None:
+        self._ensure_loaded(key[0])
+        self._rows[key] = value
+        self._dirty.add(key)
+        self._deleted.discard(key)
+
+    def __delitem__(self, key: SnapshotKey) -> None:
+        self._ensure_loaded(key[0])
+        del self._rows[key]
+        self._dirty.discard(key)
+        self._deleted.add(key)
+
+    def __iter__(self) -> Iterator[SnapshotKey]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    async def load_table(self, table_id: str) -> None:
+        """
+        Load one table's snapshots without blocking the event loop.
+
+        The database is read in a worker thread; the result is merged on the loop
+        thread, so rows assigned in the meantime are not overwritten.
+
+        Args:
+            table_id: The identifier of the table to load.
+
+        Raises:
+            SnapshotLoadError: If the database could not be read.
+        """
+        if table_id in self._loaded_tables:
+            return
+
+        loaded = await asyncio.to_thread(load_row_snapshots, table_id)
+        self._merge_loaded(table_id, loaded)
+
+    async def flush(self) -> int:
+        """
+        Persist the rows changed or deleted since the previous flush.
+
+        Returns:
+            int: Number of rows written or deleted; 0 if there was nothing to
+                 write or the write failed (failed rows stay dirty and are
+                 retried next time).
+        """
+        if not self._dirty and not self._deleted:
+            return 0
+
+        dirty, deleted = self._dirty, self._deleted
+        self._dirty, self._deleted = set(), set()
+        snapshots: List[Tuple[str, int, List[str]]] = [
+            (key[0], key[1], list(self._rows[key].values))
+            for key in dirty if key in self._rows]
+
+        if not await asyncio.to_thread(save_row_snapshots, snapshots,
+                                       list(deleted)):
+            self._dirty |= dirty
+            # удаление не возвращается, если строку успели записать заново
+            self._deleted |= deleted - self._dirty
+            return 0
+
+        return len(snapshots) + len(deleted)
+
+    def forget_table(self, table_id: str) -> None:
+        """
+        Drop a table's rows from memory so they are reloaded on next access.
+
+        Used when another process takes over the table: its snapshots in this
+        process go stale. Flush first, or unsaved rows of the table are lost.
+
+        Args:
+            table_id: The identifier of the table to drop.
+        """
+        self._loaded_tables.discard(table_id)
+        for key in [key for key in self._rows if key[0] == table_id]:
+            del self._rows[key]
+            self._dirty.discard(key)
+        self._deleted = {key for key in self._deleted if key[0] != table_id}
+
+    def _ensure_loaded(self, table_id: str) -> None:
+        """
+        Synchronously load a table on first access if load_table was not awaited.
+
+        Args:
+            table_id: The identifier of the table to load.
+
+        Raises:
+            SnapshotLoadError: If the database could not be read.
+        """
+        if table_id not in self._loaded_tables:
+            self._merge_loaded(table_id, load_row_snapshots(table_id))
+
+    def _merge_loaded(self, table_id: str,
+                      loaded: Optional[Dict[int, List[str]]]) -> None:
+        """
+        Add loaded snapshots of a table, keeping rows already set in memory.
+
+        Args:
+            table_id: The identifier of the loaded table.
+            loaded: Mapping of row index to stored cell values, or None if the
+                load failed.
+
+        Raises:
+            SnapshotLoadError: If the load failed.
+        """
+        if table_id in self._loaded_tables:
+            return
+        if loaded is None:
+            raise SnapshotLoadError(
+                f"Can't load row snapshots of {table_id}")
+
+        self._loaded_tables.add(table_id)
+        for row_index, values in loaded.items():
+            self._rows.setdefault((table_id, row_index),
+                                  make_row_state(values))
@@ -0,0 +1,207 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from lab4.bars_db import (get_change_history, get_chat_identifiers,
+                          get_daily_history)
+from lab4.bars_watcher import (PreviousState, find_student_rows,
+                               get_table_headers)
+from lab4.constants import (CHANGE_HISTORY_PAGE_SIZE,
+                            CHANGE_HISTORY_RETENTION_DAYS,
+                            HISTORY_DEFAULT_DAYS, HISTORY_MAX_DAYS,
+                            TELEGRAM_MESSAGE_LIMIT)
+from lab4.identifier_index import is_identifier
+from lab4.notification_batch import Section, pack_sections
+from lab4.snapshot_store import SnapshotStore
+
+_NO_SUBSCRIPTIONS = ("Нет подписок. Используйте /set_isu или /set_fio, "
+                     "чтобы указать свой ИСУ или ФИО")
+
+
+async def grades_report(chat_id: int, state: PreviousState,
+                        limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """
+    Build the /grades answer from the watcher's row snapshots.
+
+    Rows are located through the identifier index and values are read from the
+    snapshot state, so no sheet is fetched. Identifier cells of the row (the
+    ISU number and the full name) are not listed as grades.
+
+    Args:
+        chat_id: Telegram chat asking for its grades.
+        state: The watcher's row state.
+        limit: Maximum length of one message.
+
+    Returns:
+        List of message texts.
+    """
+    identifiers = await asyncio.to_thread(get_chat_identifiers, chat_id)
+    if not identifiers:
+        return [_NO_SUBSCRIPTIONS]
+
+    sections: List[Section] = []
+    for identifier in identifiers:
+        locations = await find_student_rows(identifier)
+        if not locations:
+            sections.append((f"'{identifier}' не найден в таблицах", []))
+            continue
+
+        for table_id, row_index, raw in locations:
+            if isinstance(state, SnapshotStore):
+                await state.load_table(table_id)
+            row_state = state.get((table_id, row_index))
+            header = f"📊 {table_id}\n\nБаллы ({raw}):"
+
+            if row_state is None:
+                # строка попадает в снимок на ближайшем опросе таблицы
+                sections.append((header, ["* данные появятся после "
+                                          "следующей проверки таблицы"]))
+                continue
+
+            headers = await get_table_headers(table_id)
+            lines: List[str] = []
+            for col, value in enumerate(row_state.values):
+                if value and not await _is_row_identifier(table_id,
+                                                          row_index, value):
+                    lines.append(f"* {_column_name(headers, col)}: {value}")
+            sections.append((header, lines or ["* баллов пока нет"]))
+
+    return pack_sections(sections, limit)
+
+
+async def _is_row_identifier(table_id: str, row_index: int,
+                             value: str) -> bool:
+    """
+    Tell whether a cell holds one of the identifiers indexed for its row.
+
+    Grade cells that merely look like names ("не зачтено") are not indexed,
+    so they are still reported.
+
+    Args:
+        table_id: Table of the row.
+        row_index: Index of the row in the sheet.
+        value: Cell value.
+
+    Returns:
+        bool: True for the row's ISU number or full name.
+    """
+    if not is_identifier(value):
+        return False
+    return any(location[:2] == (table_id, row_index)
+               for location in await find_student_rows(value))
+
+
+async def history_report(chat_id: int,
+                         days: int = HISTORY_DEFAULT_DAYS,
+                         limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """
+    Build the /history answer from change_history.
+
+    Changes within the retention period come from the cell-level history,
+    older days from the daily summaries. Every lookup goes through the
+    (identifier, changed_at) and (identifier, day) indexes.
+
+    Args:
+        chat_id: Telegram chat asking for its history.
+        days: How many days back to look.
+        limit: Maximum length of one message.
+
+    Returns:
+        List of message texts.
+    """
+    identifiers = await asyncio.to_thread(get_chat_identifiers, chat_id)
+    if not identifiers:
+        return [_NO_SUBSCRIPTIONS]
+
+    now = datetime.now(timezone.utc)
+    since = (now - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+    sections: List[Section] = []
+    for identifier in identifiers:
+        locations = await find_student_rows(identifier)
+        # в истории строка записана под тем идентификатором, как он
+        # написан в таблице
+        seen: List[Tuple[str, str]] = []
+        for table_id, _, raw in locations:
+            if (table_id, raw) not in seen:
+                seen.append((table_id, raw))
+
+        for table_id, raw in seen:
+            records = await asyncio.to_thread(
+                get_change_history, identifier=raw, table_id=table_id,
+                since=since, limit=CHANGE_HISTORY_PAGE_SIZE)
+            lines = [f"* {r.changed_at[:16]} {r.column_name}: "
+                     f"'{r.old_value}' → '{r.new_value}'" for r in records]
+
+            if days > CHANGE_HISTORY_RETENTION_DAYS:
+                lines.extend(await asyncio.to_thread(
+                    _daily_lines, raw, table_id, now, days))
+
+            if lines:
+                sections.append((f"📊 {table_id}\n\nИзменения ({raw}), "
+                                 f"время UTC:", lines))
+
+    if not sections:
+        return [f"За последние {days} дн. изменений не было"]
+    return pack_sections(sections, limit)
+
+
+def _daily_lines(identifier: str, table_id: str, now: datetime,
+                 days: int) -> List[str]:
+    """
+    Format daily summaries older than the cell-level retention period.
+
+    Args:
+        identifier: Identifier as written in the sheet.
+        table_id: Name of the table.
+        now: Current UTC time.
+        days: How many days back to look.
+
+    Returns:
+        Formatted lines, newest day first.
+    """
+    since_day = (now - timedelta(days=days)).strftime("%Y-%m-%d")
+    return [f"* {d.day} {d.column_name}: '{d.first_value}' → "
+            f"'{d.last_value}' (изменений: {d.changes})"
+            for d in get_daily_history(identifier=identifier,
+                                       table_id=table_id,
+                                       since_day=since_day,
+                                       limit=CHANGE_HISTORY_PAGE_SIZE)]
+
+
+def parse_days(argument: str) -> Optional[int]:
+    """
+    Parse the optional day count of /history.
+
+    Args:
+        argument: Text after the command.
+
+    Returns:
+        Number of days (HISTORY_DEFAULT_DAYS if empty, at most
+        HISTORY_MAX_DAYS), or None if invalid.
+    """
+    argument = argument.strip()
+    if not argument:
+        return HISTORY_DEFAULT_DAYS
+    if not argument.isdecimal() or not argument.strip("0"):
+        return None
+    # длинное число не переводим в int: оно заведомо больше предела
+    if len(argument.lstrip("0")) > len(str(HISTORY_MAX_DAYS)):
+        return HISTORY_MAX_DAYS
+    return min(int(argument), HISTORY_MAX_DAYS)
+
+
+def _column_name(headers: List[str], col: int) -> str:
+    """
+    Return a column's header, like the change notifications do.
+
+    Args:
+        headers: Header cells of the table.
+        col: Column index.
+
+    Returns:
+        str: Header name or "столбец N".
+    """
+    if col < len(headers) and headers[col]:
+        return headers[col]
+    return f"столбец {col + 1}"
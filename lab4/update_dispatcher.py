@@ -0,0 +1,208 @@
+import asyncio
+from collections import deque
+from typing import (Any, Awaitable, Callable, Deque, Dict, Hashable,
+                    Optional, Set)
+
+from lab4.constants import UPDATE_CONCURRENCY, UPDATE_QUEUE_SIZE
+from lab4.metrics import UPDATE_ERRORS, UPDATE_SECONDS
+
+# обработчик одного обновления telegram
+UpdateHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def update_chat_key(update: Dict[str, Any]) -> Hashable:
+    """
+    Return the key that serializes an update: its chat, if it has one.
+
+    Args:
+        update: Update object returned by getUpdates.
+
+    Returns:
+        Hashable: The chat_id of the message, or the update_id for updates
+                  that do not belong to a chat.
+    """
+    message = update.get("message") or update.get("edited_message") or {}
+    chat_id = message.get("chat", {}).get("id")
+    if chat_id is not None:
+        return chat_id
+    return ("update", update.get("update_id"))
+
+
+class UpdateDispatcher:
+    """
+    Concurrent processing of incoming updates with per-chat ordering.
+
+    Every chat gets its own queue served by at most one task, so the updates of
+    one chat (and the user_states flow they drive) are handled strictly in
+    order, while different chats run concurrently. A semaphore bounds how many
+    handlers run at once, and submit() waits once queue_size updates are
+    pending, which keeps the long-poll loop from pulling more than the bot can
+    process.
+
+    acknowledged_offset() tells the long-poll loop which updates may be
+    confirmed to Telegram: only those below the oldest one still being
+    handled, so updates accepted but not handled when the bot crashes are
+    delivered again after a restart.
+    """
+
+    def __init__(self, handler: UpdateHandler,
+                 concurrency: int = UPDATE_CONCURRENCY,
+                 queue_size: int = UPDATE_QUEUE_SIZE) -> None:
+        self._handler = handler
+        self._concurrency = concurrency
+        self._queue_size = queue_size
+        self._chats: Dict[Hashable, Deque[Dict[str, Any]]] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._running: Optional[asyncio.Semaphore] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._progress: Optional[asyncio.Event] = None
+        self._pending = 0
+        # update_id принятых и ещё не обработанных обновлений
+        self._in_flight: Set[int] = set()
+        # update_id, принятые после последнего подтверждённого offset:
+        # getUpdates отдаёт их снова, пока они не подтверждены
+        self._accepted: Set[int] = set()
+        self._next_offset: Optional[int] = None
+
+    def _ensure_started(self) -> None:
+        """
+        Create the synchronization primitives on the running event loop.
+        """
+        if self._running is None:
+            self._running = asyncio.Semaphore(self._concurrency)
+            self._slots = asyncio.Semaphore(self._queue_size)
+            self._idle = asyncio.Event()
+            self._idle.set()
+            self._progress = asyncio.Event()
+
+    def pending(self) -> int:
+        """
+        Return the number of accepted updates not yet fully handled.
+        """
+        return self._pending
+
+    def acknowledged_offset(self) -> Optional[int]:
+        """
+        Return the getUpdates offset that confirms every handled update.
+
+        Returns:
+            Optional[int]: The update_id of the oldest update still being
+            handled, or the one after the newest accepted update if all of
+            them are handled; None before the first update.
+        """
+        if self._in_flight:
+            offset = min(self._in_flight)
+        else:
+            offset = self._next_offset
+        if offset is not None:
+            self._accepted = {i for i in self._accepted if i >= offset}
+        return offset
+
+    async def submit(self, update: Dict[str, Any]) -> bool:
+        """
+        Accept an update for processing and return without waiting for it.
+
+        Args:
+            update: Update object returned by getUpdates.
+
+        Returns:
+            bool: False if the update was already accepted (getUpdates
+            returns it again until it is confirmed), True otherwise.
+        """
+        self._ensure_started()
+        update_id = update.get("update_id")
+        if update_id in self._accepted:
+            return False
+        if len(self._accepted) > 2 * self._queue_size:
+            # webhook не запрашивает offset, поэтому старые id чистятся здесь
+            self.acknowledged_offset()
+
+        await self._slots.acquire()
+        self._pending += 1
+        self._idle.clear()
+        if update_id is not None:
+            self._in_flight.add(update_id)
+            self._accepted.add(update_id)
+            if self._next_offset is None or update_id >= self._next_offset:
+                self._next_offset = update_id + 1
+
+        key = update_chat_key(update)
+        self._chats.setdefault(key, deque()).append(update)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._serve_chat(key))
+        return True
+
+    async def join(self) -> None:
+        """
+        Wait until every accepted update has been handled.
+        """
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def wait_handled(self) -> None:
+        """
+        Wait until one more accepted update has been handled.
+
+        Returns at once if nothing is pending.
+        """
+        self._ensure_started()
+        if self._pending:
+            self._progress.clear()
+            await self._progress.wait()
+
+    async def stop(self) -> None:
+        """
+        Cancel the running handlers; updates still queued are dropped.
+
+        Dropped updates free their queue slots but are not acknowledged, so
+        getUpdates delivers them again after a restart.
+        """
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _serve_chat(self, key: Hashable) -> None:
+        """
+        Handle the queued updates of one chat in order, then exit.
+
+        Args:
+            key: Chat key returned by update_chat_key.
+        """
+        queue = self._chats[key]
+        try:
+            while queue:
+                # обновление остаётся в очереди, пока не обработано: при
+                # отмене оно считается отброшенным, а не обработанным
+                update = queue[0]
+                try:
+                    async with self._running:
+                        with UPDATE_SECONDS.time():
+                            await self._handler(update)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    UPDATE_ERRORS.inc()
+                    print(f"Error handling update "
+                          f"{update.get('update_id')}: {e}")
+                queue.popleft()
+                self._in_flight.discard(update.get("update_id"))
+                self._release()
+        finally:
+            # очередь пуста (или задача отменена) - чат больше не
+            # обслуживается; оставшиеся обновления освобождают места
+            for _ in queue:
+                self._release()
+            del self._tasks[key]
+            del self._chats[key]
+
+    def _release(self) -> None:
+        """
+        Account for an update that has left the dispatcher.
+        """
+        self._pending -= 1
+        self._slots.release()
+        self._progress.set()
+        if self._pending == 0:
+            self._idle.set()
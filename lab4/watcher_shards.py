@@ -0,0 +1,305 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import socket
+from functools import partial
+from multiprocessing.context import SpawnContext, SpawnProcess
+from multiprocessing.synchronize import Event
+from typing import Any, Dict, List, Tuple
+import aiohttp
+
+from lab4.constants import (BarsSheetConfig, BARS_POLL_INTERVAL,
+                            BARS_NOTIFY_INTERVAL, WATCHER_WORKERS,
+                            WATCHER_LEASE_TTL, WATCHER_LEASE_RENEW_INTERVAL,
+                            WATCHER_SUPERVISE_INTERVAL)
+from lab4.bars_db import (init_db, close_db, acquire_sheet_leases,
+                          release_sheet_leases)
+from lab4.bars_watcher import (compact_history_loop, flush_cycle,
+                               make_sheet_backend, poll_sheet, reload_sheets)
+from lab4.metrics import REGISTRY
+from lab4.notification_batch import NotificationBatch
+from lab4.sheet_registry import get_sheet_configs, refresh_sheet_configs
+from lab4.snapshot_store import SnapshotStore
+
+# сообщение от обработчика координатору: (вид, данные), где вид -
+# _NOTIFY с (chat_id, текст) или _METRICS с приращениями REGISTRY.drain()
+Message = Tuple[str, Any]
+_NOTIFY = "notify"
+_METRICS = "metrics"
+
+# сколько сообщений координатор забирает из очереди за раз
+_DRAIN_BATCH = 500
+
+
+async def run_sharded_watcher(session: aiohttp.ClientSession, send_func,
+                              workers: int = WATCHER_WORKERS) -> None:
+    """
+    Run the BARS watcher in worker processes and deliver their notifications.
+
+    Every worker owns a share of the sheets through leases stored in SQLite
+    (see acquire_sheet_leases) and polls only those sheets on its own event
+    loop. Detected changes come back over a multiprocessing queue and are sent
+    from this process through send_func, so the Telegram side keeps a single
+    rate-limited sender. A worker that exits is restarted; its sheets are taken
+    over by the others once its leases expire.
+
+    Watcher metrics are recorded in each worker's own registry, so after every
+    flush the worker sends what it recorded since the previous flush over the
+    same queue, and it is merged into this process's REGISTRY; the /metrics
+    endpoint served here thus covers all workers without extra ports.
+
+    Args:
+        session: HTTP client session passed to send_func.
+        send_func: Coroutine function delivering one notification.
+        workers: Number of worker processes.
+
+    Returns:
+        None
+    """
+    init_db()
+    context = multiprocessing.get_context("spawn")
+    notifications = context.Queue()
+    stop_event = context.Event()
+    processes: Dict[int, SpawnProcess] = {
+        slot: _start_worker(context, slot, notifications, stop_event)
+        for slot in range(workers)}
+    print(f"BARS watcher: {workers} процессов на "
+          f"{len(get_sheet_configs())} таблиц")
+
+    # свёртка истории выполняется один раз, в координаторе
+    compact_task = asyncio.create_task(compact_history_loop())
+    loop = asyncio.get_running_loop()
+    next_check = loop.time() + WATCHER_SUPERVISE_INTERVAL
+
+    try:
+        while True:
+            batch = await asyncio.to_thread(
+                _drain, notifications, WATCHER_SUPERVISE_INTERVAL)
+            for kind, payload in batch:
+                if kind == _METRICS:
+                    REGISTRY.merge(payload)
+                else:
+                    chat_id, text = payload
+                    await send_func(session, chat_id, text)
+
+            if loop.time() >= next_check:
+                _restart_dead(context, processes, notifications, stop_event)
+                next_check = loop.time() + WATCHER_SUPERVISE_INTERVAL
+    finally:
+        compact_task.cancel()
+        stop_event.set()
+        await asyncio.to_thread(_join_all, list(processes.values()))
+
+
+def _start_worker(context: SpawnContext, slot: int, notifications,
+                  stop_event: Event) -> SpawnProcess:
+    """
+    Spawn one worker process.
+
+    Args:
+        context: Multiprocessing context.
+        slot: Worker number, used in the process name.
+        notifications: Queue the worker puts notifications into.
+        stop_event: Event asking the worker to shut down.
+
+    Returns:
+        SpawnProcess: The started process.
+    """
+    process = context.Process(target=_worker_main,
+                              args=(notifications, stop_event),
+                              name=f"bars-worker-{slot}", daemon=True)
+    process.start()
+    return process
+
+
+def _restart_dead(context: SpawnContext, processes: Dict[int, SpawnProcess],
+                  notifications, stop_event: Event) -> None:
+    """
+    Replace worker processes that have exited.
+
+    Args:
+        context: Multiprocessing context.
+        processes: Running workers by slot, updated in place.
+        notifications: Queue the workers put notifications into.
+        stop_event: Event asking the workers to shut down.
+    """
+    for slot, process in processes.items():
+        if not process.is_alive():
+            print(f"{process.name} завершился (код {process.exitcode}), "
+                  f"перезапуск")
+            processes[slot] = _start_worker(context, slot, notifications,
+                                            stop_event)
+
+
+def _drain(notifications, timeout: float) -> List[Message]:
+    """
+    Wait for messages from the workers and take everything already queued.
+
+    Args:
+        notifications: Queue filled by the workers.
+        timeout: Seconds to wait for the first message.
+
+    Returns:
+        List[Message]: Up to _DRAIN_BATCH messages; empty on timeout.
+    """
+    try:
+        batch = [notifications.get(timeout=timeout)]
+    except queue.Empty:
+        return []
+
+    while len(batch) < _DRAIN_BATCH:
+        try:
+            batch.append(notifications.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _join_all(processes: List[SpawnProcess]) -> None:
+    """
+    Wait for the workers to release their leases, then kill the stragglers.
+
+    Args:
+        processes: Worker processes.
+    """
+    for process in processes:
+        process.join(WATCHER_LEASE_RENEW_INTERVAL)
+        if process.is_alive():
+            process.terminate()
+
+
+def _worker_main(notifications, stop_event: Event) -> None:
+    """
+    Entry point of a worker process.
+
+    Args:
+        notifications: Queue to put notifications into.
+        stop_event: Event asking the worker to shut down.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        asyncio.run(_run_worker(owner, notifications, stop_event))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_db()
+
+
+async def _run_worker(owner: str, notifications, stop_event: Event) -> None:
+    """
+    Poll the sheets leased by this worker until asked to stop.
+
+    Sheet configs are reloaded and leases renewed every
+    WATCHER_LEASE_RENEW_INTERVAL seconds; sheets gained are started, sheets
+    lost to another worker are stopped and their snapshots dropped, so the new
+    owner's changes are not diffed against stale rows if the sheet comes back
+    later. Leases of stopped sheets are given back only after their state is
+    flushed. If renewals keep failing, every sheet is stopped before the last
+    renewed leases expire, so two workers never poll the same sheet.
+
+    Args:
+        owner: Unique name of this worker, recorded in the leases.
+        notifications: Queue to put notifications into.
+        stop_event: Event asking the worker to shut down.
+    """
+    init_db()
+    configs = await asyncio.to_thread(refresh_sheet_configs)
+    send = partial(_enqueue, notifications)
+    state = SnapshotStore()
+    batch = NotificationBatch()
+    tasks: Dict[str, asyncio.Task] = {}
+    loop = asyncio.get_running_loop()
+    # до какого момента (по loop.time) действуют аренды этого процесса
+    leases_expire = loop.time()
+
+    async with aiohttp.ClientSession() as session:
+        fetch_rows, revisions = make_sheet_backend(session)
+
+        def start_sheet(cfg: BarsSheetConfig) -> asyncio.Task:
+            return asyncio.create_task(poll_sheet(
+                cfg, batch, state, revisions, fetch_rows, BARS_POLL_INTERVAL))
+
+        try:
+            while not stop_event.is_set():
+                configs = await reload_sheets(configs, tasks, start_sheet,
+                                              state, revisions)
+                renewing_at = loop.time()
+                owned = await asyncio.to_thread(
+                    acquire_sheet_leases, owner, list(configs),
+                    WATCHER_LEASE_TTL)
+                if owned is not None:
+                    leases_expire = renewing_at + WATCHER_LEASE_TTL
+                elif (loop.time() + WATCHER_LEASE_RENEW_INTERVAL
+                      < leases_expire):
+                    # БД недоступна: аренды ещё действуют, продлим позже
+                    owned = list(tasks)
+                else:
+                    # аренды истекут до следующей попытки, и таблицы
+                    # заберут другие процессы: опрос останавливается
+                    print(f"{owner}: аренды не продлены, опрос остановлен")
+                    owned = []
+
+                lost = [t for t in tasks if t not in owned]
+                if lost:
+                    stopped = [tasks.pop(table_id) for table_id in lost]
+                    for task in stopped:
+                        task.cancel()
+                    await asyncio.gather(*stopped, return_exceptions=True)
+                    # несохранённые строки уходят на диск до передачи таблицы
+                    await flush_cycle(session, send, batch, state)
+                    for table_id in lost:
+                        state.forget_table(table_id)
+                        revisions.forget(table_id)
+                    # аренда отдаётся, только когда снимки уже на диске
+                    await asyncio.to_thread(release_sheet_leases, owner,
+                                            lost)
+
+                for table_id in owned:
+                    if table_id not in tasks:
+                        tasks[table_id] = start_sheet(configs[table_id])
+
+                renew_at = loop.time() + WATCHER_LEASE_RENEW_INTERVAL
+                while loop.time() < renew_at and not stop_event.is_set():
+                    await asyncio.sleep(BARS_NOTIFY_INTERVAL)
+                    await flush_cycle(session, send, batch, state)
+                    _send_metrics(notifications)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            await flush_cycle(session, send, batch, state)
+            _send_metrics(notifications)
+            await asyncio.to_thread(release_sheet_leases, owner)
+
+
+def _send_metrics(notifications) -> None:
+    """
+    Forward the metrics recorded by this worker to the coordinator.
+
+    Args:
+        notifications: Queue read by the coordinator.
+    """
+    deltas = REGISTRY.drain()
+    if deltas:
+        notifications.put((_METRICS, deltas))
+
+
+async def _enqueue(notifications, session: aiohttp.ClientSession,
+                   chat_id: int, text: str) -> bool:
+    """
+    Hand a notification to the coordinator instead of sending it.
+
+    Has the signature of send_func, so NotificationBatch.flush can use it.
+
+    Args:
+        notifications: Queue read by the coordinator.
+        session: Unused; kept for the send_func signature.
+        chat_id: Telegram chat to notify.
+        text: Notification text.
+
+    Returns:
+        bool: Always True; the queue is unbounded.
+    """
+    notifications.put((_NOTIFY, (chat_id, text)))
+    return True
@@ -0,0 +1,176 @@
+import asyncio
+import hmac
+from typing import Any, Dict
+import aiohttp
+from aiohttp import web
+
+from lab4.constants import (REQUEST_TIMEOUT, SUCCESS_CODE, WEBHOOK_HOST,
+                            WEBHOOK_MAX_CONNECTIONS, WEBHOOK_PATH,
+                            WEBHOOK_PORT, WEBHOOK_SECRET,
+                            WEBHOOK_SUBMIT_TIMEOUT)
+from lab4.sync_bot import build_api_url
+from lab4.update_dispatcher import UpdateDispatcher
+
+_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+_DISPATCHER_KEY = "updates_dispatcher"
+_SECRET_KEY = "webhook_secret"
+
+
+def create_webhook_app(updates_dispatcher: UpdateDispatcher,
+                       secret: str = WEBHOOK_SECRET,
+                       path: str = WEBHOOK_PATH) -> web.Application:
+    """
+    Build the aiohttp application that receives Telegram updates.
+
+    Updates are fed into the same UpdateDispatcher as in polling mode. The app
+    can be exercised locally by POSTing update JSON to path with the secret in
+    the X-Telegram-Bot-Api-Secret-Token header.
+
+    Args:
+        updates_dispatcher: Dispatcher that processes accepted updates.
+        secret: Expected secret token; must not be empty.
+        path: URL path of the webhook endpoint.
+
+    Returns:
+        web.Application: Application ready to be served.
+
+    Raises:
+        ValueError: If secret is empty - without it anyone who can reach the
+            port could post forged updates (including admin commands).
+    """
+    if not secret:
+        raise ValueError("webhook secret is required")
+
+    app = web.Application()
+    app[_DISPATCHER_KEY] = updates_dispatcher
+    app[_SECRET_KEY] = secret
+    app.router.add_post(path, _handle_webhook)
+    return app
+
+
+async def _handle_webhook(request: web.Request) -> web.Response:
+    """
+    Accept one update from Telegram.
+
+    Answers 401 for a wrong secret and 400 for a malformed body. If the
+    dispatcher stays full for WEBHOOK_SUBMIT_TIMEOUT seconds the answer is 503,
+    so Telegram redelivers the update later instead of the server buffering
+    without bound.
+
+    Args:
+        request: Incoming HTTP request.
+
+    Returns:
+        web.Response: Empty response with the status code.
+    """
+    secret: str = request.app[_SECRET_KEY]
+    if not hmac.compare_digest(request.headers.get(_SECRET_HEADER, ""),
+                               secret):
+        return web.Response(status=401)
+
+    try:
+        update: Dict[str, Any] = await request.json()
+    except ValueError:
+        return web.Response(status=400)
+    if not isinstance(update, dict):
+        return web.Response(status=400)
+
+    updates_dispatcher: UpdateDispatcher = request.app[_DISPATCHER_KEY]
+    try:
+        await asyncio.wait_for(updates_dispatcher.submit(update),
+                               WEBHOOK_SUBMIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"Update queue is full, rejecting update "
+              f"{update.get('update_id')}")
+        return web.Response(status=503)
+
+    return web.Response(status=SUCCESS_CODE)
+
+
+async def run_webhook_server(updates_dispatcher: UpdateDispatcher,
+                             host: str = WEBHOOK_HOST,
+                             port: int = WEBHOOK_PORT) -> web.AppRunner:
+    """
+    Start serving the webhook application in the background.
+
+    Args:
+        updates_dispatcher: Dispatcher that processes accepted updates.
+        host: Interface to listen on.
+        port: TCP port to listen on.
+
+    Returns:
+        web.AppRunner: Runner to clean up on shutdown.
+    """
+    runner = web.AppRunner(create_webhook_app(updates_dispatcher))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Webhook server listening on {host}:{port}{WEBHOOK_PATH}")
+    return runner
+
+
+async def set_webhook(session: aiohttp.ClientSession, url: str,
+                      secret: str = WEBHOOK_SECRET) -> bool:
+    """
+    Register the webhook URL with Telegram.
+
+    Args:
+        session: HTTP client session.
+        url: Public HTTPS URL of the webhook endpoint.
+        secret: Secret token Telegram will send with every update.
+
+    Returns:
+        bool: True if Telegram accepted the webhook.
+    """
+    payload: Dict[str, Any] = {
+        "url": url,
+        "max_connections": WEBHOOK_MAX_CONNECTIONS,
+        "drop_pending_updates": False,
+        "secret_token": secret,
+    }
+    return await _call_api(session, "setWebhook", payload)
+
+
+async def delete_webhook(session: aiohttp.ClientSession) -> bool:
+    """
+    Remove the webhook so that getUpdates long polling works again.
+
+    Args:
+        session: HTTP client session.
+
+    Returns:
+        bool: True if Telegram confirmed the removal.
+    """
+    return await _call_api(session, "deleteWebhook",
+                           {"drop_pending_updates": False})
+
+
+async def _call_api(session: aiohttp.ClientSession, method: str,
+                    payload: Dict[str, Any]) -> bool:
+    """
+    Call a Telegram Bot API method and report whether it succeeded.
+
+    Args:
+        session: HTTP client session.
+        method: Bot API method name.
+        payload: JSON request body.
+
+    Returns:
+        bool: True if the API answered ok.
+    """
+    try:
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        async with session.post(build_api_url(method), json=payload,
+                                timeout=timeout) as response:
+            if response.status != SUCCESS_CODE:
+                print(f"HTTP error in {method}: {response.status}")
+                return False
+            result: Dict[str, Any] = await response.json()
+
+    except aiohttp.ClientError as e:
+        print(f"Request failed in {method}: {e}")
+        return False
+
+    if not result.get("ok"):
+        print(f"{method} failed: {result.get('description')}")
+        return False
+    return True